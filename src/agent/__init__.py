@@ -4,7 +4,7 @@ Agent Package
 AI agent implementation and components.
 """
 
-from .registry import current_agent, create_agent, get_current_agent, get_available_agents
+from importlib import import_module
 
 __all__ = [
     "current_agent",
@@ -12,3 +12,9 @@ __all__ = [
     "get_current_agent",
     "get_available_agents",
 ]
+
+def __getattr__(name: str):
+    # Import the registry (and with it the Agents SDK) only when one of its names is used
+    if name in __all__:
+        return getattr(import_module(".registry", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
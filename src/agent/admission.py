@@ -0,0 +1,191 @@
+"""
+Run Admission Control
+
+Caps the number of agent runs in flight and sheds the excess early.
+
+Every run needs a permit before it starts. Permits are limited globally and
+per agent key (the registry key of the agent, e.g. "openai"). When none is
+free, the caller waits in a bounded FIFO queue for up to the queue timeout.
+If the queue is already full, or the wait times out, the run is rejected
+right away with `AdmissionRejected`, which carries a Retry-After hint. The
+API answers it with 503 and the Gradio UI with a "busy" message, so a spike
+fails a few requests fast instead of making every run slow.
+
+The limits are set for the whole instance and divided across the server's
+worker processes (see `src.app.core.workers`).
+"""
+
+import asyncio
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+from src.app.core.logging import logger
+from src.app.core.metrics import AGENT_RUNS_IN_FLIGHT, AGENT_RUNS_QUEUED, AGENT_RUNS_REJECTED
+from src.app.core.workers import per_worker
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a run cannot be admitted; `retry_after` is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Waiter:
+    key: str
+    future: asyncio.Future
+
+
+class AdmissionController:
+    """Global and per-key in-flight limits with a bounded, deadline-limited wait queue."""
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+        per_key_limit: int = 0,
+        key_limits: Optional[Dict[str, int]] = None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.per_key_limit = per_key_limit
+        self.key_limits = key_limits or {}
+        self.in_flight = 0
+        self.in_flight_by_key: Dict[str, int] = {}
+        self.admitted = 0
+        self.rejected = 0
+        self._queue: Deque[_Waiter] = deque()
+        # Moving average of run durations, used for the Retry-After hint
+        self._avg_run_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls, settings) -> "AdmissionController":
+        """Build the controller with this worker's share of the instance-wide limits."""
+        return cls(
+            max_in_flight=per_worker(settings.ADMISSION_MAX_IN_FLIGHT),
+            max_queue=per_worker(settings.ADMISSION_QUEUE_SIZE, minimum=0),
+            queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+            per_key_limit=per_worker(settings.ADMISSION_MAX_IN_FLIGHT_PER_AGENT, minimum=0),
+            key_limits={key: per_worker(limit) for key, limit in settings.ADMISSION_AGENT_LIMITS.items()},
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def _key_limit(self, key: str) -> int:
+        return self.key_limits.get(key, self.per_key_limit)
+
+    def _has_capacity(self, key: str) -> bool:
+        if self.in_flight >= self.max_in_flight:
+            return False
+        key_limit = self._key_limit(key)
+        return not key_limit or self.in_flight_by_key.get(key, 0) < key_limit
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        self._queue.remove(waiter)
+        AGENT_RUNS_QUEUED.dec()
+
+    def _grant(self, key: str) -> None:
+        self.in_flight += 1
+        self.in_flight_by_key[key] = self.in_flight_by_key.get(key, 0) + 1
+        self.admitted += 1
+        AGENT_RUNS_IN_FLIGHT.inc()
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait: roughly the time to work through the queue."""
+        backlog = (len(self._queue) + 1) / max(1, self.max_in_flight)
+        return max(1, math.ceil(self._avg_run_seconds * backlog))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        AGENT_RUNS_REJECTED.inc()
+        return AdmissionRejected(reason, self.retry_after())
+
+    async def acquire(self, key: str) -> None:
+        """
+        Take a permit for a run of agent `key`, waiting in the queue if needed.
+
+        Args:
+            key: Agent key the run counts against
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait exceeds the queue timeout
+        """
+        # `release` admits every waiter that fits, so queued waiters never need the capacity seen here
+        if self._has_capacity(key):
+            self._grant(key)
+            return
+
+        if len(self._queue) >= self.max_queue:
+            raise self._reject("Server is busy: too many agent runs in progress")
+
+        waiter = _Waiter(key, asyncio.get_running_loop().create_future())
+        self._queue.append(waiter)
+        AGENT_RUNS_QUEUED.inc()
+        try:
+            done, _ = await asyncio.wait({waiter.future}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # The caller went away; give back a permit that was granted meanwhile
+            if waiter in self._queue:
+                self._dequeue(waiter)
+            elif waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self.release(key)
+            raise
+
+        if not done:
+            self._dequeue(waiter)
+            waiter.future.cancel()
+            raise self._reject(f"Server is busy: no agent run slot within {self.queue_timeout:g}s")
+        # Raises when the waiter was rejected while queued (e.g. on shutdown)
+        waiter.future.result()
+
+    def release(self, key: str, run_seconds: Optional[float] = None) -> None:
+        """
+        Return a permit and admit the first queued waiters that now fit.
+
+        Args:
+            key: Agent key the permit was taken for
+            run_seconds: Duration of the finished run, for the Retry-After estimate
+        """
+        self.in_flight -= 1
+        self.in_flight_by_key[key] -= 1
+        AGENT_RUNS_IN_FLIGHT.dec()
+        if run_seconds is not None:
+            self._avg_run_seconds = 0.9 * self._avg_run_seconds + 0.1 * run_seconds if self._avg_run_seconds else run_seconds
+
+        for waiter in list(self._queue):
+            if self.in_flight >= self.max_in_flight:
+                break
+            if self._has_capacity(waiter.key):
+                self._dequeue(waiter)
+                self._grant(waiter.key)
+                waiter.future.set_result(None)
+
+    def reject_waiting(self, reason: str) -> None:
+        """Fail every queued waiter, e.g. when the server starts shutting down."""
+        if self._queue:
+            logger.info(f"Rejecting {len(self._queue)} queued agent runs: {reason}")
+        while self._queue:
+            waiter = self._queue[0]
+            self._dequeue(waiter)
+            waiter.future.set_exception(self._reject(reason))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "in_flight": self.in_flight,
+            "in_flight_by_agent": {key: count for key, count in self.in_flight_by_key.items() if count},
+            "queue_depth": len(self._queue),
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_run_seconds": round(self._avg_run_seconds, 3),
+        }
@@ -0,0 +1,95 @@
+"""
+Agent Run Hooks
+
+Agents SDK lifecycle hooks used by the run manager.
+
+`TurnHooks` instruments one agent turn. It times every tool call per tool
+(metrics), opens a child span of the turn's trace for every model call and
+tool call (see `src.app.core.tracing`), and records the token usage of every
+model call in the usage ledger (see `src.app.core.usage`), keeping the
+turn's total for its token quotas. A new instance is
+created for each run, so concurrent runs never share state.
+"""
+
+import time
+from collections import defaultdict
+from typing import Any, DefaultDict, List, Optional, Tuple
+
+from agents import RunHooks
+
+from src.app.core.metrics import TOOL_CALL_SECONDS
+from src.app.core.tracing import tracer
+from src.app.core.usage import UsageEntry, usage_ledger
+
+
+class TurnHooks(RunHooks):
+    """Records tool call latency and model usage, and traces model and tool calls."""
+
+    def __init__(self, model: str, agent_key: str, session_id: Optional[str] = None, run_id: Optional[str] = None):
+        self.model = model
+        self.agent_key = agent_key
+        self.session_id = session_id
+        self.run_id = run_id
+        # Start time and span per tool name; parallel calls of one tool end in roughly the order they started
+        self._tools: DefaultDict[str, List[Tuple[float, Any]]] = defaultdict(list)
+        self._llm_span: Optional[Any] = None
+        self._first_token_seen = False
+        # Input and output tokens of every model call of the turn
+        self.total_tokens = 0
+
+    async def on_llm_start(self, context: Any, agent: Any, system_prompt: Optional[str], input_items: List[Any]) -> None:
+        self._llm_span = tracer.start_span(
+            "llm.call", kind="client", **{"llm.model": self.model, "agent": agent.name, "llm.input_items": len(input_items)}
+        )
+        self._first_token_seen = False
+
+    def first_token(self) -> None:
+        """Mark the first streamed token of the current model call."""
+        if self._llm_span is not None and not self._first_token_seen:
+            self._first_token_seen = True
+            self._llm_span.add_event("first_token")
+
+    async def on_llm_end(self, context: Any, agent: Any, response: Any) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is not None and usage.requests:
+            self.total_tokens += usage.input_tokens + usage.output_tokens
+            details = getattr(usage, "input_tokens_details", None)
+            usage_ledger.record(UsageEntry(
+                source="agent",
+                agent_key=self.agent_key,
+                model=self.model,
+                input_tokens=usage.input_tokens,
+                output_tokens=usage.output_tokens,
+                cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+                session_id=self.session_id,
+                run_id=self.run_id,
+            ))
+
+        span, self._llm_span = self._llm_span, None
+        if span is None:
+            return
+        if usage is not None:
+            span.set_attribute("llm.input_tokens", usage.input_tokens)
+            span.set_attribute("llm.output_tokens", usage.output_tokens)
+        span.end()
+
+    async def on_tool_start(self, context: Any, agent: Any, tool: Any) -> None:
+        span = tracer.start_span(f"tool.{tool.name}", **{"tool.name": tool.name})
+        self._tools[tool.name].append((time.perf_counter(), span))
+
+    async def on_tool_end(self, context: Any, agent: Any, tool: Any, result: str) -> None:
+        calls = self._tools.get(tool.name)
+        if calls:
+            started, span = calls.pop(0)
+            TOOL_CALL_SECONDS.labels(tool.name).observe(time.perf_counter() - started)
+            span.end()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """End spans still open when the turn stops, e.g. on an error or cancellation."""
+        if self._llm_span is not None:
+            self._llm_span.end(error)
+            self._llm_span = None
+        for calls in self._tools.values():
+            for _, span in calls:
+                span.end(error)
+        self._tools.clear()
@@ -7,12 +7,17 @@ for long conversations with automatic limitation to recent conversation items.
 """
 
 import json
-from typing import List, Optional
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncEngine
+from typing import Callable, List, Optional
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from agents.extensions.memory.sqlalchemy_session import SQLAlchemySession, TResponseInputItem
-from src.app.core.logging import logger
-from src.db.database import async_engine
+from src.app.core.init_settings import global_settings as settings
+from src.app.core.logging import hot_logger, logger
+from src.app.core.metrics import MEMORY_OPERATION_SECONDS, timed
+from src.app.core.tracing import tracer
+from src.db.database import AsyncSessionLocal, WriterSessionLocal, async_engine
+from src.db.routing import replica_router
+from src.db.models import AgentMessage, AgentSession
 
 
 
@@ -40,6 +45,8 @@ class CustomMemorySession(SQLAlchemySession):
         engine: AsyncEngine,
         memory_limit: int = DEFAULT_MEMORY_LIMIT,
         create_tables: bool = False,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        read_session_factory: Optional[Callable[[], AsyncSession]] = None,
     ):
         """
         Initialize Custom Memory Session.
@@ -49,6 +56,9 @@ class CustomMemorySession(SQLAlchemySession):
             engine: SQLAlchemy AsyncEngine instance
             memory_limit: Maximum number of recent items to return (default: 10)
             create_tables: Whether to create tables if they don't exist (default: False)
+            session_factory: Session factory for the SDK's write paths instead of a plain
+                one bound to `engine` (e.g. the application's SQLite write queue)
+            read_session_factory: Session factory for history reads (default: session_factory)
         """
         # Initialize parent with custom table prefix
         super().__init__(
@@ -57,8 +67,18 @@ class CustomMemorySession(SQLAlchemySession):
             create_tables=create_tables,
         )
         
+        # Query the migration-managed tables instead of the SDK's per-instance copies
+        self._sessions = AgentSession.__table__
+        self._messages = AgentMessage.__table__
+        self._metadata = AgentSession.metadata
+        if session_factory is not None:
+            self._session_factory = session_factory
+        self._read_session_factory = read_session_factory or self._session_factory
+        
         self.memory_limit = memory_limit
 
+    @tracer.traced("memory.get_items")
+    @timed(MEMORY_OPERATION_SECONDS.labels("get_items"))
     async def get_items(self, limit: Optional[int] = None) -> List[TResponseInputItem]:
         """
         Get recent conversation items in chronological order with guaranteed user->assistant pattern.
@@ -75,11 +95,13 @@ class CustomMemorySession(SQLAlchemySession):
         """
         effective_limit = limit if limit is not None else self.memory_limit
         
-        logger.debug(f"Getting {effective_limit} recent conversation items in chronological order")
+        logger.debug("Getting %d recent conversation items in chronological order", effective_limit)
         
         await self._ensure_tables()
         
-        async with self._session_factory() as sess:
+        # History reads go to a read replica unless this session wrote recently
+        session_factory = replica_router.reader(self.session_id) or self._read_session_factory
+        async with session_factory() as sess:
             # Get the most recent 'limit' messages in DESC order (newest first)
             stmt = (
                 select(self._messages.c.message_data)
@@ -87,6 +109,13 @@ class CustomMemorySession(SQLAlchemySession):
                 .order_by(self._messages.c.created_at.desc())
                 .limit(effective_limit)
             )
+            retention_months = settings.AGENT_MEMORY_RETENTION_MONTHS
+            if settings.AGENT_MEMORY_PARTITIONING and retention_months > 0 and self._engine.dialect.name == "postgresql":
+                # Bound created_at to the retention window so Postgres prunes expired partitions;
+                # the bound is a stable expression, so pruning happens at execution time
+                stmt = stmt.where(self._messages.c.created_at >= text(
+                    f"date_trunc('month', LOCALTIMESTAMP) - interval '{int(retention_months)} months'"
+                ))
             
             result = await sess.execute(stmt)
             rows: List[str] = [row[0] for row in result.all()]
@@ -105,9 +134,22 @@ class CustomMemorySession(SQLAlchemySession):
                     logger.warning(f"Skipping corrupted message in session {self.session_id}")
                     continue
 
-            logger.debug(f"Retrieved {len(items)} conversation items")
+            logger.debug("Retrieved %d conversation items", len(items))
             return items
     
+    @tracer.traced("memory.add_items")
+    @timed(MEMORY_OPERATION_SECONDS.labels("add_items"))
+    async def add_items(self, items: List[TResponseInputItem]) -> None:
+        """
+        Store new conversation items on the primary.
+
+        Args:
+            items: Conversation items to append to the session
+        """
+        await super().add_items(items)
+        # Keep this session's next reads on the primary until replicas have the new items
+        replica_router.note_write(self.session_id)
+
     # async def get_all_items(self) -> List[TResponseInputItem]:
     #     """
     #     Get all conversation items without memory limit.
@@ -253,11 +295,13 @@ async def get_or_create_memory_session(session_id: str) -> CustomMemorySession:
     # Use the existing async engine from your database setup
     engine = async_engine
     
+    # Tables are managed by Alembic migrations (see src/db/migrations)
     session = CustomMemorySession(
         session_id=session_id,
         engine=engine,
-        create_tables=True,
+        session_factory=WriterSessionLocal,
+        read_session_factory=AsyncSessionLocal,
     )
     
-    logger.info(f"💾 Memory session created/retrieved for: {session_id}")
+    hot_logger.info("💾 Memory session created/retrieved for: %s", session_id)
     return session
@@ -1,15 +1,21 @@
 import os
-from dotenv import load_dotenv
+from functools import lru_cache
 from openai import DefaultAioHttpClient
 from agents import AsyncOpenAI, OpenAIChatCompletionsModel
+from src.app.core.clients import register_client
+from src.app.core.config import load_env
 
-_ = load_dotenv('.env')
-
-model = OpenAIChatCompletionsModel(
-    model="accounts/fireworks/models/gpt-oss-120b",
-    openai_client=AsyncOpenAI(
+@lru_cache(maxsize=None)
+def get_client() -> AsyncOpenAI:
+    # Built on first use so importing the registry doesn't open a client
+    load_env()
+    return register_client(AsyncOpenAI(
         base_url="https://api.fireworks.ai/inference/v1",
         api_key=os.getenv("FIREWORKS_API_KEY", "placeholder-key-set-FIREWORKS_API_KEY-env-var"),
         http_client=DefaultAioHttpClient(),
-    ),
-)
\ No newline at end of file
+    ))
+
+@lru_cache(maxsize=None)
+def get_model(model: str = "accounts/fireworks/models/gpt-oss-120b") -> OpenAIChatCompletionsModel:
+    # Every model shares the provider's client and its connection pool
+    return OpenAIChatCompletionsModel(model=model, openai_client=get_client())
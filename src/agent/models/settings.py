@@ -1,10 +1,13 @@
 from agents import ModelSettings
 
+# include_usage: streamed responses end with token usage for the usage ledger, on any provider
 chat_model_settings = ModelSettings(
     parallel_tool_calls=True,
+    include_usage=True,
 )
 
 reasoning_model_settings = ModelSettings(
     parallel_tool_calls=True,
     reasoning_effort="medium",
+    include_usage=True,
 )
\ No newline at end of file
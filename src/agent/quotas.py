@@ -0,0 +1,299 @@
+"""
+Run Quotas
+
+Request and token quotas per client and per session, checked before a run is admitted.
+
+A client is the caller's API key or IP address (`src.app.core.identity`), a
+session is the memory session of the run. Both are counted in a sliding
+window of QUOTA_WINDOW_SECONDS, approximated the usual way with two fixed
+windows: the count of the current window plus the count of the previous one
+weighted by how much of it still overlaps the sliding window. That takes
+two counters per key, so a check is O(1) whatever the traffic.
+
+Every run counts one request when it is admitted and its model tokens when
+it finishes. Before a run starts, each limit it falls under is checked:
+
+- at or over the limit, the run is rejected with `QuotaExceeded` (an
+  `AdmissionRejected`, with a Retry-After hint of when the window will have
+  slid far enough), which the API answers with 429;
+- past QUOTA_SOFT_LIMIT_RATIO of a limit, the run is degraded: it uses the
+  agent's cheaper model (see `DEGRADED_MODELS` in the registry).
+
+Counters live in the worker process by default, with the limits divided
+across workers like the admission limits. With QUOTA_BACKEND=database they
+live in the `quota_counters` table, shared by every worker and instance
+using the database. Checks and charges are separate statements, so runs
+checked at the same moment can overshoot a limit by a few requests. If the
+backend fails, runs are let through rather than rejected.
+"""
+
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, select
+
+from src.agent.admission import AdmissionRejected
+from src.app.core.logging import hot_logger, logger
+from src.app.core.metrics import AGENT_RUN_QUOTA_DECISIONS
+from src.app.core.workers import per_worker
+from src.db.database import AsyncSessionLocal, WriterSessionLocal
+from src.db.models import QuotaCounter
+
+# (requests, tokens) of the current window, then of the previous one
+Usage = Tuple[int, int, int, int]
+
+# Counters older than the previous window are dropped every this many charges
+PRUNE_EVERY = 1000
+
+
+class QuotaExceeded(AdmissionRejected):
+    """Raised when a client or session is over a hard quota; `retry_after` is a hint in seconds."""
+
+
+@dataclass(frozen=True)
+class QuotaLimits:
+    """Requests and tokens allowed per window; 0 disables a limit."""
+
+    requests: int = 0
+    tokens: int = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self.requests or self.tokens)
+
+
+class MemoryQuotaStore:
+    """Quota counters of this worker process."""
+
+    name = "memory"
+
+    def __init__(self):
+        # key -> [window index, requests, tokens, previous requests, previous tokens]
+        self._counters: Dict[str, List[int]] = {}
+        self._charges = 0
+
+    async def usage(self, keys: Sequence[str], window: int) -> Dict[str, Usage]:
+        usage = {}
+        for key in keys:
+            counter = self._counters.get(key)
+            if counter is None or counter[0] < window - 1:
+                usage[key] = (0, 0, 0, 0)
+            elif counter[0] == window - 1:
+                usage[key] = (0, 0, counter[1], counter[2])
+            else:
+                usage[key] = (counter[1], counter[2], counter[3], counter[4])
+        return usage
+
+    async def add(self, keys: Sequence[str], window: int, requests: int, tokens: int) -> None:
+        for key in keys:
+            counter = self._counters.get(key)
+            if counter is None or counter[0] < window - 1:
+                counter = self._counters[key] = [window, 0, 0, 0, 0]
+            elif counter[0] == window - 1:
+                counter[:] = [window, 0, 0, counter[1], counter[2]]
+            counter[1] += requests
+            counter[2] += tokens
+
+        self._charges += 1
+        if self._charges % PRUNE_EVERY == 0:
+            self._counters = {key: counter for key, counter in self._counters.items() if counter[0] >= window - 1}
+
+    def stats(self) -> Dict[str, int]:
+        return {"tracked_keys": len(self._counters)}
+
+
+class DatabaseQuotaStore:
+    """Quota counters in the `quota_counters` table, one row per key and window."""
+
+    name = "database"
+
+    def __init__(self):
+        self._charges = 0
+
+    async def usage(self, keys: Sequence[str], window: int) -> Dict[str, Usage]:
+        # Primary key lookups: at most two rows per key
+        stmt = select(QuotaCounter.key, QuotaCounter.window_index, QuotaCounter.requests, QuotaCounter.tokens).where(
+            QuotaCounter.key.in_(keys), QuotaCounter.window_index.in_((window - 1, window))
+        )
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(stmt)).all()
+
+        counts = {key: [0, 0, 0, 0] for key in keys}
+        for key, window_index, requests, tokens in rows:
+            offset = 0 if window_index == window else 2
+            counts[key][offset:offset + 2] = [requests, tokens]
+        return {key: tuple(count) for key, count in counts.items()}
+
+    async def add(self, keys: Sequence[str], window: int, requests: int, tokens: int) -> None:
+        rows = [{"key": key, "window_index": window, "requests": requests, "tokens": tokens} for key in keys]
+        self._charges += 1
+        async with WriterSessionLocal() as session:
+            async with session.begin():
+                await session.execute(_upsert_counters(session.bind.dialect.name, rows))
+                if self._charges % PRUNE_EVERY == 0:
+                    await session.execute(delete(QuotaCounter).where(QuotaCounter.window_index < window - 1))
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+def _upsert_counters(dialect: str, rows: List[Dict[str, object]]):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    stmt = dialect_insert(QuotaCounter).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["key", "window_index"],
+        set_={
+            "requests": QuotaCounter.requests + stmt.excluded.requests,
+            "tokens": QuotaCounter.tokens + stmt.excluded.tokens,
+        },
+    )
+
+
+def seconds_until_below(current: int, previous: int, limit: int, elapsed: float, window_seconds: int) -> int:
+    """
+    Seconds until the sliding count `current + previous * (1 - elapsed)` drops below `limit`.
+
+    Args:
+        current: Count of the current fixed window
+        previous: Count of the previous fixed window
+        limit: Limit the count must drop below
+        elapsed: Fraction of the current window already elapsed
+        window_seconds: Window length
+    """
+    if current < limit:
+        # The previous window slides out while the current one stays put
+        fraction = 1 - (limit - current) / previous if previous else elapsed
+        return max(1, math.ceil((fraction - elapsed) * window_seconds))
+    # Only once the current window has become the previous one, and slid out far enough
+    fraction = 1 - limit / current
+    return max(1, math.ceil((1 - elapsed + fraction) * window_seconds))
+
+
+class QuotaManager:
+    """Checks and charges the client and session quotas of agent runs."""
+
+    def __init__(
+        self,
+        store,
+        window_seconds: int,
+        client_limits: QuotaLimits,
+        session_limits: QuotaLimits,
+        soft_ratio: float,
+    ):
+        self.store = store
+        self.window_seconds = window_seconds
+        self.limits = {"client": client_limits, "session": session_limits}
+        self.soft_ratio = soft_ratio
+        self.degraded = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "QuotaManager":
+        """Build the manager; counters kept in memory get this worker's share of the limits."""
+        if settings.QUOTA_BACKEND == "database":
+            store, share = DatabaseQuotaStore(), (lambda limit: limit)
+        else:
+            store, share = MemoryQuotaStore(), (lambda limit: per_worker(limit) if limit else 0)
+        return cls(
+            store=store,
+            window_seconds=settings.QUOTA_WINDOW_SECONDS,
+            client_limits=QuotaLimits(share(settings.QUOTA_CLIENT_REQUESTS), share(settings.QUOTA_CLIENT_TOKENS)),
+            session_limits=QuotaLimits(share(settings.QUOTA_SESSION_REQUESTS), share(settings.QUOTA_SESSION_TOKENS)),
+            soft_ratio=settings.QUOTA_SOFT_LIMIT_RATIO,
+        )
+
+    def _keys(self, client_id: Optional[str], session_id: Optional[str]) -> List[Tuple[str, str]]:
+        """(scope, counter key) of every quota that applies."""
+        keys = []
+        if client_id and self.limits["client"].active:
+            keys.append(("client", f"client:{client_id}"))
+        if session_id and self.limits["session"].active:
+            keys.append(("session", f"session:{session_id}"))
+        return keys
+
+    def _window(self) -> Tuple[int, float]:
+        """Index of the current fixed window and the fraction of it already elapsed."""
+        window, offset = divmod(time.time(), self.window_seconds)
+        return int(window), offset / self.window_seconds
+
+    async def check(self, client_id: Optional[str], session_id: Optional[str]) -> bool:
+        """
+        Check the quotas of a run about to start.
+
+        Args:
+            client_id: Identity of the caller (see `client_identity`), if known
+            session_id: Memory session of the run
+
+        Returns:
+            True if the run is past a soft limit and should use a cheaper model
+
+        Raises:
+            QuotaExceeded: If the client or session is at a hard limit
+        """
+        keys = self._keys(client_id, session_id)
+        if not keys:
+            return False
+        window, elapsed = self._window()
+        try:
+            usage = await self.store.usage([key for _, key in keys], window)
+        except Exception as e:
+            logger.warning(f"Quota check failed, letting the run through: {e}")
+            return False
+
+        degraded_scope = None
+        for scope, key in keys:
+            requests, tokens, previous_requests, previous_tokens = usage[key]
+            limits = self.limits[scope]
+            for unit, limit, current, previous in (
+                ("requests", limits.requests, requests, previous_requests),
+                ("tokens", limits.tokens, tokens, previous_tokens),
+            ):
+                if not limit:
+                    continue
+                used = current + previous * (1 - elapsed)
+                if used >= limit:
+                    self.rejected += 1
+                    AGENT_RUN_QUOTA_DECISIONS.labels(scope, "rejected").inc()
+                    raise QuotaExceeded(
+                        f"{scope.capitalize()} quota exceeded: {limit} {unit} per {self.window_seconds}s",
+                        seconds_until_below(current, previous, limit, elapsed, self.window_seconds),
+                    )
+                if used >= limit * self.soft_ratio:
+                    degraded_scope = degraded_scope or scope
+
+        if degraded_scope is not None:
+            self.degraded += 1
+            AGENT_RUN_QUOTA_DECISIONS.labels(degraded_scope, "degraded").inc()
+            hot_logger.info("Run for %s degraded: past the soft %s quota", session_id, degraded_scope)
+        return degraded_scope is not None
+
+    async def charge(
+        self, client_id: Optional[str], session_id: Optional[str], requests: int = 0, tokens: int = 0
+    ) -> None:
+        """Count requests and tokens against the client and session quotas."""
+        keys = self._keys(client_id, session_id)
+        if not keys or not (requests or tokens):
+            return
+        window, _ = self._window()
+        try:
+            await self.store.add([key for _, key in keys], window, requests, tokens)
+        except Exception as e:
+            logger.warning(f"Failed to charge quotas for session {session_id}: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "backend": self.store.name,
+            "window_seconds": self.window_seconds,
+            "client_limits": vars(self.limits["client"]),
+            "session_limits": vars(self.limits["session"]),
+            "soft_limit_ratio": self.soft_ratio,
+            "degraded": self.degraded,
+            "rejected": self.rejected,
+            **self.store.stats(),
+        }
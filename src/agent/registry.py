@@ -12,48 +12,63 @@ Benefits:
 """
 
 import os
+from functools import lru_cache
+from typing import Optional
 from agents import Agent, set_tracing_export_api_key
 
-from .models.fireworks import model as fireworks_model
-from .models.openai import model as openai_model
+from .models.fireworks import get_model as get_fireworks_model
+from .models.openai import get_model as get_openai_model
 from .models.settings import reasoning_model_settings, chat_model_settings
 from .prompt.example import INSTRUCTIONS
 from .tools.example import fetch_weather
-from src.app.core.logging import logger
+from src.app.core.config import load_env
+from src.app.core.logging import hot_logger, logger
 
-# Enable OpenAI tracing (with placeholder if key is missing)
-set_tracing_export_api_key(os.getenv('OPENAI_API_KEY', 'placeholder-key-for-tracing'))
+@lru_cache(maxsize=None)
+def configure_tracing() -> None:
+    """Enable OpenAI tracing once, when the first agent is created (with placeholder if key is missing)."""
+    load_env()
+    set_tracing_export_api_key(os.getenv('OPENAI_API_KEY', 'placeholder-key-for-tracing'))
 
-# Agent Configurations
+# Agent Configurations; "model" holds a factory so clients are only built for agents in use
 AGENT_CONFIGS = {
     "openai": {
         "name": "Agent (OpenAI)",
-        "model": openai_model,
+        "model": get_openai_model,
         "model_settings": chat_model_settings,
         "instructions": INSTRUCTIONS,
         "tools": [fetch_weather],
     },
     "fireworks": {
         "name": "Agent (Fireworks AI)",
-        "model": fireworks_model,
+        "model": get_fireworks_model,
         "model_settings": reasoning_model_settings,
         "instructions": INSTRUCTIONS,
         "tools": [fetch_weather],
     }
 }
 
+# Cheaper model per agent key, used for runs past a soft quota (see src/agent/quotas.py)
+DEGRADED_MODELS = {
+    "openai": "gpt-4.1-nano-2025-04-14",
+    "fireworks": "accounts/fireworks/models/gpt-oss-20b",
+}
+
 # Default agent configuration
 DEFAULT_AGENT = "openai"
 
-# Current active agent (can be changed via environment variable)
-CURRENT_AGENT_KEY = os.getenv('AGENT_TYPE', DEFAULT_AGENT)
+@lru_cache(maxsize=None)
+def current_agent_key() -> str:
+    """Key of the active agent, from the AGENT_TYPE environment variable (or `.env`)."""
+    load_env()
+    return os.getenv('AGENT_TYPE', DEFAULT_AGENT)
 
 def create_agent(agent_key: str = None) -> Agent:
     """
     Create an agent instance based on the configuration key.
     
     Args:
-        agent_key: Agent configuration key (defaults to CURRENT_AGENT_KEY)
+        agent_key: Agent configuration key (defaults to `current_agent_key()`)
         
     Returns:
         Agent instance
@@ -61,25 +76,44 @@ def create_agent(agent_key: str = None) -> Agent:
     Raises:
         KeyError: If agent_key is not found in AGENT_CONFIGS
     """
-    key = agent_key or CURRENT_AGENT_KEY
+    key = agent_key or current_agent_key()
     
     if key not in AGENT_CONFIGS:
         available_keys = list(AGENT_CONFIGS.keys())
         raise KeyError(f"Agent '{key}' not found. Available agents: {available_keys}")
     
     config = AGENT_CONFIGS[key]
-    logger.info(f"Creating agent: {config['name']} (key: {key})")
+    hot_logger.info("Creating agent: %s (key: %s)", config['name'], key)
     
-    return Agent(**config)
+    configure_tracing()
+    return Agent(**{**config, "model": config["model"]()})
 
+@lru_cache(maxsize=None)
 def get_current_agent() -> Agent:
     """
-    Get the current active agent instance.
+    Get the current active agent instance, created on first use.
     
     Returns:
         Current agent instance
     """
-    return create_agent(CURRENT_AGENT_KEY)
+    return create_agent(current_agent_key())
+
+@lru_cache(maxsize=None)
+def get_degraded_agent(agent_key: str = None) -> Optional[Agent]:
+    """
+    Get the agent with its cheaper model from DEGRADED_MODELS, created on first use.
+    
+    Args:
+        agent_key: Agent configuration key (defaults to `current_agent_key()`)
+        
+    Returns:
+        Agent instance, or None if the agent has no cheaper model
+    """
+    key = agent_key or current_agent_key()
+    if key not in AGENT_CONFIGS or key not in DEGRADED_MODELS:
+        return None
+    # Same instructions, tools and settings; the model shares the provider's client
+    return create_agent(key).clone(model=AGENT_CONFIGS[key]["model"](DEGRADED_MODELS[key]))
 
 def get_available_agents() -> list[str]:
     """
@@ -90,6 +124,11 @@ def get_available_agents() -> list[str]:
     """
     return list(AGENT_CONFIGS.keys())
 
-# Create the default agent instance
-# This is the main export that other modules will import
-current_agent = get_current_agent()
\ No newline at end of file
+def __getattr__(name: str):
+    # `current_agent` is still importable, but the agent is only built when first accessed
+    if name == "current_agent":
+        return get_current_agent()
+    # Read lazily too, so AGENT_TYPE set in `.env` is seen
+    if name == "CURRENT_AGENT_KEY":
+        return current_agent_key()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,470 @@
+"""
+Agent Run Streams
+
+Resumable, fan-out event streams for in-flight agent runs.
+
+Each run is driven by a background task that converts the Agent SDK stream
+into small JSON-serializable events and appends them to a bounded ring
+buffer. Any number of subscribers can watch the same run without extra
+model calls, and a client that drops mid-stream can reconnect with the id
+of the last event it saw to replay only what it missed. Events evicted from
+the ring buffer can optionally be spilled to the database so late
+reconnects still get a complete replay; a run's spilled events are deleted
+when the run expires, or when the process shuts down and its runs can no
+longer be reconnected to. Events that can no longer be
+replayed (no spill, or a spill write that has not succeeded yet) are never
+skipped silently: the subscriber gets a `gap` event naming the missing ids
+in their place.
+
+Starting a run first checks the client and session quotas
+(`src.agent.quotas`), which may switch the run to a cheaper model, then
+takes a permit from the admission controller (`src.agent.admission`), so
+the number of concurrent runs stays bounded.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Deque, Dict, List, Optional, Set
+
+from sqlalchemy import delete, insert, select
+
+from src.agent.admission import AdmissionController
+from src.agent.quotas import QuotaManager
+from src.app.core.init_settings import global_settings
+from src.app.core.logging import bind_log_context, hot_logger, logger
+from src.app.core.metrics import AGENT_RUN_SECONDS, StreamTimer, cache_counters
+from src.app.core.tracing import tracer
+from src.db.database import AsyncSessionLocal
+from src.db.models import RunEvent
+
+if TYPE_CHECKING:
+    from agents import Agent
+
+# Reconnect replays served from the ring buffer (hit) or needing the database spill (miss)
+REPLAY_HITS, REPLAY_MISSES = cache_counters("run_stream_replay")
+
+
+@dataclass
+class RunStreamEvent:
+    """A single event emitted by an agent run."""
+
+    id: int
+    type: str
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    def to_sse(self) -> str:
+        """Format the event as a Server-Sent Events frame."""
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n"
+
+
+class RunEventSpill:
+    """Persists events evicted from a run's ring buffer to the `run_events` table."""
+
+    async def write(self, run_id: str, events: List[RunStreamEvent]) -> None:
+        if not events:
+            return
+        rows = [
+            {"run_id": run_id, "seq": event.id, "type": event.type, "data": json.dumps(event.data)}
+            for event in events
+        ]
+        async with AsyncSessionLocal() as session:
+            async with session.begin():
+                await session.execute(insert(RunEvent), rows)
+
+    async def read(self, run_id: str, after_id: int, before_id: int) -> List[RunStreamEvent]:
+        stmt = (
+            select(RunEvent.seq, RunEvent.type, RunEvent.data)
+            .where(RunEvent.run_id == run_id, RunEvent.seq > after_id, RunEvent.seq < before_id)
+            .order_by(RunEvent.seq)
+        )
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmt)
+            return [RunStreamEvent(id=seq, type=type_, data=json.loads(data)) for seq, type_, data in result.all()]
+
+    async def delete(self, run_ids: List[str]) -> None:
+        if not run_ids:
+            return
+        async with AsyncSessionLocal() as session:
+            async with session.begin():
+                await session.execute(delete(RunEvent).where(RunEvent.run_id.in_(run_ids)))
+
+
+class RunStream:
+    """
+    Event log and fan-out point for one agent run.
+
+    Events get monotonically increasing ids starting at 1. The most recent
+    `buffer_size` events are kept in memory; older ones are handed to the
+    spill (when configured) before being dropped. A batch the spill fails to
+    write stays in memory and is retried with the next eviction or replay.
+    """
+
+    TERMINAL_EVENTS = ("completed", "error")
+    # Sent to a subscriber in place of events it missed that can no longer be replayed
+    GAP_EVENT = "gap"
+
+    def __init__(
+        self,
+        run_id: str,
+        session_id: str,
+        buffer_size: int,
+        spill: Optional[RunEventSpill] = None,
+    ):
+        self.run_id = run_id
+        self.session_id = session_id
+        self.status = "running"
+        # Running with the agent's cheaper model because of a soft quota
+        self.degraded = False
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+        self._events: Deque[RunStreamEvent] = deque(maxlen=buffer_size)
+        self._next_id = 1
+        self._changed = asyncio.Condition()
+        self._spill = spill
+        self._pending_spill: List[RunStreamEvent] = []
+        self._spill_task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    @property
+    def last_event_id(self) -> int:
+        return self._next_id - 1
+
+    @property
+    def spilled(self) -> bool:
+        """Whether any event was evicted from the ring buffer (and handed to the spill, if any)."""
+        return bool(self._events.maxlen) and self.last_event_id > self._events.maxlen
+
+    async def append(self, type: str, data: Optional[Dict[str, Any]] = None) -> RunStreamEvent:
+        """Append an event and wake up every subscriber."""
+        event = RunStreamEvent(id=self._next_id, type=type, data=data or {})
+        self._next_id += 1
+
+        if self._events.maxlen and len(self._events) == self._events.maxlen:
+            evicted = self._events[0]
+            if self._spill is not None:
+                self._pending_spill.append(evicted)
+                self._schedule_spill()
+
+        self._events.append(event)
+        if type in self.TERMINAL_EVENTS:
+            self.status = "completed" if type == "completed" else "failed"
+            self.finished_at = time.monotonic()
+
+        async with self._changed:
+            self._changed.notify_all()
+        return event
+
+    def _schedule_spill(self) -> None:
+        # One writer at a time; evictions that arrive meanwhile are batched into the next write
+        if self._spill_task is None or self._spill_task.done():
+            self._spill_task = asyncio.create_task(self._flush_spill())
+
+    async def _flush_spill(self) -> None:
+        while self._pending_spill:
+            batch, self._pending_spill = self._pending_spill, []
+            try:
+                await self._spill.write(self.run_id, batch)
+            except Exception as e:
+                # Keep the batch (ahead of newer evictions) for the next attempt
+                self._pending_spill = batch + self._pending_spill
+                hot_logger.error("Failed to spill %d events for run %s, will retry: %s", len(batch), self.run_id, e)
+                return
+
+    async def flush(self) -> None:
+        """Write every evicted event to the spill, retrying batches that failed before."""
+        if self._pending_spill:
+            self._schedule_spill()
+        if self._spill_task is not None:
+            await self._spill_task
+
+    def _gap(self, after_id: int, before_id: int) -> RunStreamEvent:
+        # Carries the last missing id, so a client reconnecting with it does not ask for them again
+        return RunStreamEvent(
+            id=before_id - 1, type=self.GAP_EVENT, data={"first_id": after_id + 1, "last_id": before_id - 1}
+        )
+
+    async def _replay(self, after_id: int, before_id: int) -> AsyncIterator[RunStreamEvent]:
+        """Evicted events with ids between `after_id` and `before_id`, and gap events for the lost ones."""
+        events: List[RunStreamEvent] = []
+        if self._spill is not None:
+            await self.flush()
+            try:
+                events = await self._spill.read(self.run_id, after_id, before_id)
+            except Exception as e:
+                logger.error(f"Failed to read spilled events for run {self.run_id}: {e}")
+            # Batches whose write failed are still in memory
+            events += [event for event in self._pending_spill if after_id < event.id < before_id]
+
+        cursor = after_id
+        for event in sorted({event.id: event for event in events}.values(), key=lambda event: event.id):
+            if event.id > cursor + 1:
+                yield self._gap(cursor, event.id)
+            cursor = event.id
+            yield event
+        if cursor + 1 < before_id:
+            yield self._gap(cursor, before_id)
+
+    async def subscribe(self, last_event_id: int = 0) -> AsyncIterator[RunStreamEvent]:
+        """
+        Yield events newer than `last_event_id` until the run finishes.
+
+        Missed events that can no longer be replayed are replaced by a `gap`
+        event per run of missing ids, with the last missing id as its id.
+
+        Args:
+            last_event_id: Id of the last event the client already has (0 for a full replay)
+        """
+        cursor = last_event_id
+        if cursor:
+            oldest_buffered = self._events[0].id if self._events else self._next_id
+            (REPLAY_MISSES if cursor + 1 < oldest_buffered else REPLAY_HITS).inc()
+        while True:
+            oldest_buffered = self._events[0].id if self._events else self._next_id
+            if cursor + 1 < oldest_buffered:
+                async for event in self._replay(cursor, oldest_buffered):
+                    cursor = event.id
+                    yield event
+
+            caught_up = True
+            for event in list(self._events):
+                if event.id <= cursor:
+                    continue
+                if event.id > cursor + 1:
+                    # Evicted while this subscriber was catching up; replay them on the next pass
+                    caught_up = False
+                    break
+                cursor = event.id
+                yield event
+            if not caught_up:
+                continue
+
+            if self.done and cursor >= self.last_event_id:
+                return
+
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done or self.last_event_id > cursor)
+
+
+class RunManagerClosed(RuntimeError):
+    """Raised when a run is requested after the manager stopped accepting new runs."""
+
+
+class RunManager:
+    """Starts agent runs in the background and keeps their streams available for replay."""
+
+    def __init__(
+        self,
+        buffer_size: int = global_settings.RUN_STREAM_BUFFER_SIZE,
+        ttl_seconds: int = global_settings.RUN_STREAM_TTL_SECONDS,
+        spill: Optional[RunEventSpill] = None,
+        admission: Optional[AdmissionController] = None,
+        quotas: Optional[QuotaManager] = None,
+    ):
+        self.buffer_size = buffer_size
+        self.ttl_seconds = ttl_seconds
+        self.spill = spill
+        self.admission = admission or AdmissionController.from_settings(global_settings)
+        self.quotas = quotas or QuotaManager.from_settings(global_settings)
+        self.accepting = True
+        self._runs: Dict[str, RunStream] = {}
+        self._cleanup_tasks: Set[asyncio.Task] = set()
+
+    async def start(
+        self,
+        session_id: str,
+        user_input: str,
+        agent: Optional["Agent"] = None,
+        agent_key: Optional[str] = None,
+        client_id: Optional[str] = None,
+    ) -> RunStream:
+        """
+        Start an agent run for the given memory session, once admission control lets it in.
+
+        Args:
+            session_id: Memory session the run reads from and writes to
+            user_input: User message for this turn
+            agent: Agent to run (defaults to the current agent)
+            agent_key: Key the run counts against for per-agent limits
+                (defaults to the current agent's key, or the name of `agent`)
+            client_id: Identity of the caller for per-client quotas (see `client_identity`)
+
+        Returns:
+            The run's stream, ready to be subscribed to
+
+        Raises:
+            RunManagerClosed: If the manager is shutting down
+            QuotaExceeded: If the client or session is over a hard quota
+            AdmissionRejected: If the run was shed by admission control
+        """
+        if not self.accepting:
+            raise RunManagerClosed("Server is shutting down; not accepting new runs")
+
+        from src.agent.registry import current_agent_key, get_current_agent, get_degraded_agent
+
+        key = agent_key or (agent.name if agent is not None else current_agent_key())
+        # Before admission, so runs over quota never take a slot or a queue place
+        degraded = await self.quotas.check(client_id, session_id)
+        await self.admission.acquire(key)
+        try:
+            self._evict_expired()
+            run = RunStream(str(uuid.uuid4()), session_id, self.buffer_size, self.spill)
+            if agent is None:
+                cheaper = get_degraded_agent(key) if degraded else None
+                run.degraded = cheaper is not None
+                agent = cheaper or get_current_agent()
+            # Inside the guard: until the task's done callback is attached, the slot is released here
+            await self.quotas.charge(client_id, session_id, requests=1)
+        except BaseException:
+            self.admission.release(key)
+            raise
+        started = time.monotonic()
+        run.task = asyncio.create_task(self._drive(run, agent, user_input, key, client_id))
+        # A done callback also fires for a task cancelled before it ever ran
+        run.task.add_done_callback(lambda _: self.admission.release(key, time.monotonic() - started))
+        self._runs[run.run_id] = run
+        hot_logger.info("Started run %s for session %s", run.run_id, session_id)
+        return run
+
+    def get(self, run_id: str) -> Optional[RunStream]:
+        return self._runs.get(run_id)
+
+    def in_flight(self) -> List[RunStream]:
+        return [run for run in self._runs.values() if not run.done]
+
+    def stop_accepting(self) -> None:
+        self.accepting = False
+        self.admission.reject_waiting("Server is shutting down")
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Wait for in-flight runs to finish, cancelling the ones still running after `timeout`.
+
+        Cancelled runs end with an "error" event so their subscribers close cleanly,
+        and every run's spilled events are flushed before this returns.
+
+        Args:
+            timeout: Seconds to wait before cancelling
+        """
+        tasks = [run.task for run in self.in_flight() if run.task is not None]
+        if not tasks:
+            return
+
+        logger.info(f"Draining {len(tasks)} in-flight runs (up to {timeout:g}s)")
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logger.warning(f"Cancelling {len(pending)} runs still in flight after {timeout:g}s")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [
+            run_id for run_id, run in self._runs.items()
+            if run.finished_at is not None and now - run.finished_at > self.ttl_seconds
+        ]
+        spilled = [self._runs.pop(run_id) for run_id in expired]
+        spilled = [run for run in spilled if run.spilled]
+        if self.spill is not None and spilled:
+            task = asyncio.create_task(self._delete_spilled(spilled))
+            self._cleanup_tasks.add(task)
+            task.add_done_callback(self._cleanup_tasks.discard)
+
+    async def _delete_spilled(self, runs: List[RunStream]) -> None:
+        # A write still in flight would insert rows behind the delete
+        for run in runs:
+            await run.flush()
+        try:
+            await self.spill.delete([run.run_id for run in runs])
+        except Exception as e:
+            logger.error(f"Failed to delete spilled events of {len(runs)} runs: {e}")
+
+    async def discard_spilled(self) -> None:
+        """
+        Delete the spilled events of every run this manager knows of.
+
+        Called on shutdown, after `drain`: the runs live in this process only,
+        so their events cannot be replayed once it exits.
+        """
+        await asyncio.gather(*self._cleanup_tasks, return_exceptions=True)
+        if self.spill is None:
+            return
+        runs = [run for run in self._runs.values() if run.spilled]
+        if runs:
+            await self._delete_spilled(runs)
+
+    async def _drive(
+        self, run: RunStream, agent: "Agent", user_input: str, agent_key: str, client_id: Optional[str] = None
+    ) -> None:
+        # The Agents SDK is imported with the first run, not when the API starts
+        from agents import Runner
+        from openai.types.responses import ResponseTextDeltaEvent
+        from src.agent.hooks import TurnHooks
+        from src.agent.memory import get_or_create_memory_session
+
+        # The task runs in its own copy of the context: these fields tag this run's records only
+        bind_log_context(run_id=run.run_id, session_id=run.session_id, agent=agent_key)
+        started = time.perf_counter()
+        model = str(getattr(agent.model, "model", agent.model))
+        stream_timer = StreamTimer(model, "agent")
+        hooks = TurnHooks(model, agent_key, run.session_id, run.run_id)
+        outcome = "error"
+        # Root span of the turn; memory, model, tool and DB spans are its children
+        with tracer.span("agent.turn", root=True, agent=agent_key, run_id=run.run_id, session_id=run.session_id) as turn_span:
+            try:
+                memory_session = await get_or_create_memory_session(run.session_id)
+                result = Runner.run_streamed(agent, input=user_input, session=memory_session, hooks=hooks)
+
+                async for event in result.stream_events():
+                    if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                        stream_timer.token()
+                        hooks.first_token()
+                        await run.append("text_delta", {"delta": event.data.delta})
+
+                    elif event.type == "run_item_stream_event":
+                        if getattr(event, "name", None) == "tool_called" and getattr(event.item, "type", "") == "tool_call_item":
+                            raw_item = getattr(event.item, "raw_item", None)
+                            tool_name = (
+                                getattr(raw_item, "name", None)
+                                or getattr(raw_item, "tool_name", None)
+                                or "tool"
+                            )
+                            await run.append("tool_called", {
+                                "name": tool_name,
+                                "arguments": getattr(raw_item, "arguments", None),
+                            })
+
+                stream_timer.finish()
+                # Time to first token and token pacing of the turn, as the user saw it
+                await run.append("completed", {"timing": stream_timer.summary()})
+                outcome = "completed"
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                await run.append("error", {"message": "Run cancelled: server is shutting down"})
+                raise
+            except Exception as e:
+                logger.error(f"Error in agent run {run.run_id}: {e}")
+                turn_span.set_attribute("error", str(e))
+                await run.append("error", {"message": str(e)})
+            finally:
+                hooks.close()
+                stream_timer.finish()
+                for key, value in stream_timer.summary().items():
+                    if value is not None:
+                        turn_span.set_attribute(f"stream.{key}", value)
+                turn_span.set_attribute("outcome", outcome)
+                AGENT_RUN_SECONDS.labels(agent_key, outcome).observe(time.perf_counter() - started)
+                await self.quotas.charge(client_id, run.session_id, tokens=hooks.total_tokens)
+                await run.flush()
+
+
+# Process-wide run manager shared by the Gradio UI and the API
+run_manager = RunManager(spill=RunEventSpill() if global_settings.RUN_STREAM_DB_SPILL else None)
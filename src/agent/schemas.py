@@ -4,4 +4,16 @@ Agent Schemas
 Data models and schemas for agent operations.
 """
 
-# TODO: Implement agent-specific Pydantic models
+from pydantic import BaseModel
+
+
+class RunCreate(BaseModel):
+    session_id: str
+    input: str
+
+
+class RunCreated(BaseModel):
+    run_id: str
+    session_id: str
+    # True when the run uses a cheaper model because of a soft quota
+    degraded: bool = False
@@ -0,0 +1,83 @@
+"""
+Admin Endpoints
+
+Profiling of the worker that answers the request (see `src.app.core.profiling`),
+and the top consumers in the usage ledger (see `src.app.core.usage`).
+
+Every endpoint requires the `X-Admin-Token` header to match ADMIN_TOKEN; the
+router is only registered when ADMIN_TOKEN is set. With several workers each
+request reaches one of them; `X-Worker-Pid` tells which.
+"""
+
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from src.app.core.init_settings import global_settings
+from src.app.core.profiling import ProfilerBusy, loop_watchdog, profiler
+from src.app.core.usage import top_consumers, usage_ledger, usage_per_minute, window_start
+
+
+def require_admin(x_admin_token: str = Header("")) -> None:
+    if not hmac.compare_digest(x_admin_token.encode(), (global_settings.ADMIN_TOKEN or "").encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+WORKER = {"X-Worker-Pid": str(os.getpid())}
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def capture_profile(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    threads: str = Query("loop", pattern="^(loop|all)$"),
+):
+    # Collapsed stacks: pipe into flamegraph.pl or open in speedscope
+    try:
+        stacks = await profiler.capture(seconds, interval_ms / 1000, loop_only=threads == "loop")
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(stacks, headers=WORKER)
+
+
+@router.get("/profile/requests/{profile_id}", response_class=PlainTextResponse)
+def request_profile(profile_id: str):
+    # Profile of a request sent with `X-Profile: <ADMIN_TOKEN>`, by its X-Profile-Id
+    stacks = profiler.request_profile(profile_id)
+    if stacks is None:
+        raise HTTPException(status_code=404, detail="Profile not found on this worker")
+    return PlainTextResponse(stacks, headers=WORKER)
+
+
+@router.get("/loop")
+def loop_lag():
+    return {**loop_watchdog.stats(), "worker_pid": os.getpid()}
+
+
+@router.get("/loop/slow-callbacks")
+async def slow_callbacks(seconds: float = Query(10.0, gt=0), threshold_ms: float = Query(50.0, gt=0)):
+    try:
+        reports = await profiler.slow_callbacks(seconds, threshold_ms / 1000)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"worker_pid": os.getpid(), "threshold_ms": threshold_ms, "slow_callbacks": reports}
+
+
+@router.get("/usage/top")
+async def top_usage(
+    by: str = Query("agent", pattern="^(agent|model|session)$"),
+    minutes: int = Query(60, ge=1, le=60 * 24 * 31),
+    limit: int = Query(10, ge=1, le=100),
+):
+    # Entries still buffered in a worker (up to USAGE_FLUSH_INTERVAL_SECONDS old) are not counted yet
+    return {"by": by, "minutes": minutes, "top": await top_consumers(by, window_start(minutes), limit)}
+
+
+@router.get("/usage/minutes")
+async def usage_minutes(minutes: int = Query(60, ge=1, le=60 * 24), agent: Optional[str] = None):
+    return {"minutes": await usage_per_minute(window_start(minutes), agent), "ledger": usage_ledger.stats()}
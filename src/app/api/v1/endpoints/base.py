@@ -1,7 +1,37 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse, Response
+from src.agent.runs import run_manager
+from src.app.core.metrics import render_metrics
+from src.app.core.warmup import readiness
+from src.db.database import get_pool_stats
 
 router = APIRouter()
 
 @router.get("/")
 def onboard_message():
-    return {"message": "You've been onboarded!"}
\ No newline at end of file
+    return {"message": "You've been onboarded!"}
+
+@router.get("/health/db")
+def database_pool_stats():
+    return get_pool_stats()
+
+@router.get("/health/ready")
+def ready():
+    # 503 until warm-up has finished and again once shutdown starts, so load balancers hold traffic
+    return JSONResponse(readiness.as_dict(), status_code=200 if readiness.ready else 503)
+
+@router.get("/health/admission")
+def admission_stats():
+    # In-flight agent runs and admission queue depth of this worker
+    return run_manager.admission.stats()
+
+@router.get("/health/quotas")
+def quota_stats():
+    # Quota limits of this worker and how many runs they degraded or rejected
+    return run_manager.quotas.stats()
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    # Prometheus scrape endpoint; aggregates every worker in multi-worker mode
+    payload, content_type = render_metrics()
+    return Response(payload, media_type=content_type)
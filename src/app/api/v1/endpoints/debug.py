@@ -0,0 +1,80 @@
+"""
+Debug Endpoints
+
+Waterfall view of the slowest recent agent turns.
+
+`GET /debug/traces` renders the slowest traces kept in this worker's span
+ring buffer (see `src.app.core.tracing`). Each row is a span, indented under
+its parent, with a bar showing when it started and how long it took
+relative to the whole turn. `?format=json` returns the raw spans.
+Registered only when TRACING_DEBUG_ENDPOINT is enabled.
+"""
+
+import html
+from typing import Dict, List
+
+from fastapi import APIRouter, Query
+from fastapi.responses import HTMLResponse, JSONResponse
+
+from src.app.core.tracing import Span, tracer
+
+router = APIRouter()
+
+PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Slowest turns</title><style>
+body {{ font: 13px system-ui, sans-serif; margin: 24px; }}
+h2 {{ font-size: 15px; margin: 28px 0 6px; }}
+table {{ border-collapse: collapse; width: 100%; }}
+td {{ padding: 2px 6px; white-space: nowrap; }}
+td.name {{ width: 32%; overflow: hidden; text-overflow: ellipsis; max-width: 0; }}
+td.ms {{ width: 8%; text-align: right; color: #555; }}
+td.bar {{ width: 60%; }}
+.track {{ position: relative; height: 12px; background: #f2f2f2; }}
+.fill {{ position: absolute; height: 12px; min-width: 1px; background: #4a7bd0; }}
+.client {{ background: #d08a4a; }} .error {{ background: #c83c3c; }}
+</style></head><body><h1>Slowest {count} recent turns</h1>{traces}</body></html>"""
+
+
+def _ordered(trace: List[Span]) -> List[tuple]:
+    """Spans depth-first from the root, each with its depth."""
+    children: Dict[str, List[Span]] = {}
+    for span in trace:
+        children.setdefault(span.parent_id, []).append(span)
+    rows = []
+
+    def visit(span: Span, depth: int) -> None:
+        rows.append((span, depth))
+        for child in sorted(children.get(span.span_id, []), key=lambda s: s.start_ns):
+            visit(child, depth + 1)
+
+    for root in children.get(None, []):
+        visit(root, 0)
+    return rows
+
+
+def render_waterfall(trace: List[Span]) -> str:
+    rows = _ordered(trace)
+    root = rows[0][0]
+    total_ns = max(root.end_ns - root.start_ns, 1)
+    lines = []
+    for span, depth in rows:
+        left = (span.start_ns - root.start_ns) / total_ns * 100
+        width = (span.end_ns - span.start_ns) / total_ns * 100
+        css = "fill error" if span.error else f"fill {span.kind}"
+        detail = span.attributes.get("db.statement") or span.error or ""
+        label = html.escape(span.name + (f" — {detail}" if detail else ""))
+        lines.append(
+            f'<tr><td class="name" title="{label}" style="padding-left:{6 + depth * 14}px">{label}</td>'
+            f'<td class="ms">{span.duration_ms:.1f} ms</td>'
+            f'<td class="bar"><div class="track"><div class="{css}" style="left:{left:.2f}%;width:{width:.2f}%"></div></div></td></tr>'
+        )
+    title = html.escape(f"{root.name} · {root.duration_ms:.0f} ms · " + ", ".join(f"{k}={v}" for k, v in root.attributes.items()))
+    return f"<h2>{title}</h2><table>{''.join(lines)}</table>"
+
+
+@router.get("/traces")
+def slowest_traces(limit: int = Query(10, ge=1, le=100), format: str = "html"):
+    traces = tracer.ring.slowest(limit)
+    if format == "json":
+        return JSONResponse([[span.as_dict() for span in trace] for trace in traces])
+    return HTMLResponse(PAGE.format(count=len(traces), traces="".join(render_waterfall(trace) for trace in traces)))
@@ -4,4 +4,43 @@ Message API Endpoints
 Message-related API endpoints for agent communication.
 """
 
-# TODO: Implement message endpoints for agent interaction
+from typing import List, Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, Query
+from src.db.crud import MessageService
+from src.db.crud.message import encode_cursor
+from src.db.schemas import MessageBase, MessageCreate, MessagePage, MessageSchema
+
+router = APIRouter()
+
+@router.get("", response_model=MessagePage)
+async def list_messages(
+    after: Optional[str] = None,
+    limit: int = Query(30, ge=1, le=500),
+    owner_id: Optional[str] = None,
+    newest_first: bool = False,
+    service: MessageService = Depends(),
+):
+    items = await service.get_messages(after=after, limit=limit, owner_id=owner_id, newest_first=newest_first)
+    next_cursor = encode_cursor(items[-1]) if len(items) == limit else None
+    return MessagePage(items=items, next_cursor=next_cursor)
+
+@router.post("", response_model=MessageSchema)
+async def create_message(message_data: MessageCreate, service: MessageService = Depends()):
+    return await service.create_message(message_data)
+
+@router.post("/bulk", response_model=List[MessageSchema])
+async def create_messages_bulk(messages: List[MessageCreate], service: MessageService = Depends()):
+    return await service.create_messages_bulk(messages)
+
+@router.get("/{message_id}", response_model=MessageSchema)
+async def get_message(message_id: UUID, service: MessageService = Depends()):
+    return await service.get_message(message_id)
+
+@router.put("/{message_id}", response_model=MessageSchema)
+async def update_message(message_id: UUID, message_data: MessageBase, service: MessageService = Depends()):
+    return await service.update_message(message_id, message_data)
+
+@router.delete("/{message_id}", response_model=MessageSchema)
+async def delete_message(message_id: UUID, service: MessageService = Depends()):
+    return await service.delete_message(message_id)
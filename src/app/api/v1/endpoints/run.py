@@ -0,0 +1,70 @@
+"""
+Run API Endpoints
+
+Start agent runs and stream their events. Streams are resumable: clients
+that reconnect with a `Last-Event-ID` header (or `last_event_id` query
+parameter) only receive the events they missed, and several clients can
+watch the same run without triggering extra model calls. Missed events that
+are no longer available come as a `gap` event with the missing ids.
+
+Runs live in the worker process that started them. With several server
+workers, `POST ?stream=true` starts the run and streams its events on the
+same connection, so the stream cannot land on another worker.
+
+Runs count against the quotas of the caller (a known `X-API-Key`, or else its
+IP address) and of the session. Over a quota the API answers 429; runs past
+a soft quota use a cheaper model and carry an `X-Quota-Degraded` header.
+"""
+
+from typing import Dict, Optional
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from src.agent.admission import AdmissionRejected
+from src.agent.quotas import QuotaExceeded
+from src.agent.runs import RunManagerClosed, RunStream, run_manager
+from src.agent.schemas import RunCreate, RunCreated
+from src.app.core.identity import client_identity
+
+router = APIRouter()
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def event_response(run: RunStream, cursor: int = 0, headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    async def event_source():
+        async for event in run.subscribe(cursor):
+            yield event.to_sse()
+
+    return StreamingResponse(event_source(), media_type="text/event-stream", headers={**SSE_HEADERS, **(headers or {})})
+
+@router.post("", response_model=RunCreated)
+async def create_run(run_data: RunCreate, request: Request, response: Response, stream: bool = False):
+    try:
+        run = await run_manager.start(run_data.session_id, run_data.input, client_id=client_identity(request))
+    except RunManagerClosed as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except QuotaExceeded as e:
+        # The caller's own limit, not server load
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except AdmissionRejected as e:
+        # Shed load: fail fast and tell the client when to come back
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    headers = {"X-Run-Id": run.run_id}
+    if run.degraded:
+        headers["X-Quota-Degraded"] = "1"
+    if stream:
+        return event_response(run, headers=headers)
+    response.headers.update(headers)
+    return RunCreated(run_id=run.run_id, session_id=run.session_id, degraded=run.degraded)
+
+@router.get("/{run_id}/events")
+async def stream_run_events(
+    run_id: str,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[int] = Header(None, alias="Last-Event-ID"),
+):
+    run = run_manager.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+
+    cursor = last_event_id_header if last_event_id_header is not None else (last_event_id or 0)
+    return event_response(run, cursor)
@@ -0,0 +1,37 @@
+"""
+Provider Clients
+
+Registry of the AsyncOpenAI clients created by the application.
+
+Each client owns an aiohttp connection pool. Registering it here lets the
+lifespan close every pool on shutdown instead of leaking open sockets.
+"""
+
+import asyncio
+from typing import TYPE_CHECKING, List
+
+from src.app.core.logging import logger
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+_clients: List["AsyncOpenAI"] = []
+
+
+def register_client(client: "AsyncOpenAI") -> "AsyncOpenAI":
+    """Track a client so it is closed on shutdown, and return it unchanged."""
+    _clients.append(client)
+    return client
+
+
+def registered_clients() -> List["AsyncOpenAI"]:
+    return list(_clients)
+
+
+async def close_clients() -> None:
+    """Close every registered client's HTTP connection pool."""
+    clients, _clients[:] = list(_clients), []
+    results = await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+    for client, result in zip(clients, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to close client for {client.base_url}: {result}")
@@ -1,4 +1,6 @@
 import os
+from functools import lru_cache
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -10,6 +12,141 @@ class Settings(BaseSettings):
     USER_NAME: str = os.getenv('USER_NAME', '')
     PASSWORD: str = os.getenv('PASSWORD', '')
 
+    # Agent run streams: events kept in memory per run for reconnecting clients
+    RUN_STREAM_BUFFER_SIZE: int = 1024
+    # Persist events evicted from the in-memory buffer so late reconnects can still replay them
+    RUN_STREAM_DB_SPILL: bool = False
+    # Seconds a finished run stays available for replay
+    RUN_STREAM_TTL_SECONDS: int = 300
+
+    # Agent run admission (see src/agent/admission.py); limits are for the whole instance
+    ADMISSION_MAX_IN_FLIGHT: int = 64
+    # Per agent key; 0 disables the per-agent limit, ADMISSION_AGENT_LIMITS overrides it per key (JSON)
+    ADMISSION_MAX_IN_FLIGHT_PER_AGENT: int = 0
+    ADMISSION_AGENT_LIMITS: Dict[str, int] = {}
+    # Runs waiting for a slot; beyond this new runs get 503 right away
+    ADMISSION_QUEUE_SIZE: int = 128
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10.0
+
+    # Run quotas (see src/agent/quotas.py): sliding window per client and per session; 0 disables a limit
+    QUOTA_WINDOW_SECONDS: int = 3600
+    QUOTA_CLIENT_REQUESTS: int = 0
+    QUOTA_CLIENT_TOKENS: int = 0
+    QUOTA_SESSION_REQUESTS: int = 0
+    QUOTA_SESSION_TOKENS: int = 0
+    # Past this share of a limit, runs use the agent's cheaper model (registry DEGRADED_MODELS)
+    QUOTA_SOFT_LIMIT_RATIO: float = 0.8
+    # "memory" counts per worker process; "database" shares the counters across workers and instances
+    QUOTA_BACKEND: str = "memory"
+    # Comma-separated API keys counted as their own client (X-API-Key); other callers are counted by IP
+    QUOTA_API_KEYS: str = ""
+    # Proxies in front of the app that append to X-Forwarded-For; 0 uses the connection's peer address
+    TRUSTED_PROXY_HOPS: int = 0
+    # Use CF-Connecting-IP as the client address; only when every request comes through Cloudflare
+    TRUST_CF_CONNECTING_IP: bool = False
+
+    # Usage ledger (see src/app/core/usage.py): entries are buffered and written in batches
+    USAGE_BATCH_SIZE: int = 200
+    USAGE_FLUSH_INTERVAL_SECONDS: float = 5.0
+    # Entries kept while the database is unreachable; the oldest are dropped beyond this
+    USAGE_BUFFER_MAX: int = 20000
+    # USD per million tokens, matched on the longest model name prefix
+    LLM_PRICING: Dict[str, Dict[str, float]] = {
+        "gpt-4.1-nano": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+        "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+        "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+        "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+        "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+        "accounts/fireworks/models/gpt-oss-120b": {"input": 0.15, "output": 0.60},
+        "accounts/fireworks/models/gpt-oss-20b": {"input": 0.07, "output": 0.30},
+    }
+
+    # Streamed responses pausing this long between two tokens count as stalled (see StreamTimer)
+    LLM_STREAM_STALL_SECONDS: float = 2.0
+
+    # Identical concurrent chain calls share one upstream stream (see src/chain/singleflight.py)
+    CHAIN_SINGLE_FLIGHT: bool = True
+
+    # Span tracing of agent turns (see src/app/core/tracing.py); sampling is decided per turn
+    TRACING_ENABLED: bool = True
+    TRACING_SAMPLE_RATE: float = 1.0
+    # Recent traces kept in memory for /debug/traces
+    TRACING_RING_BUFFER_SIZE: int = 200
+    # OTLP/HTTP traces endpoint of a local collector, e.g. http://localhost:4318/v1/traces
+    TRACING_OTLP_ENDPOINT: Optional[str] = None
+    TRACING_QUEUE_SIZE: int = 8192
+    TRACING_BATCH_SIZE: int = 512
+    TRACING_EXPORT_INTERVAL_SECONDS: float = 2.0
+    # Serve the /debug/traces waterfall page
+    TRACING_DEBUG_ENDPOINT: bool = True
+
+    # Token for the /admin endpoints and per-request profiling (X-Profile header); unset disables both
+    ADMIN_TOKEN: Optional[str] = None
+    # Longest profile an admin can request (see src/app/core/profiling.py)
+    PROFILING_MAX_SECONDS: float = 60.0
+    # Event loop watchdog: lag sampled every interval; a loop blocked longer than the threshold
+    # is reported with the blocking stack (logged and kept for /admin/loop)
+    LOOP_LAG_MONITOR: bool = True
+    LOOP_LAG_INTERVAL_SECONDS: float = 0.5
+    LOOP_LAG_WARN_SECONDS: float = 0.1
+
+    # Seconds in-flight agent runs get to finish on shutdown before they are cancelled
+    SHUTDOWN_DRAIN_SECONDS: float = 20.0
+
+    # Gradio UIs mounted by src.app.main; disable both for API-only workers
+    MOUNT_AGENT_UI: bool = True
+    MOUNT_CHAT_UI: bool = True
+
+    # Warm-up before reporting ready (see src/app/core/warmup.py)
+    WARMUP_ENABLED: bool = False
+    WARMUP_DB_CONNECTIONS: int = 4
+    WARMUP_TIMEOUT_SECONDS: float = 15.0
+
+    # Connection pool overrides; unset fields come from DB_POOL_PROFILE (see src/db/pool.py)
+    DB_POOL_SIZE: Optional[int] = None
+    DB_MAX_OVERFLOW: Optional[int] = None
+    DB_POOL_TIMEOUT: Optional[float] = None
+    DB_POOL_RECYCLE: Optional[int] = None
+    DB_POOL_PRE_PING: Optional[bool] = None
+    DB_STATEMENT_CACHE_SIZE: Optional[int] = None
+    # Connections for the whole instance, divided across server workers (unset: per-worker profile sizes)
+    DB_MAX_CONNECTIONS: Optional[int] = None
+
+    # Multi-worker server (see src/app/server.py); unset: one per CPU
+    WEB_CONCURRENCY: Optional[int] = None
+    # With several workers, serve the mounted Gradio UIs from one dedicated process on this port
+    # (unset: mounted on PORT in every worker)
+    UI_PORT: Optional[int] = None
+    # Recycle a worker after this many requests (unset: never)
+    WORKER_MAX_REQUESTS: Optional[int] = None
+
+    # Read replicas (see src/db/routing.py): "round_robin" or "least_connections"
+    DB_REPLICA_STRATEGY: str = "round_robin"
+    # Reads of a session/owner written within this window stay on the primary, as do the reads of the
+    # client that wrote (db_last_write cookie / X-DB-Last-Write header, so on any worker)
+    DB_READ_YOUR_WRITES_SECONDS: float = 5.0
+    # Replicas lagging more than this are skipped until they catch up
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DB_REPLICA_LAG_CHECK_INTERVAL: float = 5.0
+
+    # SQLite tuning (see src/db/sqlite.py): WAL + PRAGMAs on connect, writes through one queued connection
+    SQLITE_TUNING: bool = True
+    SQLITE_SINGLE_WRITER: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+
+    # Agent memory: maintain the monthly partitions of agent_messages once `python -m src.db.partitions enable`
+    # has partitioned it (Postgres only, no-op on SQLite)
+    AGENT_MEMORY_PARTITIONING: bool = False
+    # Months of partitions created ahead of the current one
+    AGENT_MEMORY_PARTITIONS_AHEAD: int = 3
+    # Drop whole partitions older than this many months (0 keeps all history)
+    AGENT_MEMORY_RETENTION_MONTHS: int = 0
+    # Detach expired partitions but keep their tables, e.g. for archiving
+    AGENT_MEMORY_DETACH_ONLY: bool = False
+
     @property
     def DB_URL(self):
         if self.ENV_MODE == "dev":
@@ -45,6 +182,13 @@ class Settings(BaseSettings):
                     self.DB_NAME
                 )
 
+    @property
+    def ASYNC_REPLICA_URLS(self) -> list[str]:
+        if self.ENV_MODE == "dev":
+            return []
+        urls = [url.strip() for url in self.DB_REPLICA_URLS.split(",") if url.strip()]
+        return [f"{url.split('://')[0]}+asyncpg://{url.split('://', 1)[1]}" for url in urls]
+
     @property
     def API_BASE_URL(self) -> str:
         if self.ENV_MODE == "dev":
@@ -58,6 +202,12 @@ class DevSettings(Settings):
     # Database settings for development
     DEV_DB_URL: str = "sqlite:///./dev.db"
 
+    # Apply pending migrations on startup
+    DB_AUTO_MIGRATE: bool = True
+
+    # Connection pool profile (see src/db/pool.py)
+    DB_POOL_PROFILE: str = "small"
+
     model_config = SettingsConfigDict(env_file=".env", extra='allow')
 
 class ProdSettings(Settings):
@@ -75,12 +225,34 @@ class ProdSettings(Settings):
     # Extra Database settings for deploying on Railway; if you provide DATABASE_URL, the above settings will be ignored
     DATABASE_URL: str = os.getenv('DATABASE_URL', '')
 
+    # Comma-separated read replica URLs (same format as DATABASE_URL); empty disables replica routing
+    DB_REPLICA_URLS: str = os.getenv('DB_REPLICA_URLS', '')
+
     # Define HOST_URL based on environment mode
     HOST_URL : str = os.getenv('HOST_URL ', '')
 
+    # Migrations run as a deploy step; startup only verifies the schema revision
+    DB_AUTO_MIGRATE: bool = False
+
+    # Connection pool profile (see src/db/pool.py)
+    DB_POOL_PROFILE: str = os.getenv('DB_POOL_PROFILE', 'web')
+
+    # Pre-connect pools and providers after each deploy before reporting ready
+    WARMUP_ENABLED: bool = True
+
+    # Trace a tenth of the turns and keep the debug page off in production
+    TRACING_SAMPLE_RATE: float = 0.1
+    TRACING_DEBUG_ENDPOINT: bool = False
+
     # Database settings for production
     model_config = SettingsConfigDict(env_file=".env", extra='allow')
 
+@lru_cache(maxsize=None)
+def load_env() -> None:
+    """Load `.env` into os.environ once, for values read with os.getenv (e.g. provider API keys)."""
+    from dotenv import load_dotenv
+    load_dotenv('.env')
+
 def get_settings(env_mode: str = "dev"):
     if env_mode == "dev":
         return DevSettings()
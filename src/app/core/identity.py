@@ -0,0 +1,72 @@
+"""
+Client Identity
+
+Who is calling, for per-client quotas and logs.
+
+Works with any request object exposing `headers` and `client`, i.e. both
+FastAPI/Starlette requests and `gr.Request`, without importing Gradio. A
+client is identified by its API key when it sends one of the keys listed in
+QUOTA_API_KEYS (`X-API-Key`, stored only as a hash prefix), otherwise by its
+IP address. Unknown keys are ignored, so a client cannot escape its quota by
+sending a new key with every request.
+
+The IP address is the peer address of the connection, unless the app runs
+behind TRUSTED_PROXY_HOPS proxies: then it is the X-Forwarded-For entry the
+outermost of them added, counted from the right, since every entry to its
+left came from the client and can be forged. CF-Connecting-IP is only used
+with TRUST_CF_CONNECTING_IP, i.e. when every request comes through Cloudflare.
+"""
+
+import hashlib
+from functools import lru_cache
+from typing import Any, FrozenSet, Optional
+
+from src.app.core.init_settings import get_global_settings
+
+
+def _key_hash(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+@lru_cache(maxsize=None)
+def known_key_hashes() -> FrozenSet[str]:
+    """Hash prefixes of the API keys in QUOTA_API_KEYS."""
+    keys = get_global_settings().QUOTA_API_KEYS.split(",")
+    return frozenset(_key_hash(key.strip()) for key in keys if key.strip())
+
+
+def get_client_ip(request: Any) -> str:
+    """Get the client's IP address from the request."""
+    if request is None:
+        return "Client IP not available"
+    settings = get_global_settings()
+    if settings.TRUST_CF_CONNECTING_IP and "cf-connecting-ip" in request.headers:
+        return request.headers["cf-connecting-ip"]
+    hops = settings.TRUSTED_PROXY_HOPS
+    if hops > 0 and "x-forwarded-for" in request.headers:
+        # "client, proxy1, proxy2": each trusted proxy appends the address it got the request from
+        entries = [entry.strip() for entry in request.headers["x-forwarded-for"].split(",")]
+        return entries[-hops] if len(entries) >= hops else entries[0]
+    if request.client is not None:
+        return request.client.host
+    return "Client IP not available"
+
+
+def client_identity(request: Any) -> Optional[str]:
+    """
+    Stable identity of the caller: "key:<hash>" for known API keys, "ip:<address>" otherwise.
+
+    Args:
+        request: Incoming request, or None when there is none (e.g. a background call)
+
+    Returns:
+        The identity, or None without a request
+    """
+    if request is None:
+        return None
+    api_key = request.headers.get("x-api-key")
+    if api_key:
+        key_hash = _key_hash(api_key)
+        if key_hash in known_key_hashes():
+            return "key:" + key_hash
+    return "ip:" + get_client_ip(request)
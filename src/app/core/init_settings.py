@@ -1,24 +1,44 @@
+import os
 import sys
 import argparse
+from functools import lru_cache
 from src.app.core.config import get_settings
 
 # Set up the argument parser
 parser = argparse.ArgumentParser()
 parser.add_argument("--mode", choices=["dev", "prod"], default="dev", help="Set the running mode")
 parser.add_argument("--host", type=str, default="127.0.0.1", help="Set the host")
+parser.add_argument("--workers", type=int, default=None, help="Set the number of worker processes")
 
-# Determine if running under pytest
-is_testing = "pytest" in sys.argv[0]
+@lru_cache(maxsize=None)
+def get_args() -> argparse.Namespace:
+    """
+    Command line arguments of the server entry point, parsed on first use.
 
-if is_testing:
-    # Provide default or mock arguments when imported for testing
-    args = argparse.Namespace(mode="dev", host="127.0.0.1")
-else:
-    # Parse arguments only when running the script directly
-    args = parser.parse_args()
+    Returns:
+        Parsed arguments (defaults when running under pytest)
+    """
+    if "pytest" in sys.argv[0]:
+        # Provide default arguments when imported for testing
+        return argparse.Namespace(mode="dev", host="127.0.0.1", workers=None)
+    # Ignore options meant for other entry points that import the settings (e.g. the alembic CLI)
+    args, _ = parser.parse_known_args()
+    return args
 
-# Initialize and update settings
-settings = get_settings(args.mode)
+@lru_cache(maxsize=None)
+def get_global_settings():
+    """
+    Process-wide settings, created on first use.
 
-# Save updated settings for import in other modules
-global_settings = settings
+    The mode comes from APP_MODE when set (workers, CLI tools), otherwise from `--mode`.
+    """
+    return get_settings(os.getenv("APP_MODE") or get_args().mode)
+
+def __getattr__(name: str):
+    # `args`, `settings` and `global_settings` are resolved lazily so importing this
+    # module never parses sys.argv by itself
+    if name == "args":
+        return get_args()
+    if name in ("settings", "global_settings"):
+        return get_global_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,20 +1,106 @@
+"""
+Application Lifespan
+
+Startup and shutdown of the FastAPI application.
+
+Startup checks the schema revision and opens the connection pools
+concurrently, all without blocking the event loop, then starts the optional
+warm-up (see `src.app.core.warmup`). Shutdown runs in order:
+1. report not ready and stop accepting new agent runs (new requests get 503)
+2. drain in-flight runs within `SHUTDOWN_DRAIN_SECONDS` and flush their spilled events,
+   then write the buffered usage ledger entries
+3. stop background maintenance tasks and the event loop watchdog
+4. close the provider clients' HTTP pools
+5. dispose every database engine
+6. export the queued trace spans and drop this worker's live gauges from the
+   shared metrics (multi-worker mode)
+
+A failing shutdown step is logged and the remaining steps still run, so a
+rolling deploy never leaves connections open.
+"""
+
+import asyncio
+import time
 from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, List, Tuple
 from fastapi import FastAPI
-from src.db.database import init_db
+from src.agent.runs import run_manager
+from src.app.core.clients import close_clients
+from src.app.core.init_settings import global_settings as settings
+from src.app.core.metrics import mark_worker_dead
+from src.app.core.profiling import loop_watchdog
+from src.app.core.tracing import tracer
+from src.app.core.usage import usage_ledger
+from src.app.core.warmup import readiness, start_warmup
+from src.db.database import async_engine, connect_pools, dispose_engines, init_db
+from src.db.partitions import PartitionMaintainer
 from src.app.core.logging import logger
 
+async def _run_shutdown(steps: List[Tuple[str, Callable[[], Awaitable[None]]]]) -> None:
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            await step()
+            logger.info(f"Shutdown: {name} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        except Exception as e:
+            logger.error(f"❌ Shutdown step '{name}' failed: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting application lifespan...")
     try:
-        # Initialize the database connection
-        init_db()
+        # Schema revision check and pool connections don't depend on each other
+        await asyncio.gather(init_db(), connect_pools())
         logger.info("✅ Database initialization successful")
     except Exception as e:
         logger.error(f"❌ Database initialization failed: {e}")
+        await dispose_engines()
         raise
     
+    partition_maintainer = None
+    if settings.AGENT_MEMORY_PARTITIONING and async_engine.dialect.name == "postgresql":
+        partition_maintainer = PartitionMaintainer(
+            async_engine,
+            months_ahead=settings.AGENT_MEMORY_PARTITIONS_AHEAD,
+            retention_months=settings.AGENT_MEMORY_RETENTION_MONTHS,
+            detach_only=settings.AGENT_MEMORY_DETACH_ONLY,
+        )
+        partition_maintainer.start()
+
+    usage_ledger.start()
+    if settings.LOOP_LAG_MONITOR:
+        loop_watchdog.start()
+
+    # Warm-up runs in the background; /health/ready reports ready once it finishes
+    warmup_task = start_warmup(
+        settings.WARMUP_ENABLED, settings.WARMUP_DB_CONNECTIONS, settings.WARMUP_TIMEOUT_SECONDS
+    )
+
     logger.info("🚀 Application startup complete")
     
-    yield
\ No newline at end of file
+    yield
+
+    # Shutdown
+    logger.info("Shutting down...")
+    readiness.ready = False
+    run_manager.stop_accepting()
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+
+    async def stop_maintenance():
+        if partition_maintainer is not None:
+            await partition_maintainer.stop()
+        await asyncio.to_thread(loop_watchdog.stop)
+
+    await _run_shutdown([
+        ("drain agent runs", lambda: run_manager.drain(settings.SHUTDOWN_DRAIN_SECONDS)),
+        ("discard spilled run events", run_manager.discard_spilled),
+        ("flush usage ledger", usage_ledger.stop),
+        ("stop maintenance tasks", stop_maintenance),
+        ("close provider clients", close_clients),
+        ("dispose database engines", dispose_engines),
+        ("flush trace spans", lambda: asyncio.to_thread(tracer.shutdown)),
+        ("release worker metrics", lambda: asyncio.to_thread(mark_worker_dead)),
+    ])
+    logger.info("👋 Application shutdown complete")
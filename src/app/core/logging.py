@@ -3,47 +3,219 @@ Structured Logging Setup
 
 Configures structured logging for the application.
 Provides a centralized logger that can be imported anywhere in the codebase.
+
+Records never touch stdout on the calling thread. The root logger has a
+single `QueueHandler` that stamps each record with the current log context
+(session id, agent key, run id; see `log_context`) and puts it on a bounded
+queue. A `QueueListener` thread formats the records, as JSON with
+LOG_FORMAT=json or as text otherwise, and writes them. When stdout is slow
+or blocked the queue fills up and records are dropped (and counted) instead
+of stalling the event loop.
+
+Hot-path messages (one per run, per session, per chat exchange) go through
+`hot_logger`: it is rate limited per message template, so it must be called
+with lazy %-style arguments, e.g. `hot_logger.info("Started run %s", run_id)`.
 """
 
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
-from typing import Optional
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+_log_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+# Attributes every LogRecord has; anything else on a record is an extra field
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "context"}
+
+_plain = logging.Formatter()
+
+
+def bind_log_context(**fields: Any) -> contextvars.Token:
+    """Add fields to every record logged from the current context (task) on; returns a reset token."""
+    return _log_context.set({**_log_context.get(), **fields})
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """Add fields to every record logged inside the block."""
+    token = bind_log_context(**fields)
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, context and extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        payload.update(getattr(record, "context", {}))
+        payload.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
+
+
+class ContextTextFormatter(logging.Formatter):
+    """The plain text format, followed by the record's context fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = {**getattr(record, "context", {})}
+        if getattr(record, "suppressed", 0):
+            fields["suppressed"] = record.suppressed
+        if fields:
+            head, sep, traceback = text.partition("\n")
+            text = head + " [" + " ".join(f"{key}={value}" for key, value in fields.items()) + "]" + sep + traceback
+        return text
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of waiting when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments and render the traceback now: they may change or
+        # go away before the listener thread gets to the record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+            record.exc_info = None
+        # Capture the caller's context here; the listener thread can't see it
+        context = _log_context.get()
+        if context:
+            record.context = context
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.dropped:
+                # Report the loss once there is room again
+                notice = logging.makeLogRecord({
+                    "name": "app.logging", "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": f"Dropped {self.dropped} log records: log output is too slow",
+                })
+                self.queue.put_nowait(notice)
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `per_interval` records per message template through every `interval` seconds.
+
+    The next record let through for a template carries `suppressed`, the number
+    of records dropped since the previous one.
+    """
+
+    def __init__(self, per_interval: int, interval: float = 1.0):
+        super().__init__()
+        self.per_interval = per_interval
+        self.interval = interval
+        # template -> (window start, records let through in the window, records suppressed)
+        self._windows: Dict[Tuple[str, Any], Tuple[float, int, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            start, passed, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                start, passed = now, 0
+            if passed >= self.per_interval:
+                self._windows[key] = (start, passed, suppressed + 1)
+                return False
+            self._windows[key] = (start, passed + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
 
 
 def setup_logging(
-    level: str = "INFO",
+    level: str = os.getenv("LOG_LEVEL", "INFO"),
     format_string: Optional[str] = None,
-    include_timestamp: bool = True
+    include_timestamp: bool = True,
+    json_output: bool = os.getenv("LOG_FORMAT", "text").lower() == "json",
+    queue_size: int = int(os.getenv("LOG_QUEUE_SIZE", "10000")),
 ) -> None:
     """
     Configure application-wide logging settings.
-    
+
     Args:
         level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         format_string: Custom format string for log messages
         include_timestamp: Whether to include timestamp in log format
+        json_output: Write one JSON object per record instead of text
+        queue_size: Records buffered for the writer thread before new ones are dropped
     """
+    global _listener
+
     if format_string is None:
         if include_timestamp:
             format_string = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         else:
             format_string = '%(name)s - %(levelname)s - %(message)s'
-    
-    logging.basicConfig(
-        level=getattr(logging, level.upper()),
-        format=format_string,
-        stream=sys.stdout,
-        force=True  # Override any existing configuration
-    )
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if json_output else ContextTextFormatter(format_string))
+
+    if _listener is not None:
+        _listener.stop()
+    log_queue: queue.Queue = queue.Queue(queue_size)
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(NonBlockingQueueHandler(log_queue))
+    root.setLevel(getattr(logging, level.upper()))
+
+
+def shutdown_logging() -> None:
+    """Write out the queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 def get_logger(name: str) -> logging.Logger:
     """
     Get a logger instance for the given name.
-    
+
     Args:
         name: Logger name (typically __name__ from the calling module)
-        
+
     Returns:
         Configured logger instance
     """
@@ -52,6 +224,11 @@ def get_logger(name: str) -> logging.Logger:
 
 # Initialize default logging configuration
 setup_logging()
+atexit.register(shutdown_logging)
 
 # Create a default logger for the application
 logger = get_logger("app")
+
+# Rate-limited logger for messages emitted per run, session or chat exchange
+hot_logger = get_logger("app.hot")
+hot_logger.addFilter(RateLimitFilter(per_interval=int(os.getenv("LOG_HOT_PATH_PER_SECOND", "20"))))
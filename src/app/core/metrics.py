@@ -0,0 +1,271 @@
+"""
+Metrics
+
+Prometheus metrics for the HTTP, agent, LLM, memory and database hot paths.
+
+Metrics are module-level prometheus_client objects. Updating one is a
+lock-protected add, so they stay on in production; label children used on
+hot paths are bound once. `GET /metrics` serves them in the text exposition
+format.
+
+Multi-process mode: when the server runs several workers it points
+PROMETHEUS_MULTIPROC_DIR at an empty directory before spawning them (see
+`src.app.server`). Every worker then writes its values to memory-mapped
+files there, and whichever worker answers a scrape aggregates all of them:
+counters and histograms are summed, and gauges are summed over live workers.
+"""
+
+import functools
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+from src.app.core.init_settings import global_settings as settings
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# A gap between streamed tokens at least this long counts as a stall
+STALL_SECONDS = settings.LLM_STREAM_STALL_SECONDS
+
+# Latency buckets in seconds, from sub-millisecond DB work to multi-minute agent runs
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RUN_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+TTFT_BUCKETS = (0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0)
+TPS_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency, until the response body is sent",
+    ["method", "route", "status"], buckets=REQUEST_BUCKETS,
+)
+AGENT_RUN_SECONDS = Histogram(
+    "agent_run_duration_seconds", "Duration of agent runs", ["agent", "outcome"], buckets=RUN_BUCKETS,
+)
+LLM_TTFT_SECONDS = Histogram(
+    "llm_time_to_first_token_seconds", "Time from request to the first streamed token", ["model", "path"],
+    buckets=TTFT_BUCKETS,
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_tokens_per_second", "Streamed tokens per second after the first token", ["model", "path"],
+    buckets=TPS_BUCKETS,
+)
+LLM_INTER_TOKEN_SECONDS = Histogram(
+    "llm_inter_token_seconds", "Gap between consecutive streamed tokens", ["model", "path"], buckets=FAST_BUCKETS,
+)
+LLM_STREAM_STALLS = Counter(
+    "llm_stream_stalls", "Streamed responses pausing at least LLM_STREAM_STALL_SECONDS between tokens", ["model", "path"],
+)
+LLM_TOKENS = Counter(
+    "llm_tokens", "Tokens used by model calls (see src/app/core/usage.py)", ["agent", "model", "kind"],
+)
+LLM_COST_USD = Counter(
+    "llm_cost_usd", "Cost of model calls in USD, for models with a configured price", ["agent", "model"],
+)
+TOOL_CALL_SECONDS = Histogram(
+    "agent_tool_call_duration_seconds", "Latency of agent tool calls", ["tool"], buckets=REQUEST_BUCKETS,
+)
+MEMORY_OPERATION_SECONDS = Histogram(
+    "agent_memory_operation_duration_seconds", "Latency of agent memory session operations", ["operation"],
+    buckets=FAST_BUCKETS,
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_duration_seconds", "Time to check a connection out of the pool, including waiting",
+    ["pool"], buckets=FAST_BUCKETS,
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections", "Connections currently checked out", ["pool"], multiprocess_mode="livesum",
+)
+DB_POOL_WAITING = Gauge(
+    "db_pool_waiting_requests", "Callers waiting for a pooled connection", ["pool"], multiprocess_mode="livesum",
+)
+AGENT_RUNS_IN_FLIGHT = Gauge(
+    "agent_runs_in_flight", "Admitted agent runs that have not finished", multiprocess_mode="livesum",
+)
+AGENT_RUNS_QUEUED = Gauge(
+    "agent_runs_queued", "Agent runs waiting for admission", multiprocess_mode="livesum",
+)
+AGENT_RUNS_REJECTED = Counter(
+    "agent_runs_rejected", "Agent runs shed by admission control",
+)
+AGENT_RUN_QUOTA_DECISIONS = Counter(
+    "agent_run_quota_decisions", "Agent runs degraded or rejected by quotas", ["scope", "decision"],
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds", "How late the event loop wakes a sleeping task (see src/app/core/profiling.py)",
+    buckets=FAST_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests", "Lookups in in-process caches by result; hit ratio = hit / (hit + miss)",
+    ["cache", "result"],
+)
+
+
+def cache_counters(cache: str) -> Tuple[Counter, Counter]:
+    """Bound (hit, miss) counters of a cache."""
+    return CACHE_REQUESTS.labels(cache, "hit"), CACHE_REQUESTS.labels(cache, "miss")
+
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+def timed(histogram) -> Callable[[F], F]:
+    """Decorator observing the duration of every call of a coroutine function in `histogram`."""
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class StreamTimer:
+    """
+    Measures one streamed LLM response: time to first token, gaps between
+    tokens, stalls (gaps of at least LLM_STREAM_STALL_SECONDS) and tokens/sec.
+
+    With `record=False` nothing is exported; only `summary()` is filled in, e.g.
+    to time what one subscriber of a shared stream saw.
+    """
+
+    __slots__ = (
+        "model", "path", "record", "started", "first_token_at", "last_token_at", "tokens",
+        "max_gap", "stalls", "finished_at", "_gap_histogram",
+    )
+
+    def __init__(self, model: str, path: str, record: bool = True):
+        self.model = model
+        self.path = path
+        self.record = record
+        self.started = time.perf_counter()
+        self.first_token_at = 0.0
+        self.last_token_at = 0.0
+        self.tokens = 0
+        self.max_gap = 0.0
+        self.stalls = 0
+        self.finished_at = 0.0
+        self._gap_histogram = LLM_INTER_TOKEN_SECONDS.labels(model, path) if record else None
+
+    def token(self) -> None:
+        now = time.perf_counter()
+        if not self.tokens:
+            self.first_token_at = now
+            if self.record:
+                LLM_TTFT_SECONDS.labels(self.model, self.path).observe(now - self.started)
+        else:
+            gap = now - self.last_token_at
+            if self.record:
+                self._gap_histogram.observe(gap)
+            if gap > self.max_gap:
+                self.max_gap = gap
+            if gap >= STALL_SECONDS:
+                self.stalls += 1
+                if self.record:
+                    LLM_STREAM_STALLS.labels(self.model, self.path).inc()
+        self.last_token_at = now
+        self.tokens += 1
+
+    def finish(self) -> None:
+        """End the measurement; later calls do nothing."""
+        if self.finished_at:
+            return
+        self.finished_at = time.perf_counter()
+        elapsed = self.last_token_at - self.first_token_at
+        if self.record and self.tokens > 1 and elapsed > 0:
+            LLM_TOKENS_PER_SECOND.labels(self.model, self.path).observe((self.tokens - 1) / elapsed)
+
+    def summary(self) -> Dict[str, Any]:
+        """Timing of the response so far, for run events and stored message metadata."""
+        end = self.finished_at or time.perf_counter()
+        elapsed = self.last_token_at - self.first_token_at
+        return {
+            "ttft_ms": round((self.first_token_at - self.started) * 1000, 1) if self.tokens else None,
+            "duration_ms": round((end - self.started) * 1000, 1),
+            "tokens": self.tokens,
+            "tokens_per_second": round((self.tokens - 1) / elapsed, 1) if self.tokens > 1 and elapsed > 0 else None,
+            "max_inter_token_ms": round(self.max_gap * 1000, 1),
+            "stalls": self.stalls,
+        }
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency of every HTTP request.
+
+    Routes are labelled with their path template (`/api/v1/runs/{run_id}/events`)
+    or the mount they fall under (`/agent/*`), never the raw path, so the
+    number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._children: Dict[Tuple[str, str, int], object] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        root_path = scope.get("root_path", "")
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route (or mount prefix) in the shared scope
+            route = scope.get("route")
+            if route is not None and hasattr(route, "path"):
+                label = route.path
+            elif scope.get("root_path", "") != root_path:
+                label = f"{scope['root_path']}/*"
+            else:
+                label = "unmatched"
+            key = (scope["method"], label, status)
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = HTTP_REQUEST_SECONDS.labels(*key)
+            child.observe(time.perf_counter() - start)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Current metrics in the Prometheus text format.
+
+    Returns:
+        The payload and its content type; in multi-process mode it aggregates every worker
+    """
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead() -> None:
+    """Drop this worker's live gauges from the shared metrics directory on shutdown."""
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(os.getpid())
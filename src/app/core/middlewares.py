@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.responses import RedirectResponse
 from src.app.core.init_settings import global_settings
+from src.app.core.metrics import MetricsMiddleware
 
 def setup_cors(app):
     # Define the allowed origins
@@ -21,6 +22,22 @@ def setup_cors(app):
         allow_headers=["*"],
     )
 
+def setup_read_your_writes(app):
+    # With read replicas, a client's last write time travels with it so any worker keeps it on the primary
+    from src.db.routing import ReadYourWritesMiddleware, replica_router
+    if replica_router.enabled:
+        app.add_middleware(ReadYourWritesMiddleware, router=replica_router)
+
+def setup_metrics(app):
+    # Added last so it wraps every other middleware and times the whole request
+    app.add_middleware(MetricsMiddleware)
+
+def setup_profiling(app):
+    # Per-request profiling (X-Profile header) exists only when an admin token is configured
+    if global_settings.ADMIN_TOKEN:
+        from src.app.core.profiling import ProfilingMiddleware
+        app.add_middleware(ProfilingMiddleware, token=global_settings.ADMIN_TOKEN)
+
 def setup_session(app):
     # Add session middleware with a custom expiration time (e.g., 30 minutes)
     app.add_middleware(SessionMiddleware, 
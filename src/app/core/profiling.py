@@ -0,0 +1,346 @@
+"""
+Profiling
+
+On-demand profiling of a live worker, safe to leave compiled in.
+
+Nothing here runs until it is asked for:
+- `profiler.capture()` samples the stacks of the event loop thread (or of
+  every thread) from a background thread for a few seconds and returns them
+  in the collapsed format read by flamegraph.pl, speedscope and inferno
+  (`frame;frame;frame count` per line). Served by `GET /admin/profile`.
+- `ProfilingMiddleware` does the same for the duration of one request when
+  it carries `X-Profile: <ADMIN_TOKEN>`; the profile is kept in memory under
+  the id returned in `X-Profile-Id`. The loop is shared, so the samples also
+  show whatever other requests were doing at the time.
+- `profiler.slow_callbacks()` turns on asyncio debug mode for a window and
+  collects asyncio's "Executing <Handle> took N seconds" reports.
+
+`LoopWatchdog` is the one always-on part: a thread that measures the loop's
+lag continuously (`event_loop_lag_seconds`) and, when a callback holds the
+loop longer than a threshold, samples the stack of the code blocking it. The
+reports are logged and kept for `GET /admin/loop`. `assert_loop_not_blocked`
+uses the same watchdog to fail a test when a handler blocks the loop.
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from src.app.core.init_settings import global_settings as settings
+from src.app.core.logging import logger
+from src.app.core.metrics import EVENT_LOOP_LAG_SECONDS
+
+
+class ProfilerBusy(RuntimeError):
+    """Another profile is being captured in this worker."""
+
+
+def _frame_name(frame, current_line: bool = False) -> str:
+    # Flamegraphs merge frames by function, so they get the definition line
+    code = frame.f_code
+    path = code.co_filename.rsplit(os.sep, 2)
+    line = frame.f_lineno if current_line else code.co_firstlineno
+    return f"{code.co_qualname} ({'/'.join(path[-2:])}:{line})"
+
+
+def _stack_lines(frame, current_line: bool = False) -> List[str]:
+    """Frames of a stack, outermost first."""
+    lines = []
+    while frame is not None:
+        lines.append(_frame_name(frame, current_line))
+        frame = frame.f_back
+    return lines[::-1]
+
+
+def sample_stacks(seconds: float, interval: float, thread_ids: Optional[List[int]] = None) -> Counter:
+    """
+    Sample thread stacks every `interval` seconds for `seconds`, blocking the calling thread.
+
+    Args:
+        seconds: How long to sample
+        interval: Seconds between samples
+        thread_ids: Threads to sample (default: every thread but the sampler)
+
+    Returns:
+        Count of each collapsed stack, rooted at the thread name
+    """
+    me = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (thread_ids is not None and ident not in thread_ids):
+                continue
+            counts[";".join([names.get(ident, str(ident)), *_stack_lines(frame)])] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapsed(counts: Counter) -> str:
+    """Stacks in the collapsed flamegraph format, most sampled first."""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class _SlowCallbackCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.reports: List[Dict[str, Any]] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.getMessage().startswith("Executing "):
+            self.reports.append({"time": record.created, "report": record.getMessage()})
+
+
+class Profiler:
+    """Captures profiles of this worker, one at a time."""
+
+    def __init__(self, max_seconds: float, keep_request_profiles: int = 20):
+        self.max_seconds = max_seconds
+        self._busy = threading.Lock()
+        self._requests: "OrderedDict[str, str]" = OrderedDict()
+        self._keep = keep_request_profiles
+
+    async def capture(self, seconds: float, interval: float = 0.005, loop_only: bool = True) -> str:
+        """
+        Sample stacks for `seconds` (capped at PROFILING_MAX_SECONDS) without blocking the loop.
+
+        Args:
+            seconds: How long to sample
+            interval: Seconds between samples
+            loop_only: Sample only the event loop thread
+
+        Returns:
+            Collapsed stacks
+
+        Raises:
+            ProfilerBusy: If a profile is already being captured
+        """
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already being captured")
+        try:
+            # Called on the loop, so the current thread is the loop's
+            threads = [threading.get_ident()] if loop_only else None
+            counts = await asyncio.to_thread(sample_stacks, min(seconds, self.max_seconds), interval, threads)
+        finally:
+            self._busy.release()
+        return collapsed(counts)
+
+    def start_request_profile(self, interval: float = 0.002) -> Optional["RequestProfile"]:
+        """Start sampling the loop thread for one request, or return None if a profile is running."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        return RequestProfile(self, threading.get_ident(), interval, self.max_seconds)
+
+    def _finish_request_profile(self, profile_id: str, counts: Counter) -> None:
+        self._busy.release()
+        self._requests[profile_id] = collapsed(counts)
+        while len(self._requests) > self._keep:
+            self._requests.popitem(last=False)
+
+    def request_profile(self, profile_id: str) -> Optional[str]:
+        return self._requests.get(profile_id)
+
+    async def slow_callbacks(self, seconds: float, threshold: float) -> List[Dict[str, Any]]:
+        """
+        Report loop callbacks that ran longer than `threshold` seconds during the next `seconds`.
+
+        asyncio debug mode times every callback, so it is only on for the window.
+
+        Raises:
+            ProfilerBusy: If a profile is already being captured
+        """
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already being captured")
+        loop = asyncio.get_running_loop()
+        collector = _SlowCallbackCollector()
+        asyncio_logger = logging.getLogger("asyncio")
+        previous = (loop.get_debug(), loop.slow_callback_duration, asyncio_logger.level)
+        asyncio_logger.addHandler(collector)
+        asyncio_logger.setLevel(logging.WARNING)
+        loop.slow_callback_duration = threshold
+        loop.set_debug(True)
+        try:
+            await asyncio.sleep(min(seconds, self.max_seconds))
+        finally:
+            loop.set_debug(previous[0])
+            loop.slow_callback_duration = previous[1]
+            asyncio_logger.setLevel(previous[2])
+            asyncio_logger.removeHandler(collector)
+            self._busy.release()
+        return collector.reports
+
+
+class RequestProfile:
+    """Samples the loop thread from a background thread until `stop()`."""
+
+    def __init__(self, profiler: Profiler, loop_thread: int, interval: float, max_seconds: float):
+        self.profiler = profiler
+        self.profile_id = uuid.uuid4().hex
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._sample, args=(loop_thread, interval, time.monotonic() + max_seconds), name="request-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def _sample(self, loop_thread: int, interval: float, deadline: float) -> None:
+        # Long streaming responses are only profiled for their first PROFILING_MAX_SECONDS
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            self.counts.update(sample_stacks(interval, interval, [loop_thread]))
+        self.profiler._finish_request_profile(self.profile_id, self.counts)
+
+    def stop(self) -> None:
+        """Stop sampling; the profile is stored within one interval, without waiting on the loop."""
+        self._stop.set()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests that carry `X-Profile: <admin token>`.
+
+    Requests without the header cost one header lookup.
+    """
+
+    def __init__(self, app, token: str):
+        self.app = app
+        self._token = token.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _has_token(scope, self._token):
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiler.start_request_profile()
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-profile-id", profile.profile_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.stop()
+
+
+def _has_token(scope, token: bytes) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return hmac.compare_digest(value, token)
+    return False
+
+
+class LoopWatchdog:
+    """
+    Watches an event loop from a background thread and reports when it is blocked.
+
+    Every `interval` seconds the thread schedules a no-op on the loop and waits
+    for it to run; the delay is the loop lag (`event_loop_lag_seconds`). When it
+    has not run after `threshold` seconds, a callback is holding the loop: the
+    thread samples the loop thread's stack until it is released, then logs and
+    keeps a report with the blocked time and the sampled stacks.
+    """
+
+    def __init__(self, interval: float, threshold: float, sample_interval: float = 0.01, keep_reports: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self.max_lag = 0.0
+        self.reports: Deque[Dict[str, Any]] = deque(maxlen=keep_reports)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Start watching `loop` (default: the running loop); must be called on the loop's thread."""
+        loop = loop or asyncio.get_running_loop()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, args=(loop, threading.get_ident()), name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + self.threshold + 1)
+            self._thread = None
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread: int) -> None:
+        while not self._stop.is_set():
+            ran = threading.Event()
+            posted = time.monotonic()
+            try:
+                loop.call_soon_threadsafe(ran.set)
+            except RuntimeError:
+                # Loop closed
+                return
+            if not ran.wait(self.threshold):
+                self._blocked(ran, posted, loop_thread)
+            lag = time.monotonic() - posted
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            self._stop.wait(self.interval)
+
+    def _blocked(self, ran: threading.Event, posted: float, loop_thread: int) -> None:
+        samples: Counter = Counter()
+        while not ran.is_set() and not self._stop.is_set():
+            frame = sys._current_frames().get(loop_thread)
+            if frame is None:
+                return
+            samples[tuple(_stack_lines(frame, current_line=True))] += 1
+            del frame
+            ran.wait(self.sample_interval)
+        blocked_ms = (time.monotonic() - posted) * 1000
+        stacks = [{"samples": count, "stack": list(stack)} for stack, count in samples.most_common(5)]
+        self.reports.append({"time": time.time(), "blocked_ms": round(blocked_ms, 1), "stacks": stacks})
+        if stacks:
+            logger.warning(
+                "Event loop blocked for %.0f ms; most sampled stack:\n  %s", blocked_ms, "\n  ".join(stacks[0]["stack"])
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "blocked": list(self.reports),
+        }
+
+
+@contextmanager
+def assert_loop_not_blocked(max_block_ms: float, interval_ms: float = 1.0) -> Iterator[LoopWatchdog]:
+    """
+    Fail if the running event loop is blocked for more than `max_block_ms` inside the block.
+
+    For tests: `with assert_loop_not_blocked(50): await handler(...)` raises
+    AssertionError with the sampled stack of the blocking code. Must be used on
+    the loop's thread, from a coroutine.
+    """
+    watchdog = LoopWatchdog(interval_ms / 1000, max_block_ms / 1000, sample_interval=min(0.005, max_block_ms / 4000))
+    watchdog.start()
+    try:
+        yield watchdog
+    finally:
+        watchdog.stop()
+    if watchdog.reports:
+        worst = max(watchdog.reports, key=lambda report: report["blocked_ms"])
+        stack = "\n  ".join(worst["stacks"][0]["stack"]) if worst["stacks"] else "(no sample)"
+        raise AssertionError(f"Event loop blocked for {worst['blocked_ms']} ms (limit {max_block_ms} ms) at:\n  {stack}")
+
+
+# Process-wide profiler and loop watchdog (started by the lifespan when LOOP_LAG_MONITOR is on)
+profiler = Profiler(settings.PROFILING_MAX_SECONDS)
+loop_watchdog = LoopWatchdog(settings.LOOP_LAG_INTERVAL_SECONDS, settings.LOOP_LAG_WARN_SECONDS)
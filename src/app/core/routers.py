@@ -1,5 +1,14 @@
 from fastapi import FastAPI
-from src.app.api.v1.endpoints import base
+from src.app.api.v1.endpoints import base, message, run
+from src.app.core.init_settings import global_settings
 
 def setup_routers(app: FastAPI):
-    app.include_router(base.router, prefix="", tags=["main"])
\ No newline at end of file
+    app.include_router(base.router, prefix="", tags=["main"])
+    app.include_router(message.router, prefix="/api/v1/messages", tags=["messages"])
+    app.include_router(run.router, prefix="/api/v1/runs", tags=["runs"])
+    if global_settings.TRACING_DEBUG_ENDPOINT:
+        from src.app.api.v1.endpoints import debug
+        app.include_router(debug.router, prefix="/debug", tags=["debug"], include_in_schema=False)
+    if global_settings.ADMIN_TOKEN:
+        from src.app.api.v1.endpoints import admin
+        app.include_router(admin.router, prefix="/admin", tags=["admin"], include_in_schema=False)
@@ -0,0 +1,362 @@
+"""
+Span Tracing
+
+Lightweight, OpenTelemetry-style spans for agent turns.
+
+Every agent turn is a trace whose root span is the turn itself. Its
+children are the memory reads and writes, each model call, each tool call
+and every SQL statement executed while the turn runs. The current span
+lives in a context variable, so spans nest across awaits and into tasks
+created inside them, and SQLAlchemy's greenlets see it too.
+
+Sampling is decided once per trace, at the root (head sampling,
+TRACING_SAMPLE_RATE). Spans of unsampled traces are no-ops, so tracing
+costs almost nothing for them. Finished spans go through a batching
+processor: a bounded queue drained by a background thread in batches,
+which drops spans rather than blocking when the queue is full. Batches go
+to an in-process ring buffer of recent traces (rendered by
+`/debug/traces`) and, when TRACING_OTLP_ENDPOINT is set, to a local
+collector as OTLP/HTTP JSON.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from src.app.core.init_settings import global_settings as settings
+from src.app.core.logging import logger
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "events", "error")
+    sampled = True
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes})
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        tracer.processor.on_end(self)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "events": self.events,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stand-in for spans of unsampled traces; every operation does nothing."""
+
+    sampled = False
+    duration_ms = 0.0
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar[Any] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Any:
+    """The active span, or None outside any trace."""
+    return _current_span.get()
+
+
+class RingBufferExporter:
+    """Keeps the most recent complete traces in memory."""
+
+    def __init__(self, max_traces: int):
+        self.max_traces = max_traces
+        self._traces: Deque[List[Span]] = deque(maxlen=max_traces)
+        # Spans of traces whose root has not ended yet
+        self._pending: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            for span in spans:
+                self._pending.setdefault(span.trace_id, []).append(span)
+                if span.parent_id is None:
+                    # The root ends last: the trace is complete
+                    self._traces.append(self._pending.pop(span.trace_id))
+            while len(self._pending) > self.max_traces:
+                self._pending.popitem(last=False)
+
+    def slowest(self, limit: int) -> List[List[Span]]:
+        """Recent traces ordered by root span duration, slowest first."""
+        with self._lock:
+            traces = list(self._traces)
+        root = lambda trace: next(span for span in trace if span.parent_id is None)
+        return sorted(traces, key=lambda trace: root(trace).duration_ms, reverse=True)[:limit]
+
+
+class OTLPHttpExporter:
+    """Sends spans to an OpenTelemetry collector as OTLP/HTTP JSON."""
+
+    KINDS = {"internal": 1, "server": 2, "client": 3}
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    @staticmethod
+    def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{"key": key, "value": {"stringValue": str(value)}} for key, value in attributes.items()]
+
+    def _span(self, span: Span) -> Dict[str, Any]:
+        payload = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": self.KINDS.get(span.kind, 1),
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": self._attributes(span.attributes),
+            "events": [
+                {"name": event["name"], "timeUnixNano": str(event["time_ns"]), "attributes": self._attributes(event["attributes"])}
+                for event in span.events
+            ],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            payload["parentSpanId"] = span.parent_id
+        return payload
+
+    def export(self, spans: List[Span]) -> None:
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": self._attributes({"service.name": self.service_name})},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": [self._span(span) for span in spans]}],
+            }]
+        }
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class BatchSpanProcessor:
+    """Queues finished spans and exports them in batches from a background thread."""
+
+    def __init__(self, exporters: List[Any], max_queue: int, batch_size: int, interval: float):
+        self.exporters = exporters
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        # The thread starts with the first span, not on import
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        if self._thread is None:
+            self._ensure_started()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _export(self, batch: List[Span]) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(batch)
+            except Exception as e:
+                logger.warning(f"Span export to {type(exporter).__name__} failed: {e}")
+
+    def _worker(self) -> None:
+        while True:
+            batch: List[Span] = []
+            deadline = time.monotonic() + self.interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stop = True
+                    break
+                batch.append(span)
+            if batch:
+                self._export(batch)
+            if stop:
+                return
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Export the queued spans and stop the thread."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._thread = None
+
+
+class Tracer:
+    """Creates spans, applies head sampling and hands finished spans to the processor."""
+
+    def __init__(self, enabled: bool, sample_rate: float, processor: BatchSpanProcessor, ring: RingBufferExporter):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.processor = processor
+        self.ring = ring
+
+    def start_span(self, name: str, kind: str = "internal", parent: Any = None, root: bool = False, **attributes: Any) -> Any:
+        """
+        Start a span without making it current; the caller must `end()` it.
+
+        Args:
+            name: Span name, e.g. "memory.get_items"
+            kind: "internal", "client" or "server"
+            parent: Parent span (defaults to the current span)
+            root: Start a new trace even inside another one
+            **attributes: Span attributes
+
+        Returns:
+            The span, or a no-op span when tracing is off or the trace is not sampled
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        if not root:
+            parent = parent or _current_span.get()
+            if parent is None:
+                # Spans outside a turn are not traced
+                return NOOP_SPAN
+            if not parent.sampled:
+                return NOOP_SPAN
+            return Span(parent.trace_id, parent.span_id, name, kind, attributes)
+        if random.random() >= self.sample_rate:
+            return NOOP_SPAN
+        return Span(os.urandom(16).hex(), None, name, kind, attributes)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", root: bool = False, **attributes: Any) -> Iterator[Any]:
+        """Run a block inside a new current span, ending it (with any error) on exit."""
+        span = self.start_span(name, kind, root=root, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def traced(self, name: str, kind: str = "internal") -> Callable:
+        """Decorator running every call of a coroutine function inside a span."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span(name, kind):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def shutdown(self) -> None:
+        self.processor.shutdown()
+
+
+def trace_engine(sync_engine) -> None:
+    """Record a client span for every SQL statement executed inside a traced turn."""
+    from sqlalchemy import event
+
+    system = sync_engine.dialect.name
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        span = tracer.start_span("db.statement", kind="client", **{"db.system": system, "db.statement": statement[:300]})
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            spans.pop().end()
+
+    def error(exception_context):
+        spans = exception_context.connection.info.get("trace_spans") if exception_context.connection else None
+        if spans:
+            spans.pop().end(exception_context.original_exception)
+
+    event.listen(sync_engine, "before_cursor_execute", before)
+    event.listen(sync_engine, "after_cursor_execute", after)
+    event.listen(sync_engine, "handle_error", error)
+
+
+def _build_tracer() -> Tracer:
+    ring = RingBufferExporter(settings.TRACING_RING_BUFFER_SIZE)
+    exporters: List[Any] = [ring]
+    if settings.TRACING_OTLP_ENDPOINT:
+        exporters.append(OTLPHttpExporter(settings.TRACING_OTLP_ENDPOINT, settings.APP_NAME))
+    processor = BatchSpanProcessor(
+        exporters,
+        max_queue=settings.TRACING_QUEUE_SIZE,
+        batch_size=settings.TRACING_BATCH_SIZE,
+        interval=settings.TRACING_EXPORT_INTERVAL_SECONDS,
+    )
+    return Tracer(settings.TRACING_ENABLED, settings.TRACING_SAMPLE_RATE, processor, ring)
+
+
+# Process-wide tracer
+tracer = _build_tracer()
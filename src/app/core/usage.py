@@ -0,0 +1,236 @@
+"""
+Usage Ledger
+
+Token usage and cost of every model call, for budgets and capacity planning.
+
+Agent model calls are recorded by the run hooks (`src.agent.hooks`) with the
+run's agent key, session and run id; chain completions are recorded when
+their usage arrives (the last chunk of a stream). Recording only appends to
+an in-memory buffer. A background task writes the buffer in batches, every
+USAGE_FLUSH_INTERVAL_SECONDS or as soon as USAGE_BATCH_SIZE entries are
+waiting: one multi-row insert into `usage_records` and one upsert of the
+per-minute, per-agent-key, per-model rollups in `usage_minutes`. If the
+database is unavailable, entries stay buffered up to USAGE_BUFFER_MAX, after
+which the oldest are dropped.
+
+Cost is computed from LLM_PRICING (USD per million tokens, matched on the
+longest model name prefix); models without a price are recorded with a NULL
+cost. Tokens and cost are also exported as Prometheus counters.
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import desc, func, insert, select
+
+from src.app.core.init_settings import global_settings as settings
+from src.app.core.logging import logger
+from src.app.core.metrics import LLM_COST_USD, LLM_TOKENS
+from src.db.database import AsyncSessionLocal, WriterSessionLocal
+from src.db.models import UsageMinute, UsageRecord
+
+
+def price(model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> Optional[float]:
+    """Cost in USD of one call, or None if LLM_PRICING has no entry for the model."""
+    matches = [prefix for prefix in settings.LLM_PRICING if model.startswith(prefix)]
+    if not matches:
+        return None
+    rates = settings.LLM_PRICING[max(matches, key=len)]
+    uncached = max(input_tokens - cached_tokens, 0)
+    return (
+        uncached * rates.get("input", 0.0)
+        + cached_tokens * rates.get("cached_input", rates.get("input", 0.0))
+        + output_tokens * rates.get("output", 0.0)
+    ) / 1_000_000
+
+
+@dataclass
+class UsageEntry:
+    """Usage of one model call; `input_tokens` includes `cached_tokens`."""
+
+    source: str
+    agent_key: str
+    model: str
+    input_tokens: int
+    output_tokens: int
+    cached_tokens: int = 0
+    session_id: Optional[str] = None
+    run_id: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    cost_usd: Optional[float] = None
+
+
+class UsageLedger:
+    """Buffers usage entries and writes them to the database in batches."""
+
+    def __init__(self, batch_size: int, flush_interval: float, max_buffer: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer: Deque[UsageEntry] = deque(maxlen=max_buffer)
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def record(self, entry: UsageEntry) -> None:
+        """Price the entry and buffer it; never waits for the database."""
+        entry.cost_usd = price(entry.model, entry.input_tokens, entry.cached_tokens, entry.output_tokens)
+        LLM_TOKENS.labels(entry.agent_key, entry.model, "input").inc(entry.input_tokens - entry.cached_tokens)
+        LLM_TOKENS.labels(entry.agent_key, entry.model, "cached_input").inc(entry.cached_tokens)
+        LLM_TOKENS.labels(entry.agent_key, entry.model, "output").inc(entry.output_tokens)
+        if entry.cost_usd is not None:
+            LLM_COST_USD.labels(entry.agent_key, entry.model).inc(entry.cost_usd)
+
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write what is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write every buffered entry, a batch at a time."""
+        async with self._flush_lock:
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                try:
+                    await self._write(batch)
+                except Exception as e:
+                    # Keep them for the next flush, ahead of newer entries. Entries recorded
+                    # during the write may have filled the buffer: drop the oldest ones, counted
+                    overflow = max(len(batch) + len(self._buffer) - self._buffer.maxlen, 0)
+                    self.dropped += overflow
+                    self._buffer.extendleft(reversed(batch[overflow:]))
+                    logger.warning(f"Usage ledger flush of {len(batch)} entries failed: {e}")
+                    return
+
+    async def _write(self, batch: List[UsageEntry]) -> None:
+        rollups: Dict[Tuple[datetime, str, str], Dict[str, Any]] = {}
+        for entry in batch:
+            key = (entry.created_at.replace(second=0, microsecond=0), entry.agent_key, entry.model)
+            rollup = rollups.setdefault(key, {
+                "minute": key[0], "agent_key": key[1], "model": key[2],
+                "calls": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+            })
+            rollup["calls"] += 1
+            rollup["input_tokens"] += entry.input_tokens
+            rollup["cached_tokens"] += entry.cached_tokens
+            rollup["output_tokens"] += entry.output_tokens
+            rollup["cost_usd"] += entry.cost_usd or 0.0
+
+        rows = [
+            {column: getattr(entry, column) for column in (
+                "created_at", "source", "agent_key", "model", "session_id", "run_id",
+                "input_tokens", "cached_tokens", "output_tokens", "cost_usd",
+            )}
+            for entry in batch
+        ]
+        async with WriterSessionLocal() as session:
+            async with session.begin():
+                await session.execute(insert(UsageRecord), rows)
+                await session.execute(_upsert_minutes(session.bind.dialect.name, list(rollups.values())))
+
+    def stats(self) -> Dict[str, int]:
+        return {"buffered": len(self._buffer), "dropped": self.dropped}
+
+
+def _upsert_minutes(dialect: str, rows: List[Dict[str, Any]]):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    stmt = dialect_insert(UsageMinute).values(rows)
+    summed = ("calls", "input_tokens", "cached_tokens", "output_tokens", "cost_usd")
+    return stmt.on_conflict_do_update(
+        index_elements=["minute", "agent_key", "model"],
+        set_={column: getattr(UsageMinute, column) + getattr(stmt.excluded, column) for column in summed},
+    )
+
+
+TOP_BY = {"agent": UsageMinute.agent_key, "model": UsageMinute.model, "session": UsageRecord.session_id}
+
+
+async def top_consumers(by: str, since: datetime, limit: int) -> List[Dict[str, Any]]:
+    """
+    Heaviest consumers since a point in time, by cost then tokens.
+
+    Args:
+        by: "agent", "model" (read from the minute rollups) or "session" (from the records)
+        since: Start of the window
+        limit: Number of consumers returned
+
+    Returns:
+        One dict per consumer with its call count, token totals and cost
+    """
+    column = TOP_BY[by]
+    table = column.class_
+    time_column = table.minute if table is UsageMinute else table.created_at
+    calls = func.sum(table.calls) if table is UsageMinute else func.count()
+    cost = func.coalesce(func.sum(table.cost_usd), 0.0)
+    output_tokens = func.sum(table.output_tokens)
+    stmt = (
+        select(
+            column.label("key"),
+            calls.label("calls"),
+            func.sum(table.input_tokens).label("input_tokens"),
+            func.sum(table.cached_tokens).label("cached_tokens"),
+            output_tokens.label("output_tokens"),
+            cost.label("cost_usd"),
+        )
+        .where(time_column >= since, column.is_not(None))
+        .group_by(column)
+        .order_by(desc(cost), desc(output_tokens))
+        .limit(limit)
+    )
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(stmt)
+        return [dict(row._mapping) for row in result]
+
+
+async def usage_per_minute(since: datetime, agent_key: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Minute rollups since a point in time, summed over models (and agent keys unless one is given)."""
+    stmt = select(
+        UsageMinute.minute,
+        func.sum(UsageMinute.calls).label("calls"),
+        func.sum(UsageMinute.input_tokens).label("input_tokens"),
+        func.sum(UsageMinute.cached_tokens).label("cached_tokens"),
+        func.sum(UsageMinute.output_tokens).label("output_tokens"),
+        func.sum(UsageMinute.cost_usd).label("cost_usd"),
+    ).where(UsageMinute.minute >= since.replace(second=0, microsecond=0))
+    if agent_key is not None:
+        stmt = stmt.where(UsageMinute.agent_key == agent_key)
+    stmt = stmt.group_by(UsageMinute.minute).order_by(UsageMinute.minute)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(stmt)
+        return [dict(row._mapping) for row in result]
+
+
+def window_start(minutes: int) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(minutes=minutes)
+
+
+# Process-wide ledger, started and flushed by the application lifespan
+usage_ledger = UsageLedger(settings.USAGE_BATCH_SIZE, settings.USAGE_FLUSH_INTERVAL_SECONDS, settings.USAGE_BUFFER_MAX)
@@ -0,0 +1,155 @@
+"""
+Startup Warm-up
+
+Pays the first-request costs before the instance reports ready.
+
+The first requests after a deploy would otherwise open database
+connections, do TLS handshakes with each model provider, and build the
+validators the OpenAI SDK defers for its stream event models. Warm-up does
+all three in the background right after startup:
+- `db`: opens `WARMUP_DB_CONNECTIONS` pooled connections at once, so the pool keeps them
+- `providers`: builds every configured provider client (each agent provider, and the
+  chain client when the chat UI is mounted) and sends each one lightweight request,
+  leaving a keep-alive connection in its pool
+- `code_paths`: builds the pydantic validators used by the streaming stack
+
+Each step is timed and logged. A failing step is logged but does not block
+readiness. `readiness` backs the `/health/ready` endpoint: it reports ready
+only once warm-up finished, and reports not ready again when shutdown begins.
+"""
+
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional
+
+from src.app.core.init_settings import global_settings as settings
+from src.app.core.logging import logger
+from src.db.database import async_engine, pool_profile, writer_engine
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+@dataclass
+class Readiness:
+    ready: bool = False
+    steps: Dict[str, Dict[str, object]] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {"ready": self.ready, "warmup": self.steps}
+
+
+readiness = Readiness()
+
+
+async def warm_db(connections: int) -> None:
+    """Hold `connections` pooled connections at once so the pool is filled to that size."""
+    # Never ask for more than the pool can hand out, or warm-up would wait for its own connections
+    connections = max(1, min(connections, pool_profile.pool_size + pool_profile.max_overflow))
+    async with AsyncExitStack() as stack:
+        conns = await asyncio.gather(*(stack.enter_async_context(async_engine.connect()) for _ in range(connections)))
+        await asyncio.gather(*(conn.exec_driver_sql("SELECT 1") for conn in conns))
+    if writer_engine is not None:
+        async with writer_engine.connect() as conn:
+            await conn.exec_driver_sql("SELECT 1")
+
+
+def provider_clients() -> List["AsyncOpenAI"]:
+    """Build (or return the already built) client of every configured provider."""
+    import openai
+    from src.agent.models import fireworks
+    from src.agent.models import openai as openai_models
+
+    factories = [openai_models.get_client, fireworks.get_client]
+    if settings.MOUNT_CHAT_UI:
+        from src.chain import runtime
+
+        factories.append(runtime.get_client)
+
+    clients = []
+    for factory in factories:
+        try:
+            clients.append(factory())
+        except openai.OpenAIError as e:
+            # e.g. the chain client without OPENAI_API_KEY; it fails the same way on first use
+            logger.warning(f"Warm-up skipped provider client {factory.__module__}: {e}")
+    return clients
+
+
+async def warm_providers() -> None:
+    """Create the current agent and open a keep-alive connection in every provider client's pool."""
+    import openai
+    from src.agent.registry import get_current_agent
+
+    # Agents and their clients are built lazily; build them now (off the loop)
+    await asyncio.to_thread(get_current_agent)
+    clients = await asyncio.to_thread(provider_clients)
+
+    async def touch(client: openai.AsyncOpenAI) -> None:
+        try:
+            await client.with_options(max_retries=0).models.list()
+        except openai.APIStatusError:
+            # Any HTTP response (e.g. 401 with a placeholder key) means the connection is up
+            pass
+
+    # Clients sharing a base URL still have a connection pool each
+    await asyncio.gather(*(touch(client) for client in clients))
+
+
+def _stream_models() -> List[type]:
+    from openai.types import chat, responses
+    from pydantic import BaseModel
+
+    models = [chat.ChatCompletion, chat.ChatCompletionChunk]
+    for name in dir(responses):
+        obj = getattr(responses, name)
+        if name.startswith("Response") and isinstance(obj, type) and issubclass(obj, BaseModel):
+            models.append(obj)
+    return models
+
+
+def warm_code_paths() -> None:
+    """Build the validators the OpenAI SDK defers until a model is first used."""
+    for model in _stream_models():
+        model.model_rebuild()
+
+
+async def _timed(name: str, step: Callable[[], Awaitable[None]], timeout: float) -> None:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(step(), timeout)
+        status = "ok"
+    except Exception as e:
+        status = f"failed: {e!r}"
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    readiness.steps[name] = {"ms": round(elapsed_ms, 1), "status": status}
+    log = logger.info if status == "ok" else logger.warning
+    log(f"Warm-up step '{name}' {status} in {elapsed_ms:.0f} ms")
+
+
+async def run_warmup(db_connections: int, timeout: float) -> None:
+    """
+    Run every warm-up step concurrently, then mark the instance ready.
+
+    Args:
+        db_connections: Pooled database connections to open
+        timeout: Seconds each step may take before it is abandoned
+    """
+    start = time.perf_counter()
+    await asyncio.gather(
+        _timed("db", lambda: warm_db(db_connections), timeout),
+        _timed("providers", warm_providers, timeout),
+        _timed("code_paths", lambda: asyncio.to_thread(warm_code_paths), timeout),
+    )
+    readiness.ready = True
+    logger.info(f"✅ Warm-up finished in {(time.perf_counter() - start) * 1000:.0f} ms; instance is ready")
+
+
+def start_warmup(enabled: bool, db_connections: int, timeout: float) -> Optional[asyncio.Task]:
+    """Start warm-up in the background, or mark the instance ready right away when disabled."""
+    if not enabled:
+        readiness.ready = True
+        return None
+    return asyncio.create_task(run_warmup(db_connections, timeout))
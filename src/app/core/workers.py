@@ -0,0 +1,34 @@
+"""
+Worker Sizing
+
+Per-worker share of process-wide resource budgets.
+
+The multi-worker server (`src.app.server`) exports the number of worker
+processes (including a dedicated Gradio process, if any) as APP_WORKERS
+before it spawns them. Budgets that are configured
+for the whole instance, such as the total database connections, are
+divided by that count in each worker, so adding workers does not multiply
+the load on shared backends.
+"""
+
+import math
+import os
+
+
+def worker_count() -> int:
+    """Number of worker processes serving this instance (1 when not set)."""
+    try:
+        return max(1, int(os.getenv("APP_WORKERS", "1")))
+    except ValueError:
+        return 1
+
+
+def per_worker(total: int, minimum: int = 1) -> int:
+    """
+    This worker's share of an instance-wide budget, rounded up.
+
+    Args:
+        total: Budget for the whole instance
+        minimum: Smallest share a worker gets
+    """
+    return max(minimum, math.ceil(total / worker_count()))
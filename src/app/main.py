@@ -1,35 +1,73 @@
 import os
-import uvicorn
-import gradio as gr
+from functools import lru_cache
 from fastapi import FastAPI
-from src.app.core.init_settings import args
-from src.app.core.middlewares import setup_cors, setup_session
+from src.app.core.init_settings import get_args, get_global_settings
+from src.app.core.middlewares import setup_cors, setup_metrics, setup_profiling, setup_read_your_writes, setup_session
 from src.app.core.lifespan import lifespan
 from src.app.core.logging import logger
 from src.app.core.routers import setup_routers
-from src.ui.gradio.agent_demo.app import build_agent_ui
-from src.ui.gradio.chat_demo.app import build_chat_ui
 
-app = FastAPI(lifespan=lifespan)
-logger.info("FastAPI application started")
+def mount_uis(app: FastAPI, mount_agent_ui: bool, mount_chat_ui: bool) -> FastAPI:
+    """
+    Mount the Gradio UIs that are enabled.
 
-# Set Middleware
-setup_cors(app)
-setup_session(app)
+    Gradio is only imported when at least one UI is mounted, so API-only
+    workers never pay for it.
+    """
+    if not (mount_agent_ui or mount_chat_ui):
+        return app
 
-# Setup Routers
-setup_routers(app)
+    import gradio as gr
 
-# Gradio app
-agent_ui = build_agent_ui()
-chat_ui = build_chat_ui()
-app = gr.mount_gradio_app(app, agent_ui, path="/agent", root_path="/agent")
-app = gr.mount_gradio_app(app, chat_ui, path="/chat", root_path="/chat")
+    if mount_agent_ui:
+        from src.ui.gradio.agent_demo.app import build_agent_ui
+        app = gr.mount_gradio_app(app, build_agent_ui(), path="/agent", root_path="/agent")
+    if mount_chat_ui:
+        from src.ui.gradio.chat_demo.app import build_chat_ui
+        app = gr.mount_gradio_app(app, build_chat_ui(), path="/chat", root_path="/chat")
+    return app
+
+def create_app() -> FastAPI:
+    settings = get_global_settings()
+
+    app = FastAPI(lifespan=lifespan)
+    logger.info("FastAPI application started")
+
+    # Set Middleware
+    setup_cors(app)
+    setup_session(app)
+    setup_profiling(app)
+    setup_read_your_writes(app)
+    setup_metrics(app)
+
+    # Setup Routers
+    setup_routers(app)
+
+    # Gradio apps (MOUNT_AGENT_UI / MOUNT_CHAT_UI)
+    return mount_uis(app, settings.MOUNT_AGENT_UI, settings.MOUNT_CHAT_UI)
+
+@lru_cache(maxsize=None)
+def get_app() -> FastAPI:
+    return create_app()
+
+def __getattr__(name: str):
+    # `src.app.main:app` is built when the server first looks it up, not on import
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
-    uvicorn.run(
-        app="src.app.main:app",
-        host = args.host,
-        port=int(os.getenv("PORT", 5000)),
-        reload=args.mode == "dev"
-    )
\ No newline at end of file
+    args = get_args()
+    port = int(os.getenv("PORT", 5000))
+    if args.mode == "prod" or args.workers:
+        # Multi-worker server (src/app/server.py)
+        from src.app.server import serve
+        serve(args.mode, args.host, port, args.workers)
+    else:
+        import uvicorn
+        uvicorn.run(
+            app="src.app.main:app",
+            host = args.host,
+            port=port,
+            reload=True
+        )
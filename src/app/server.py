@@ -0,0 +1,168 @@
+"""
+Production Server
+
+Runs the application under uvicorn with several worker processes.
+
+`python -m src.app.main --mode prod` (or any mode with `--workers N`) ends up
+in `serve()`:
+- Worker count: `--workers`, else WEB_CONCURRENCY, else one per CPU.
+- Event loop and HTTP parser: uvloop and httptools when they are installed,
+  asyncio and h11 otherwise.
+- Per-worker sizing: APP_WORKERS is exported to the workers, which divide
+  instance-wide budgets such as DB_MAX_CONNECTIONS by it
+  (see `src.app.core.workers`).
+- Schema check: done once here, before the workers start, so they do not
+  race to migrate the same database.
+- Metrics: PROMETHEUS_MULTIPROC_DIR is pointed at an empty directory so
+  `/metrics` on any worker aggregates all of them (see `src.app.core.metrics`).
+- Graceful restarts: the uvicorn supervisor replaces a worker that exits,
+  `kill -HUP <pid>` restarts the workers one at a time, and
+  WORKER_MAX_REQUESTS recycles a worker after that many requests. A worker
+  that is stopped drains its agent runs first (SHUTDOWN_DRAIN_SECONDS).
+
+Affinity: uvicorn workers share one listening socket, so consecutive
+requests of a client may reach different workers. Gradio keeps its queue and
+session state in the worker that created them. The UIs stay mounted on PORT
+in every worker by default, so they remain reachable where only one port is
+exposed (the Docker image, most PaaS). Setting UI_PORT moves them to one
+dedicated process on that port instead, for a proxy to route `/agent` and
+`/chat` to; that process counts as one more worker in the per-worker split
+of instance-wide budgets. Agent run streams are held by the worker that
+started the run: use `POST /api/v1/runs?stream=true` to start and stream a
+run on a single connection.
+"""
+
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+from src.app.core.init_settings import get_global_settings
+from src.app.core.logging import logger
+
+APP = "src.app.main:app"
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def resolve_workers(settings, workers: Optional[int] = None) -> int:
+    """
+    Number of worker processes to run.
+
+    Args:
+        settings: Application settings
+        workers: Explicit count from the command line
+
+    Returns:
+        `workers`, else WEB_CONCURRENCY, else one per CPU; with UI_PORT set,
+        the Gradio UIs get their own process beside them (see `serve`)
+    """
+    if workers or settings.WEB_CONCURRENCY:
+        return max(1, workers or settings.WEB_CONCURRENCY)
+    return os.cpu_count() or 1
+
+
+async def _check_schema() -> None:
+    from src.db.database import dispose_engines, init_db
+
+    try:
+        await init_db()
+    finally:
+        await dispose_engines()
+
+
+def _run(host: str, port: int, workers: Optional[int]) -> None:
+    import uvicorn
+
+    settings = get_global_settings()
+    uvicorn.run(
+        app=APP,
+        host=host,
+        port=port,
+        workers=workers,
+        loop=event_loop(),
+        http=http_protocol(),
+        proxy_headers=True,
+        timeout_graceful_shutdown=int(settings.SHUTDOWN_DRAIN_SECONDS) or None,
+        limit_max_requests=settings.WORKER_MAX_REQUESTS,
+        # Keep the root queue handler (src.app.core.logging) for uvicorn's own loggers
+        log_config=None,
+    )
+
+
+def _prepare_metrics_dir() -> Optional[str]:
+    """Empty the shared metrics directory, creating a temporary one if none is configured (returned)."""
+    # Stale files from a previous run would be counted again
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return None
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+    return path
+
+
+def _serve_ui(host: str, port: int) -> None:
+    # Runs in its own (spawned) process: one worker, so Gradio sessions stay in one place
+    _run(host, port, workers=None)
+
+
+def serve(mode: str, host: str, port: int, workers: Optional[int] = None) -> None:
+    """
+    Run the server until it is stopped.
+
+    Args:
+        mode: Settings mode ("dev" or "prod")
+        host: Interface to bind
+        port: Port of the API (and of the UIs unless UI_PORT is set)
+        workers: Worker processes; see `resolve_workers`
+    """
+    # Workers are spawned and build their settings from the environment
+    os.environ["APP_MODE"] = mode
+    settings = get_global_settings()
+    workers = resolve_workers(settings, workers)
+    mounts_ui = settings.MOUNT_AGENT_UI or settings.MOUNT_CHAT_UI
+    dedicated_ui = workers > 1 and mounts_ui and settings.UI_PORT is not None
+    # The dedicated UI process runs the whole app too: count it in the budget split
+    os.environ["APP_WORKERS"] = str(workers + 1 if dedicated_ui else workers)
+    logger.info(f"Serving on {host}:{port} with {workers} worker(s), loop={event_loop()}, http={http_protocol()}")
+
+    if workers == 1:
+        _run(host, port, workers=None)
+        return
+
+    asyncio.run(_check_schema())
+    temporary_metrics_dir = _prepare_metrics_dir()
+
+    ui_process = None
+    if dedicated_ui:
+        ui_process = multiprocessing.get_context("spawn").Process(
+            target=_serve_ui, args=(host, settings.UI_PORT), name="gradio-ui"
+        )
+        ui_process.start()
+        logger.info(f"Gradio UIs are served by a dedicated process on {host}:{settings.UI_PORT}")
+        # The API workers inherit the environment: keep Gradio out of them
+        os.environ["MOUNT_AGENT_UI"] = os.environ["MOUNT_CHAT_UI"] = "false"
+    elif mounts_ui:
+        logger.warning(
+            f"Gradio UIs are mounted in each of the {workers} workers and keep their sessions there, so a "
+            "UI request reaching another worker can lose its session; set UI_PORT to serve them from one process"
+        )
+
+    try:
+        _run(host, port, workers=workers)
+    finally:
+        if ui_process is not None:
+            ui_process.terminate()
+            ui_process.join(settings.SHUTDOWN_DRAIN_SECONDS + 5)
+        if temporary_metrics_dir is not None:
+            shutil.rmtree(temporary_metrics_dir, ignore_errors=True)
@@ -0,0 +1,7 @@
+"""
+Benchmarks Package
+
+Standalone benchmark scripts for the OpenAI Agent Template.
+Run a benchmark with `python -m src.bench.<module>`; `python -m src.bench`
+runs the end-to-end load test (`src.bench.load`).
+"""
@@ -0,0 +1,6 @@
+"""Run the end-to-end load test (`src.bench.load`) with `python -m src.bench`."""
+
+from src.bench.load import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+End-to-End Load Test
+
+Drives concurrent simulated users through the application against the mock
+provider (`src.bench.mock_provider`) and reports throughput, latency
+percentiles, database time and error rates per scenario:
+
+- agent: `POST /api/v1/runs?stream=true`, reading the run's events; time to
+  first token is the first `text_delta`, the turn ends with `completed`.
+  Each user keeps its memory session for `--turns-per-session` turns.
+- chat: the chain path of the chat UI through Gradio's HTTP API
+  (`/chat/gradio_api/call/handle_demo_response`), sending the growing
+  conversation like the browser does.
+- api: a mix of message endpoints (create, list newest, fetch one) and
+  `/health/ready`.
+
+The benchmark starts the mock provider and the application (`--workers`)
+against a fresh SQLite database in a temporary directory. Each scenario
+gets a short warm-up, then `--users` users run turns back to back for
+`--duration` seconds. Database time comes from the server's own metrics
+(agent memory session operations, plus the wait for pooled connections),
+scraped before and after each scenario.
+
+Results are written as JSON (`--output`). With `--compare`, they are checked
+against an earlier result file: throughput dropping, or p99 latency rising,
+by more than `--threshold`, or the error rate rising by more than one point,
+counts as a regression and the exit status is 1.
+
+Usage:
+    python -m src.bench --users 32 --duration 30
+    python -m src.bench --scenarios agent api --output after.json --compare before.json --threshold 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from src.bench.worker_scaling import ROOT, start_process, stop_process, wait_ready
+
+SCENARIOS = ("agent", "chat", "api")
+
+# Server histograms of database time: (metric, label value, name in the report, part of the turn's total).
+# Pool checkout is the wait for a connection; for agent turns it is already inside the memory operations.
+DB_HISTOGRAMS = [
+    ("agent_memory_operation_duration_seconds", "get_items", "memory_get_items", True),
+    ("agent_memory_operation_duration_seconds", "add_items", "memory_add_items", True),
+    ("db_pool_checkout_duration_seconds", None, "pool_checkout", False),
+]
+
+SAMPLE_LINE = re.compile(r"^(?P<name>[a-zA-Z_:][\w:]*)(?:\{(?P<labels>[^}]*)\})?\s+(?P<value>\S+)$")
+
+
+@dataclass
+class Sample:
+    """Outcome of one turn or request."""
+
+    op: str
+    ok: bool
+    seconds: float
+    ttft: Optional[float] = None
+    error: Optional[str] = None
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of unsorted values, None without values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(values: List[float]) -> Dict[str, Optional[float]]:
+    """Percentiles in milliseconds."""
+    summary = {}
+    for q in (50, 90, 99):
+        value = percentile(values, q)
+        summary[f"p{q}_ms"] = round(value * 1000, 2) if value is not None else None
+    summary["max_ms"] = round(max(values) * 1000, 2) if values else None
+    return summary
+
+
+async def scrape_histograms(http: aiohttp.ClientSession, base_url: str) -> Dict[str, Dict[str, float]]:
+    """Sum and count of the database time histograms from the server's `/metrics`."""
+    async with http.get(f"{base_url}/metrics") as response:
+        text = await response.text()
+    totals = {report: {"sum": 0.0, "count": 0.0} for _, _, report, _ in DB_HISTOGRAMS}
+    for line in text.splitlines():
+        match = SAMPLE_LINE.match(line)
+        if match is None:
+            continue
+        name, labels = match["name"], match["labels"] or ""
+        for metric, label, report, _ in DB_HISTOGRAMS:
+            for suffix in ("sum", "count"):
+                if name == f"{metric}_{suffix}" and (label is None or f'"{label}"' in labels):
+                    totals[report][suffix] += float(match["value"])
+    return totals
+
+
+def db_time(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]], turns: int) -> Dict[str, Any]:
+    """Database time spent between two scrapes, per operation and per successful turn."""
+    report: Dict[str, Any] = {}
+    total, operations = 0.0, 0
+    for _, _, name, in_total in DB_HISTOGRAMS:
+        count = after[name]["count"] - before[name]["count"]
+        seconds = after[name]["sum"] - before[name]["sum"]
+        if in_total:
+            total += seconds
+            operations += count
+        report[name] = {"count": int(count), "mean_ms": round(seconds / count * 1000, 3) if count else None}
+    report["total_seconds"] = round(total, 3)
+    # None when the scenario made no timed memory operations (the chat and api paths)
+    report["per_turn_ms"] = round(total / turns * 1000, 3) if turns and operations else None
+    return report
+
+
+async def agent_user(http: aiohttp.ClientSession, urls: Dict[str, str], deadline: float, turns: int, samples: List[Sample]) -> None:
+    session_id, turn = f"load-{uuid.uuid4().hex}", 0
+    while time.monotonic() < deadline:
+        if turn == turns:
+            session_id, turn = f"load-{uuid.uuid4().hex}", 0
+        turn += 1
+        start = time.perf_counter()
+        ttft, outcome = None, None
+        try:
+            body = {"session_id": session_id, "input": f"Turn {turn}: what's the weather?"}
+            async with http.post(f"{urls['api']}/api/v1/runs?stream=true", json=body) as response:
+                if response.status != 200:
+                    outcome = f"http {response.status}"
+                else:
+                    async for line in response.content:
+                        if line.startswith(b"event: text_delta") and ttft is None:
+                            ttft = time.perf_counter() - start
+                        elif line.startswith(b"event: completed"):
+                            outcome = "ok"
+                        elif line.startswith(b"event: error"):
+                            outcome = "run error"
+                            break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            outcome = type(e).__name__
+        samples.append(Sample("run", outcome == "ok", time.perf_counter() - start, ttft, None if outcome == "ok" else outcome or "incomplete"))
+
+
+async def chat_user(http: aiohttp.ClientSession, urls: Dict[str, str], deadline: float, turns: int, samples: List[Sample]) -> None:
+    endpoint = f"{urls['chat']}/gradio_api/call/handle_demo_response"
+    history: List[Dict[str, Any]] = []
+    while time.monotonic() < deadline:
+        if len(history) >= 2 * turns:
+            history = []
+        history.append({"role": "user", "content": f"Turn {len(history) // 2 + 1}: tell me something."})
+        start = time.perf_counter()
+        ttft, outcome = None, None
+        try:
+            async with http.post(endpoint, json={"data": [history]}) as response:
+                if response.status != 200:
+                    outcome = f"http {response.status}"
+                else:
+                    event_id = (await response.json())["event_id"]
+                    async with http.get(f"{endpoint}/{event_id}") as events:
+                        event = None
+                        async for raw in events.content:
+                            line = raw.decode().strip()
+                            if line.startswith("event: "):
+                                event = line[len("event: "):]
+                            elif line.startswith("data: ") and event in ("generating", "complete"):
+                                messages = json.loads(line[len("data: "):])[0]
+                                if ttft is None and messages and messages[-1]["role"] == "assistant":
+                                    ttft = time.perf_counter() - start
+                                if event == "complete":
+                                    title = ((messages[-1].get("metadata") or {}).get("title") or "") if messages else ""
+                                    outcome = "handler error" if "Error" in title else "ok"
+                                    history = messages
+                            elif event == "error":
+                                outcome = "gradio error"
+                                break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            outcome = type(e).__name__
+        if outcome != "ok" and history and history[-1]["role"] == "user":
+            history.pop()
+        samples.append(Sample("turn", outcome == "ok", time.perf_counter() - start, ttft, None if outcome == "ok" else outcome or "incomplete"))
+
+
+async def api_user(http: aiohttp.ClientSession, urls: Dict[str, str], deadline: float, turns: int, samples: List[Sample]) -> None:
+    owner_id, message_ids = f"load-{uuid.uuid4().hex[:12]}", []
+    random_ = random.Random()
+    base = urls["api"]
+    while time.monotonic() < deadline:
+        roll = random_.random()
+        if roll < 0.3 or not message_ids:
+            op, request = "create_message", http.post(f"{base}/api/v1/messages", json={"content": "load test message", "owner_id": owner_id})
+        elif roll < 0.7:
+            op, request = "list_messages", http.get(f"{base}/api/v1/messages", params={"owner_id": owner_id, "limit": 30, "newest_first": "true"})
+        elif roll < 0.9:
+            op, request = "get_message", http.get(f"{base}/api/v1/messages/{random_.choice(message_ids)}")
+        else:
+            op, request = "health_ready", http.get(f"{base}/health/ready")
+        start = time.perf_counter()
+        error = None
+        try:
+            async with request as response:
+                payload = await response.read()
+                if response.status != 200:
+                    error = f"http {response.status}"
+                elif op == "create_message":
+                    message_ids.append(json.loads(payload)["id"])
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = type(e).__name__
+        samples.append(Sample(op, error is None, time.perf_counter() - start, None, error))
+
+
+USERS = {"agent": agent_user, "chat": chat_user, "api": api_user}
+
+
+async def load(scenario: str, urls: Dict[str, str], users: int, duration: float, turns: int) -> Dict[str, Any]:
+    """Run `users` users of a scenario for `duration` seconds and summarize their samples."""
+    samples: List[Sample] = []
+    connector = aiohttp.TCPConnector(limit=users * 2)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as http:
+        before = await scrape_histograms(http, urls["api"])
+        start = time.perf_counter()
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(USERS[scenario](http, urls, deadline, turns, samples) for _ in range(users)))
+        elapsed = time.perf_counter() - start
+        after = await scrape_histograms(http, urls["api"])
+
+    ok = [sample for sample in samples if sample.ok]
+    result: Dict[str, Any] = {
+        "users": users,
+        "seconds": round(elapsed, 2),
+        "requests": len(samples),
+        "ok": len(ok),
+        "throughput_per_s": round(len(ok) / elapsed, 2),
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+        "errors": dict(Counter(sample.error for sample in samples if not sample.ok)),
+        "latency": latency_summary([sample.seconds for sample in ok]),
+        "db": db_time(before, after, len(ok)),
+    }
+    ttfts = [sample.ttft for sample in ok if sample.ttft is not None]
+    if ttfts:
+        result["ttft"] = latency_summary(ttfts)
+    ops = sorted({sample.op for sample in samples})
+    if len(ops) > 1:
+        result["ops"] = {
+            op: {"count": sum(1 for s in samples if s.op == op), **latency_summary([s.seconds for s in ok if s.op == op])}
+            for op in ops
+        }
+    return result
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Regressions of a result against a baseline result.
+
+    Args:
+        current: Result of this run
+        baseline: Earlier result loaded from JSON
+        threshold: Allowed relative change, e.g. 0.1 for 10%
+
+    Returns:
+        One line per regression (empty when there is none)
+    """
+    regressions = []
+    for scenario, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if before is None:
+            continue
+        if now["throughput_per_s"] < before["throughput_per_s"] * (1 - threshold):
+            regressions.append(f"{scenario}: throughput {before['throughput_per_s']}/s -> {now['throughput_per_s']}/s")
+        for metric in ("latency", "ttft"):
+            old, new = (before.get(metric) or {}).get("p99_ms"), (now.get(metric) or {}).get("p99_ms")
+            if old and new and new > old * (1 + threshold):
+                regressions.append(f"{scenario}: {metric} p99 {old} ms -> {new} ms")
+        if now["error_rate"] > before["error_rate"] + 0.01:
+            regressions.append(f"{scenario}: error rate {before['error_rate']:.2%} -> {now['error_rate']:.2%}")
+    return regressions
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    print(f"{'scenario':<8} {'ok/s':>8} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8} {'ttft p50':>9} {'ttft p99':>9} {'db/turn ms':>11}")
+    for scenario, result in results["scenarios"].items():
+        ttft = result.get("ttft", {})
+        cells = [result["latency"]["p50_ms"], result["latency"]["p99_ms"], ttft.get("p50_ms"), ttft.get("p99_ms"), result["db"]["per_turn_ms"]]
+        p50, p99, ttft50, ttft99, db = ("-" if cell is None else f"{cell:.1f}" for cell in cells)
+        print(
+            f"{scenario:<8} {result['throughput_per_s']:>8.1f} {result['error_rate']:>7.2%} {p50:>8} {p99:>8} "
+            f"{ttft50:>9} {ttft99:>9} {db:>11}"
+        )
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(ROOT),
+            "PORT": str(args.port),
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-bench"),
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{args.provider_port}/v1",
+            "OPENAI_AGENTS_DISABLE_TRACING": "1",
+            "MOUNT_AGENT_UI": "false",
+            "MOUNT_CHAT_UI": "true" if "chat" in args.scenarios else "false",
+        }
+        provider = start_process([
+            "-m", "src.bench.mock_provider", "--port", str(args.provider_port),
+            "--ttft-ms", str(args.ttft_ms), "--tokens", str(args.tokens), "--tokens-per-second", str(args.tokens_per_second),
+            "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+            "--tool-call-rate", str(args.tool_call_rate),
+        ], env, tmp)
+        # Dev mode: a fresh SQLite database in the temporary directory, migrated by the server
+        server = start_process(["-m", "src.app.main", "--mode", "dev", "--workers", str(args.workers)], env, tmp)
+        try:
+            await wait_ready(f"http://127.0.0.1:{args.provider_port}/v1/models", 30)
+            base_url = f"http://127.0.0.1:{args.port}"
+            await wait_ready(f"{base_url}/health/ready", 60)
+            # With several workers the UIs are served by their own process on PORT + 1
+            ui_url = base_url if args.workers == 1 else f"http://127.0.0.1:{args.port + 1}"
+            urls = {"api": base_url, "chat": f"{ui_url}/chat"}
+            if "chat" in args.scenarios:
+                await wait_ready(f"{urls['chat']}/gradio_api/info", 60)
+
+            results: Dict[str, Any] = {
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+                "scenarios": {},
+            }
+            for scenario in args.scenarios:
+                await load(scenario, urls, args.users, args.warmup, args.turns_per_session)
+                results["scenarios"][scenario] = await load(scenario, urls, args.users, args.duration, args.turns_per_session)
+            return results
+        finally:
+            stop_process(server)
+            stop_process(provider)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS), help="Scenarios to run, in order")
+    parser.add_argument("--users", type=int, default=16, help="Concurrent simulated users per scenario")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per scenario")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of unmeasured load before each scenario")
+    parser.add_argument("--turns-per-session", type=int, default=5, help="Turns before a user starts a new session")
+    parser.add_argument("--workers", type=int, default=1, help="Server worker processes")
+    parser.add_argument("--port", type=int, default=5055, help="Port of the application")
+    parser.add_argument("--provider-port", type=int, default=8100, help="Port of the mock provider")
+    parser.add_argument("--ttft-ms", type=float, default=50.0, help="Mock provider time to first token")
+    parser.add_argument("--tokens", type=int, default=20, help="Mock provider tokens per reply")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Mock provider token rate")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Mock provider share of 500 answers")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Mock provider share of 429 answers")
+    parser.add_argument("--tool-call-rate", type=float, default=0.0, help="Mock provider share of tool calls")
+    parser.add_argument("--output", default=None, help="Result file (default: load-<UTC time>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print_report(results)
+    output = args.output or f"load-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
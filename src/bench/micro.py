@@ -0,0 +1,416 @@
+"""
+Microbenchmarks
+
+Time and peak memory of the hot pure-Python paths, over a range of input
+sizes:
+
+- memory.*: `CustomMemorySession.add_items` and `get_items` (the latest
+  items, and the whole history) on a session of 10 to 100k items, on a
+  temporary SQLite database
+- history.*: `ChatHistoryManager.save_conversation` and
+  `get_conversation_list` with 1 to 10k saved conversations, and
+  `gradio_to_openai_messages` on 10 to 100k messages
+- stream.*: the streaming accumulation loops, i.e. a run's event stream
+  (`RunStream`) consumed by a subscriber joining the text deltas, and the
+  chat UI's `handle_demo_response` reading a reply of N tokens from the
+  mock provider (`src.bench.mock_provider`, started in its own process)
+
+Each case is set up once per size, outside the measurement, then repeated
+until `--min-time` seconds are spent (at least 3 and at most
+`--max-repeat` times). The minimum and median times are reported; peak
+memory is the most allocated above the starting point during one more
+repetition traced with `tracemalloc`.
+
+Results can be saved as JSON (`--output`). With `--compare`, a case whose
+minimum time or peak memory grows by more than `--threshold` over an
+earlier result counts as a regression and the exit status is 1; tiny
+absolute changes (under 0.05 ms or 16 KiB) are ignored as noise. Use
+`--max-size` for a quick run, e.g. in CI.
+
+Usage:
+    python -m src.bench.micro
+    python -m src.bench.micro --filter history --max-size 1000 --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+ITEM_SIZES = [10, 100, 1_000, 10_000, 100_000]
+CONVERSATION_SIZES = [1, 10, 100, 1_000, 10_000]
+TOKEN_SIZES = [10, 100, 1_000, 10_000]
+
+# Changes smaller than these are noise, whatever the relative change
+MIN_TIME_DELTA_MS = 0.05
+MIN_MEMORY_DELTA_KIB = 16.0
+
+
+class Timer:
+    """Accumulates the time (and, when traced, the peak memory) of the `with timer:` blocks of one repetition."""
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.seconds = 0.0
+        self.peak_bytes = 0
+
+    def __enter__(self) -> "Timer":
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            self._baseline = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.seconds += time.perf_counter() - self._start
+        if self.trace_memory:
+            self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1] - self._baseline)
+
+
+@dataclass
+class Case:
+    """
+    A benchmark over a range of sizes.
+
+    `setup(size)` builds the state once per size; `run(state, timer)` is one
+    repetition and measures its relevant part with `with timer:`. Each of
+    them, and `teardown(state)`, may be a coroutine function.
+    """
+
+    name: str
+    sizes: Sequence[int]
+    setup: Callable[[int], Any]
+    run: Callable[[Any, Timer], Any]
+    teardown: Optional[Callable[[Any], Any]] = None
+
+
+async def call(fn: Callable, *args) -> Any:
+    result = fn(*args)
+    return await result if inspect.isawaitable(result) else result
+
+
+# Memory session on SQLite
+
+def agent_items(count: int, offset: int = 0) -> List[Dict[str, Any]]:
+    """Alternating user and assistant items, the shape the Agents SDK stores."""
+    return [
+        {"role": "user", "content": f"question {i}"} if i % 2 == 0 else
+        {"role": "assistant", "content": [{"type": "output_text", "text": f"answer {i} " + "x" * 200}]}
+        for i in range(offset, offset + count)
+    ]
+
+
+async def memory_setup(size: int, prefill: bool) -> Dict[str, Any]:
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from src.agent.memory.session import CustomMemorySession
+    from src.db.database import Base
+
+    tmp = tempfile.TemporaryDirectory()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp.name, 'bench.db')}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = CustomMemorySession("bench", engine)
+    if prefill:
+        for offset in range(0, size, 1000):
+            await session.add_items(agent_items(min(1000, size - offset), offset))
+    return {"tmp": tmp, "engine": engine, "session": session, "items": agent_items(size), "size": size, "runs": 0}
+
+
+async def memory_teardown(state: Dict[str, Any]) -> None:
+    await state["engine"].dispose()
+    state["tmp"].cleanup()
+
+
+async def run_add_items(state: Dict[str, Any], timer: Timer) -> None:
+    from src.agent.memory.session import CustomMemorySession
+
+    # A fresh session every time, so each repetition appends to an empty history
+    state["runs"] += 1
+    session = CustomMemorySession(f"bench-add-{state['runs']}", state["engine"])
+    with timer:
+        await session.add_items(state["items"])
+
+
+async def run_get_recent(state: Dict[str, Any], timer: Timer) -> None:
+    with timer:
+        await state["session"].get_items()
+
+
+async def run_get_all(state: Dict[str, Any], timer: Timer) -> None:
+    with timer:
+        await state["session"].get_items(limit=state["size"])
+
+
+# Chat history manager
+
+def chat_messages(count: int) -> List[Any]:
+    from gradio import ChatMessage
+
+    return [
+        ChatMessage(role="user" if i % 2 == 0 else "assistant", content=f"message {i} " + "x" * 200)
+        for i in range(count)
+    ]
+
+
+def saved_conversations(count: int) -> List[Dict[str, Any]]:
+    from src.ui.gradio.chat_history import ChatHistoryManager
+
+    messages = ChatHistoryManager.serialize_chat_messages(chat_messages(20))
+    start = datetime(2026, 1, 1)
+    return [
+        {
+            "title": f"Conversation {i}",
+            "messages": list(messages),
+            "timestamp": (start + timedelta(minutes=i)).isoformat(),
+            "message_count": len(messages),
+        }
+        for i in range(count)
+    ]
+
+
+def run_save_conversation(state: Dict[str, Any], timer: Timer) -> None:
+    from src.ui.gradio.chat_history import ChatHistoryManager
+
+    # Saved as a new conversation, into a copy so every repetition sees `size` conversations
+    conversations = list(state["conversations"])
+    with timer:
+        ChatHistoryManager.save_conversation(None, state["messages"], conversations)
+
+
+def run_conversation_list(state: Dict[str, Any], timer: Timer) -> None:
+    from src.ui.gradio.chat_history import ChatHistoryManager
+
+    with timer:
+        ChatHistoryManager.get_conversation_list(state["conversations"])
+
+
+def run_gradio_to_openai(state: List[Any], timer: Timer) -> None:
+    from src.ui.gradio.chat_history import ChatHistoryManager
+
+    with timer:
+        ChatHistoryManager.gradio_to_openai_messages(state)
+
+
+# Streaming accumulation
+
+async def run_run_stream(size: int, timer: Timer) -> None:
+    from src.agent.runs import RunStream
+
+    async def consume(run: RunStream) -> str:
+        text = ""
+        async for event in run.subscribe():
+            if event.type == "text_delta":
+                text += event.data["delta"]
+        return text
+
+    with timer:
+        run = RunStream("bench", "bench", buffer_size=1024)
+        consumer = asyncio.create_task(consume(run))
+        for i in range(size):
+            await run.append("text_delta", {"delta": f"tok{i} "})
+        await run.append("completed")
+        await consumer
+
+
+class MockProviderProcess:
+    """The mock provider in its own process, so its allocations stay out of the traced memory."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        if self.process is not None:
+            return
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "src.bench.mock_provider", "--port", str(self.port), "--ttft-ms", "0", "--tokens-per-second", "0"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{self.port}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+        deadline = time.monotonic() + 30
+        while not self.request("GET", "/v1/models"):
+            if time.monotonic() > deadline:
+                raise TimeoutError("Mock provider did not start")
+            time.sleep(0.1)
+
+    def request(self, method: str, path: str, body: Any = None) -> bool:
+        import urllib.error
+        import urllib.request
+
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(f"http://127.0.0.1:{self.port}{path}", data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=5):
+                return True
+        except (urllib.error.URLError, ConnectionError):
+            return False
+
+    def stop(self) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(10)
+            self.process = None
+
+
+MOCK_PROVIDER = MockProviderProcess(port=8100)
+
+
+def chat_response_setup(size: int) -> Dict[str, Any]:
+    MOCK_PROVIDER.start()
+    return {"reply": " ".join(f"tok{i}" for i in range(size))}
+
+
+async def run_chat_response(state: Dict[str, Any], timer: Timer) -> None:
+    from gradio import ChatMessage
+    from src.ui.gradio.chat_demo.event_listeners import handle_demo_response
+
+    MOCK_PROVIDER.request("POST", "/mock/script", [{"content": state["reply"]}])
+    history = [ChatMessage(role="user", content="Tell me a story.")]
+    with timer:
+        async for _ in handle_demo_response(history):
+            pass
+
+
+CASES = [
+    Case("memory.add_items", ITEM_SIZES, lambda size: memory_setup(size, prefill=False), run_add_items, memory_teardown),
+    Case("memory.get_items_recent", ITEM_SIZES, lambda size: memory_setup(size, prefill=True), run_get_recent, memory_teardown),
+    Case("memory.get_items_all", ITEM_SIZES, lambda size: memory_setup(size, prefill=True), run_get_all, memory_teardown),
+    Case(
+        "history.save_conversation", CONVERSATION_SIZES,
+        lambda size: {"conversations": saved_conversations(size), "messages": chat_messages(20)}, run_save_conversation,
+    ),
+    Case("history.get_conversation_list", CONVERSATION_SIZES, lambda size: {"conversations": saved_conversations(size)}, run_conversation_list),
+    Case("history.gradio_to_openai_messages", ITEM_SIZES, chat_messages, run_gradio_to_openai),
+    Case("stream.run_stream", TOKEN_SIZES, lambda size: size, run_run_stream),
+    Case("stream.chat_response", TOKEN_SIZES, chat_response_setup, run_chat_response),
+]
+
+
+async def measure(case: Case, size: int, min_time: float, max_repeat: int) -> Dict[str, Any]:
+    """Time one case at one size, then trace its peak memory."""
+    state = await call(case.setup, size)
+    try:
+        await call(case.run, state, Timer())  # warm-up: imports, caches, connections
+        times: List[float] = []
+        while len(times) < max_repeat and (len(times) < 3 or sum(times) < min_time):
+            timer = Timer()
+            await call(case.run, state, timer)
+            times.append(timer.seconds)
+
+        tracemalloc.start()
+        try:
+            traced = Timer(trace_memory=True)
+            await call(case.run, state, traced)
+        finally:
+            tracemalloc.stop()
+    finally:
+        if case.teardown is not None:
+            await call(case.teardown, state)
+
+    return {
+        "min_ms": round(min(times) * 1000, 4),
+        "median_ms": round(statistics.median(times) * 1000, 4),
+        "repeats": len(times),
+        "peak_kib": round(traced.peak_bytes / 1024, 1),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Regressions of a result against a baseline result.
+
+    Args:
+        current: Results of this run, by case key
+        baseline: Earlier results loaded from JSON
+        threshold: Allowed relative growth, e.g. 0.2 for 20%
+
+    Returns:
+        One line per regression (empty when there is none)
+    """
+    regressions = []
+    for key, now in current["results"].items():
+        before = baseline.get("results", {}).get(key)
+        if before is None:
+            continue
+        if now["min_ms"] > before["min_ms"] * (1 + threshold) and now["min_ms"] - before["min_ms"] > MIN_TIME_DELTA_MS:
+            regressions.append(f"{key}: time {before['min_ms']:.3f} ms -> {now['min_ms']:.3f} ms")
+        if now["peak_kib"] > before["peak_kib"] * (1 + threshold) and now["peak_kib"] - before["peak_kib"] > MIN_MEMORY_DELTA_KIB:
+            regressions.append(f"{key}: peak memory {before['peak_kib']:.1f} KiB -> {now['peak_kib']:.1f} KiB")
+    return regressions
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "results": {},
+    }
+    print(f"{'case':<36} {'size':>7} {'min ms':>11} {'median ms':>11} {'runs':>5} {'peak KiB':>10}")
+    try:
+        for case in CASES:
+            if args.filter and not any(pattern in case.name for pattern in args.filter):
+                continue
+            for size in case.sizes:
+                if args.max_size and size > args.max_size:
+                    continue
+                result = await measure(case, size, args.min_time, args.max_repeat)
+                results["results"][f"{case.name}[{size}]"] = result
+                print(
+                    f"{case.name:<36} {size:>7} {result['min_ms']:>11.3f} {result['median_ms']:>11.3f} "
+                    f"{result['repeats']:>5} {result['peak_kib']:>10.1f}"
+                )
+    finally:
+        if MOCK_PROVIDER.process is not None:
+            # The chain's OpenAI client, created by stream.chat_response on this event loop
+            from src.app.core.clients import close_clients
+            await close_clients()
+        MOCK_PROVIDER.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", nargs="+", default=None, help="Only cases whose name contains one of these")
+    parser.add_argument("--max-size", type=int, default=None, help="Skip sizes above this")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds to spend per case and size")
+    parser.add_argument("--max-repeat", type=int, default=200, help="Most repetitions per case and size")
+    parser.add_argument("--provider-port", type=int, default=8100, help="Port of the mock provider (stream.chat_response)")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Earlier result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    # The benchmarks log at info level on hot paths; keep the report readable
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    MOCK_PROVIDER.port = args.provider_port
+    results = asyncio.run(main_async(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""
+Mock Model Provider
+
+A local OpenAI-compatible Chat Completions server for load tests, benchmarks
+and tests, so none of them needs network access or spends money.
+
+`POST /v1/chat/completions` answers streamed or not, with text or tool
+calls, after a configurable time to first token and at a configurable
+token rate. Failures can be injected at random: `error_rate` answers 500
+and `rate_limit_rate` answers 429 with a Retry-After header, in the
+provider's error format, so client retries and backoff are exercised too.
+`GET /v1/models` is served for the warm-up. Point the application at it
+with `OPENAI_BASE_URL=http://127.0.0.1:<port>/v1`.
+
+Every reply can also be scripted. Responses queued with
+`MockProvider.enqueue` (or `POST /mock/script` with a list of response
+objects, for a provider in another process) are used in order, one per
+request, before falling back to the configured defaults; a `responder`
+callable can pick the response from the request body instead. The request
+bodies (the last 1000) are kept in `MockProvider.requests` and the counts at
+`GET /mock/stats`.
+
+By default a request offering tools gets a call of its first tool when
+`tool_call_rate` says so, with arguments filled in from the tool's JSON
+schema, and text otherwise; a request answering a tool call always gets
+text, so agent turns end.
+
+In tests, the `mock_provider` fixture (`tests/conftest.py`) serves one on a
+free port for the whole session and resets it for every test.
+
+Usage:
+    python -m src.bench.mock_provider --port 8100 --ttft-ms 50 --tokens 20 --tokens-per-second 200
+    python -m src.bench.mock_provider --port 8100 --error-rate 0.01 --rate-limit-rate 0.05 --tool-call-rate 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class MockConfig:
+    """Defaults for replies that are not scripted."""
+
+    ttft_ms: float = 50.0
+    tokens: int = 20
+    tokens_per_second: float = 200.0
+    # Share of requests answered with 500 / with 429
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    # Seconds sent in the Retry-After header of injected 429s
+    retry_after: float = 1.0
+    # Share of requests offering tools that get a call of the first tool
+    tool_call_rate: float = 0.0
+    # Reply text; by default `tokens` words "tok0 tok1 ..."
+    reply: Optional[str] = None
+    seed: Optional[int] = None
+
+
+@dataclass
+class MockToolCall:
+    name: str
+    # JSON-encoded arguments
+    arguments: str = "{}"
+
+
+@dataclass
+class MockResponse:
+    """
+    One scripted reply. Fields left as None take the provider's defaults.
+
+    `status` other than 200 answers with an error in the provider's format
+    (`error_message`), with `retry_after` as the Retry-After header.
+    """
+
+    content: Optional[str] = None
+    tool_calls: List[MockToolCall] = field(default_factory=list)
+    status: int = 200
+    error_message: Optional[str] = None
+    retry_after: Optional[float] = None
+    ttft_ms: Optional[float] = None
+    tokens_per_second: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MockResponse":
+        known = {f.name for f in fields(cls)}
+        data = {key: value for key, value in data.items() if key in known}
+        data["tool_calls"] = [MockToolCall(**call) for call in data.get("tool_calls", [])]
+        return cls(**data)
+
+
+def arguments_for(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Placeholder arguments satisfying the required properties of a tool's JSON schema."""
+    placeholders = {"string": "mock", "integer": 1, "number": 1.0, "boolean": True, "array": [], "object": {}}
+    properties = schema.get("properties", {})
+    return {
+        name: placeholders.get(properties.get(name, {}).get("type"), "mock")
+        for name in schema.get("required", [])
+    }
+
+
+def split_tokens(text: str) -> List[str]:
+    """Split a reply into word-sized stream deltas that join back into the text."""
+    words = text.split(" ")
+    return [word + " " for word in words[:-1]] + [words[-1]] if text else []
+
+
+class MockProvider:
+    """State of one mock server: configuration, scripted replies, received requests and counts."""
+
+    def __init__(self, config: Optional[MockConfig] = None):
+        self.config = config or MockConfig()
+        self.responder: Optional[Callable[[Dict[str, Any]], Optional[MockResponse]]] = None
+        # The most recent request bodies, bounded for long load tests
+        self.requests: Deque[Dict[str, Any]] = deque(maxlen=1000)
+        self.counts: Counter = Counter()
+        self._script: Deque[MockResponse] = deque()
+        self._random = random.Random(self.config.seed)
+        self.app = self._build_app()
+
+    def enqueue(self, *responses: MockResponse) -> None:
+        """Queue scripted replies for the next requests, in order."""
+        self._script.extend(responses)
+
+    def reset(self, config: Optional[MockConfig] = None) -> None:
+        """Back to a fresh provider: new configuration, no script, no recorded requests."""
+        self.config = config or MockConfig()
+        self.responder = None
+        self.requests.clear()
+        self.counts.clear()
+        self._script.clear()
+        self._random = random.Random(self.config.seed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counts, "scripted_pending": len(self._script)}
+
+    def next_response(self, body: Dict[str, Any]) -> MockResponse:
+        """The reply to a request: scripted, from the responder, or generated from the configuration."""
+        if self._script:
+            return self._script.popleft()
+        if self.responder is not None:
+            response = self.responder(body)
+            if response is not None:
+                return response
+
+        config = self.config
+        roll = self._random.random()
+        if roll < config.rate_limit_rate:
+            return MockResponse(status=429, error_message="Rate limit reached (injected)")
+        if roll < config.rate_limit_rate + config.error_rate:
+            return MockResponse(status=500, error_message="Internal server error (injected)")
+
+        messages = body.get("messages") or [{}]
+        tools = body.get("tools") or []
+        if tools and messages[-1].get("role") != "tool" and self._random.random() < config.tool_call_rate:
+            function = tools[0].get("function", {})
+            arguments = json.dumps(arguments_for(function.get("parameters") or {}))
+            return MockResponse(tool_calls=[MockToolCall(function.get("name", "tool"), arguments)])
+        return MockResponse()
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/v1/models")
+        async def list_models():
+            return {"object": "list", "data": [{"id": "mock", "object": "model", "created": 0, "owned_by": "bench"}]}
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            self.requests.append(body)
+            self.counts["requests"] += 1
+            response = self.next_response(body)
+            if response.status != 200:
+                return self._error(response)
+            if response.tool_calls:
+                self.counts["tool_calls"] += len(response.tool_calls)
+            return await self._reply(body, response)
+
+        @app.post("/mock/script")
+        async def script(responses: List[Dict[str, Any]]):
+            self.enqueue(*(MockResponse.from_dict(response) for response in responses))
+            return {"scripted_pending": len(self._script)}
+
+        @app.delete("/mock/script")
+        async def clear_script():
+            self._script.clear()
+            return {"scripted_pending": 0}
+
+        @app.get("/mock/stats")
+        async def stats():
+            return {**self.stats(), "config": asdict(self.config)}
+
+        return app
+
+    def _error(self, response: MockResponse) -> JSONResponse:
+        self.counts[f"status_{response.status}"] += 1
+        headers = {}
+        if response.status == 429:
+            headers["Retry-After"] = f"{response.retry_after if response.retry_after is not None else self.config.retry_after:g}"
+        error_type = "rate_limit_exceeded" if response.status == 429 else "server_error"
+        return JSONResponse(
+            {"error": {"message": response.error_message or error_type, "type": error_type, "param": None, "code": error_type}},
+            status_code=response.status,
+            headers=headers,
+        )
+
+    async def _reply(self, body: Dict[str, Any], response: MockResponse):
+        config = self.config
+        model = body.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        ttft = (response.ttft_ms if response.ttft_ms is not None else config.ttft_ms) / 1000
+        tokens_per_second = response.tokens_per_second or config.tokens_per_second
+        token_delay = 1 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+        if response.tool_calls:
+            content = None
+            pieces = [call.arguments for call in response.tool_calls]
+        else:
+            content = response.content if response.content is not None else (
+                config.reply if config.reply is not None else " ".join(f"tok{i}" for i in range(config.tokens))
+            )
+            pieces = split_tokens(content)
+        finish_reason = "tool_calls" if response.tool_calls else "stop"
+        # Roughly four characters per token, as with real tokenizers on English text
+        prompt_tokens = max(1, len(json.dumps(body.get("messages", []))) // 4)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces), "total_tokens": prompt_tokens + len(pieces)}
+        tool_calls = [
+            {"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function", "function": {"name": call.name, "arguments": call.arguments}}
+            for call in response.tool_calls
+        ]
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + token_delay * len(pieces))
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+
+        def chunk(delta: Dict[str, Any], finish: Optional[str] = None, chunk_usage: Optional[Dict[str, int]] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [] if chunk_usage else [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            if chunk_usage:
+                payload["usage"] = chunk_usage
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def stream() -> AsyncIterator[str]:
+            await asyncio.sleep(ttft)
+            yield chunk({"role": "assistant", "content": "" if content is not None else None})
+            if tool_calls:
+                for index, call in enumerate(tool_calls):
+                    # Name first, then the arguments as they are "generated"
+                    yield chunk({"tool_calls": [{
+                        "index": index, "id": call["id"], "type": "function",
+                        "function": {"name": call["function"]["name"], "arguments": ""},
+                    }]})
+                    yield chunk({"tool_calls": [{"index": index, "function": {"arguments": call["function"]["arguments"]}}]})
+                    await asyncio.sleep(token_delay)
+            else:
+                for piece in pieces:
+                    yield chunk({"content": piece})
+                    await asyncio.sleep(token_delay)
+            yield chunk({}, finish=finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk({}, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+class MockProviderServer:
+    """Serves a `MockProvider` from a background thread, e.g. for the duration of a test session."""
+
+    def __init__(self, provider: Optional[MockProvider] = None, host: str = "127.0.0.1", port: int = 0):
+        self.provider = provider or MockProvider()
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """OpenAI client base URL, i.e. the value for OPENAI_BASE_URL."""
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self, timeout: float = 10.0) -> "MockProviderServer":
+        import uvicorn
+
+        config = uvicorn.Config(self.provider.app, host=self.host, port=self.port, log_level="warning", lifespan="off")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="mock-provider", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("Mock provider failed to start")
+            time.sleep(0.01)
+        # The port the OS picked when asked for port 0
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(10)
+            self._server = None
+
+    def __enter__(self) -> "MockProviderServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8100, help="Port to listen on")
+    parser.add_argument("--ttft-ms", type=float, default=50.0, help="Delay before the first token")
+    parser.add_argument("--tokens", type=int, default=20, help="Tokens per reply")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Token rate of replies (0: no delay)")
+    parser.add_argument("--token-ms", type=float, default=None, help="Delay between tokens, instead of --tokens-per-second")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds of injected 429s")
+    parser.add_argument("--tool-call-rate", type=float, default=0.0, help="Share of requests with tools that call one")
+    parser.add_argument("--reply", default=None, help="Reply text (default: --tokens placeholder words)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the injected failures and tool calls")
+    args = parser.parse_args()
+
+    tokens_per_second = args.tokens_per_second
+    if args.token_ms is not None:
+        tokens_per_second = 1000 / args.token_ms if args.token_ms > 0 else 0.0
+    provider = MockProvider(MockConfig(
+        ttft_ms=args.ttft_ms,
+        tokens=args.tokens,
+        tokens_per_second=tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        tool_call_rate=args.tool_call_rate,
+        reply=args.reply,
+        seed=args.seed,
+    ))
+    uvicorn.run(provider.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
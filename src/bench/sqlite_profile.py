@@ -0,0 +1,115 @@
+"""
+SQLite Profile Benchmark
+
+Measures agent-memory turn throughput on SQLite with stock settings and
+with the tuning profile from `src.db.sqlite` (WAL, PRAGMAs, single writer
+queue). A turn is what one chat exchange does to the database: load
+recent history, then append the user message and the assistant reply.
+Many sessions run turns concurrently, the way parallel Gradio users do.
+
+Usage:
+    python -m src.bench.sqlite_profile --sessions 32 --turns 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.agent.memory.session import CustomMemorySession
+from src.db.database import Base
+from src.db.sqlite import SQLiteProfile, WriterRoutingSession, apply_sqlite_profile, create_writer_engine
+
+
+async def run_turns(session: CustomMemorySession, turns: int, latencies: List[float], errors: List[str]) -> None:
+    for i in range(turns):
+        start = time.perf_counter()
+        try:
+            await session.get_items()
+            await session.add_items([
+                {"role": "user", "content": f"question {i}"},
+                {"role": "assistant", "content": f"answer {i} " + "x" * 400},
+            ])
+        except Exception as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_variant(url: str, tuned: bool, sessions: int, turns: int) -> Dict[str, float]:
+    engine: AsyncEngine = create_async_engine(url)
+    writer = None
+    if tuned:
+        profile = SQLiteProfile()
+        apply_sqlite_profile(engine, profile)
+        writer = create_writer_engine(url, profile)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    read_factory = sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        sync_session_class=WriterRoutingSession,
+        info={"writer": writer.sync_engine if writer is not None else None},
+    )
+    write_factory = sessionmaker(bind=writer or engine, class_=AsyncSession, expire_on_commit=False)
+
+    memory_sessions = [
+        CustomMemorySession(
+            f"bench-{i}",
+            engine,
+            session_factory=write_factory if tuned else None,
+            read_session_factory=read_factory if tuned else None,
+        )
+        for i in range(sessions)
+    ]
+
+    latencies: List[float] = []
+    errors: List[str] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_turns(s, turns, latencies, errors) for s in memory_sessions))
+    elapsed = time.perf_counter() - start
+
+    await engine.dispose()
+    if writer is not None:
+        await writer.dispose()
+
+    latencies.sort()
+    return {
+        "turns_per_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0,
+        "errors": len(errors),
+    }
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    print(f"{'variant':<8} {'turns/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for name, tuned in (("stock", False), ("tuned", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+            result = await run_variant(url, tuned, args.sessions, args.turns)
+        print(
+            f"{name:<8} {result['turns_per_s']:>9,.0f} {result['p50_ms']:>8.1f} "
+            f"{result['p95_ms']:>8.1f} {result['errors']:>7}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=32, help="Concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=20, help="Turns per session")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Worker Scaling Benchmark
+
+Measures agent-run throughput of the multi-worker server as the number of
+workers grows. For each worker count the benchmark starts the mock provider
+(`src.bench.mock_provider`) and the application with `--workers N` against
+a fresh SQLite database, waits for `/health/ready`, and then keeps
+`--concurrency` clients busy for `--duration` seconds. Each client starts a
+run with `POST /api/v1/runs?stream=true` and reads its events until the
+run completes.
+
+Usage:
+    python -m src.bench.worker_scaling --workers 1 2 4 --concurrency 64 --duration 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+async def wait_ready(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as http:
+        while time.monotonic() < deadline:
+            try:
+                async with http.get(url) as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} not ready after {timeout:.0f}s")
+
+
+async def client_loop(http: aiohttp.ClientSession, base_url: str, deadline: float, latencies: List[float], errors: List[str]) -> None:
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        body = {"session_id": f"bench-{uuid.uuid4().hex}", "input": "hello"}
+        try:
+            async with http.post(f"{base_url}/api/v1/runs?stream=true", json=body) as response:
+                if response.status != 200:
+                    errors.append(str(response.status))
+                    continue
+                completed = False
+                async for line in response.content:
+                    if line.startswith(b"event: completed"):
+                        completed = True
+                    elif line.startswith(b"event: error"):
+                        break
+                if not completed:
+                    errors.append("run error")
+                    continue
+        except aiohttp.ClientError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def load(base_url: str, concurrency: int, duration: float) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors: List[str] = []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as http:
+        start = time.perf_counter()
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(client_loop(http, base_url, deadline, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "runs_per_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0,
+        "errors": len(errors),
+    }
+
+
+def start_process(args: List[str], env: Dict[str, str], cwd: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def run_workers(workers: int, args: argparse.Namespace) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(ROOT),
+            "PORT": str(args.port),
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-bench"),
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{args.provider_port}/v1",
+            "OPENAI_AGENTS_DISABLE_TRACING": "1",
+            "MOUNT_AGENT_UI": "false",
+            "MOUNT_CHAT_UI": "false",
+        }
+        provider = start_process(
+            ["-m", "src.bench.mock_provider", "--port", str(args.provider_port), "--ttft-ms", str(args.ttft_ms)],
+            env, tmp,
+        )
+        # Dev mode: a fresh SQLite database in the temporary directory, migrated by the server
+        server = start_process(["-m", "src.app.main", "--mode", "dev", "--workers", str(workers)], env, tmp)
+        try:
+            await wait_ready(f"http://127.0.0.1:{args.provider_port}/v1/models", 30)
+            base_url = f"http://127.0.0.1:{args.port}"
+            await wait_ready(f"{base_url}/health/ready", 60)
+            # Short warm-up so every worker has imported the Agents SDK before measuring
+            await load(base_url, args.concurrency, 2)
+            return await load(base_url, args.concurrency, args.duration)
+        finally:
+            stop_process(server)
+            stop_process(provider)
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    print(f"{'workers':<8} {'runs/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for workers in args.workers:
+        result = await run_workers(workers, args)
+        print(
+            f"{workers:<8} {result['runs_per_s']:>9,.1f} {result['p50_ms']:>8.1f} "
+            f"{result['p95_ms']:>8.1f} {result['errors']:>7}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per worker count")
+    parser.add_argument("--port", type=int, default=5055, help="Port of the application")
+    parser.add_argument("--provider-port", type=int, default=8100, help="Port of the mock provider")
+    parser.add_argument("--ttft-ms", type=float, default=50.0, help="Mock provider time to first token")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
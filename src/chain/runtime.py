@@ -1,13 +1,52 @@
 import os
-from typing import List, Dict, Any
+from contextlib import aclosing
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List
 from openai import AsyncOpenAI, DefaultAioHttpClient
+from src.app.core.clients import register_client
+from src.app.core.config import load_env
+from src.app.core.init_settings import global_settings
+from src.app.core.metrics import StreamTimer
+from src.app.core.usage import UsageEntry, usage_ledger
 from src.chain.prompt.example import SYSTEM_PROMPT
+from src.chain.singleflight import request_key, single_flight
 
-# Initialize OpenAI client with environment variable for API key
-client = AsyncOpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    http_client=DefaultAioHttpClient(),
-)
+@lru_cache(maxsize=None)
+def get_client() -> AsyncOpenAI:
+    # Initialize OpenAI client with environment variable for API key, on first use
+    load_env()
+    return register_client(AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=DefaultAioHttpClient(),
+    ))
+
+def record_usage(model: str, usage: Any) -> None:
+    """Add the usage of one chat completion to the usage ledger."""
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    usage_ledger.record(UsageEntry(
+        source="chain",
+        agent_key="chain",
+        model=model,
+        input_tokens=usage.prompt_tokens,
+        output_tokens=usage.completion_tokens,
+        cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+    ))
+
+async def timed_stream(stream: Any, timer: StreamTimer) -> AsyncIterator[Any]:
+    """Pass a chunk stream through, recording time to first token, tokens/sec and usage."""
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                timer.token()
+            # With include_usage, the last chunk has no choices and carries the usage
+            if chunk.usage is not None:
+                record_usage(timer.model, chunk.usage)
+            yield chunk
+    finally:
+        timer.finish()
+        await stream.close()
 
 async def call_llm_api(
     messages: List[Dict[str, Any]],
@@ -23,14 +62,42 @@ async def call_llm_api(
         stream (bool): Whether to stream the response.
 
     Returns:
-        Any: The API response object.
+        Any: The API response object. With CHAIN_SINGLE_FLIGHT, identical
+        concurrent calls share one upstream request; a streamed response is
+        then an async iterator of the shared chunks.
     """
     # Prepend the system prompt as a system message
     full_messages = [{"role": "system", "content": SYSTEM_PROMPT}] + messages
 
-    response = await client.chat.completions.create(
-        model=model,
-        messages=full_messages,
-        stream=stream,
-    )
-    return response
\ No newline at end of file
+    async def create():
+        if not stream:
+            response = await get_client().chat.completions.create(model=model, messages=full_messages)
+            record_usage(model, response.usage)
+            return response
+        timer = StreamTimer(model, "chain")
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=full_messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        return timed_stream(response, timer)
+
+    if not global_settings.CHAIN_SINGLE_FLIGHT:
+        return await create()
+
+    key = request_key(model, full_messages)
+    if stream:
+        return single_flight.stream(key, create)
+
+    async def create_one():
+        # A completed response is a single-chunk "stream"
+        response = await create()
+
+        async def one():
+            yield response
+        return one()
+
+    async with aclosing(single_flight.stream(f"{key}:complete", create_one)) as responses:
+        async for response in responses:
+            return response
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Single-Flight Streams
+
+Coalesces identical concurrent chain calls into one upstream stream.
+
+Chain calls are stateless: the same model and messages give an equivalent
+completion. While a call is in flight, an identical request subscribes to
+it instead of opening a second upstream stream. Chunks are kept for the
+life of the flight, so a subscriber that joins late first replays
+everything streamed so far and then follows live.
+
+Subscribers are reference-counted. The upstream call is cancelled (and its
+HTTP stream closed) only when the last subscriber goes away. Once the
+upstream stream ends, the flight is forgotten; this is not a response
+cache, and the next identical request starts a new call.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from src.app.core.metrics import cache_counters
+
+StreamFactory = Callable[[], Awaitable[AsyncIterator[Any]]]
+
+# Requests that joined an in-flight call (hit) or started a new one (miss)
+COALESCE_HITS, COALESCE_MISSES = cache_counters("chain_single_flight")
+
+
+def request_key(model: str, messages: List[Dict[str, Any]]) -> str:
+    """Hash identifying equivalent requests: same model and same messages."""
+    payload = json.dumps({"model": model, "messages": messages}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class _Flight:
+    """One upstream stream and the chunks it has produced so far."""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        # Wake every waiting subscriber; later waits use a fresh event
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """Shares in-flight upstream streams between identical requests."""
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def _pump(self, key: str, flight: _Flight, open_stream: StreamFactory) -> None:
+        stream = None
+        try:
+            stream = await open_stream()
+            async for chunk in stream:
+                flight.chunks.append(chunk)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+            # OpenAI streams have `close()`, async generators `aclose()`
+            close = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+            if close is not None:
+                await close()
+
+    async def stream(self, key: str, open_stream: StreamFactory) -> AsyncIterator[Any]:
+        """
+        Stream the chunks of the call identified by `key`, starting it if none is in flight.
+
+        Args:
+            key: Request identity, e.g. from `request_key`
+            open_stream: Opens the upstream stream when this request starts the flight
+
+        Yields:
+            Every chunk of the upstream stream, from the first one
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._pump(key, flight, open_stream))
+            self.started += 1
+            COALESCE_MISSES.inc()
+        else:
+            self.coalesced += 1
+            COALESCE_HITS.inc()
+
+        flight.subscribers += 1
+        try:
+            position = 0
+            while True:
+                # Replay what was missed, then wait for the next chunk
+                while position < len(flight.chunks):
+                    yield flight.chunks[position]
+                    position += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Last subscriber gone: nobody needs the upstream call anymore
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "subscribers": sum(flight.subscribers for flight in self._flights.values()),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+
+
+# Process-wide single-flight group for chain calls
+single_flight = SingleFlight()
@@ -1,3 +1,6 @@
-from .message import MessageService as MessageService
+from .message import (
+    MessageService as MessageService,
+    ThreadedSyncMessageService as ThreadedSyncMessageService,
+)
 
-__all__ = ["MessageService"]
\ No newline at end of file
+__all__ = ["MessageService", "ThreadedSyncMessageService"]
\ No newline at end of file
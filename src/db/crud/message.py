@@ -1,65 +1,197 @@
-from typing import List
+import base64
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
 from uuid import UUID
 from fastapi import Depends, HTTPException
+from sqlalchemy import Select, delete, insert, literal, select, tuple_, update
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from src.db.database import get_sync_db, get_async_db
+from src.db.ids import uuid7
 from src.db.models import Message
+from src.db.models.message import utc_now
+from src.db.routing import replica_router
 from src.db.schemas import (
     MessageBase,
     MessageCreate,
 )
 
+# Bulk inserts at least this large use COPY when the driver is asyncpg
+COPY_THRESHOLD = 500
+
+def _note_write(owner_id: Optional[str]) -> None:
+    # Unfiltered listings (key "") include every owner's messages, so they stay on the primary too
+    replica_router.note_write(owner_id or "")
+    if owner_id:
+        replica_router.note_write("")
+
+def encode_cursor(message: Message) -> str:
+    """Opaque page cursor holding the (created_at, id) key of the last message of a page."""
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    Key of a cursor made by `encode_cursor`.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _page_stmt(after: Optional[Tuple[datetime, UUID]], limit: int, owner_id: Optional[str], newest_first: bool) -> Select:
+    # Keyset pagination on (created_at, id): seek past the cursor's key instead of using OFFSET,
+    # served by the (created_at, id) / (owner_id, created_at, id) indexes. The key comes from the
+    # cursor itself, so paging goes on even if the cursor's message was deleted meanwhile.
+    stmt = select(Message)
+    if owner_id is not None:
+        stmt = stmt.where(Message.owner_id == owner_id)
+    if after is not None:
+        key = tuple_(Message.created_at, Message.id)
+        after_created_at, after_id = after
+        cursor_key = tuple_(literal(after_created_at, Message.created_at.type), literal(after_id, Message.id.type))
+        stmt = stmt.where(key < cursor_key if newest_first else key > cursor_key)
+    if newest_first:
+        stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc())
+    else:
+        stmt = stmt.order_by(Message.created_at, Message.id)
+    return stmt.limit(limit)
+
 class MessageService:
-    def __init__(self, db_sync: Session = Depends(get_sync_db), db_async: AsyncSession = Depends(get_async_db)):
-        self.db_sync = db_sync
-        self.db_async = db_async
-
-    def create_message(self, message_data: MessageCreate) -> Message:
-        db_message = Message(**message_data.model_dump())
-        self.db_sync.add(db_message)
-        self.db_sync.commit()
-        self.db_sync.refresh(db_message)
-        return db_message
-    
-    async def create_message_async(self, message_data: MessageCreate) -> Message:
-        db_message = Message(**message_data.model_dump())
-        self.db_async.add(db_message)
-        await self.db_async.commit()
-        await self.db_async.refresh(db_message)
+    def __init__(self, db: AsyncSession = Depends(get_async_db)):
+        self.db = db
+
+    async def create_message(self, message_data: MessageCreate) -> Message:
+        # INSERT ... RETURNING hands back the row in the same round trip (no refresh needed)
+        db_message = await self.db.scalar(
+            insert(Message).values(**message_data.model_dump()).returning(Message)
+        )
+        await self.db.commit()
+        _note_write(message_data.owner_id)
         return db_message
 
-    def get_messages(self, skip: int = 0, limit: int = 30) -> List[Message]:
-        return self.db_sync.query(Message).offset(skip).limit(limit).all()
+    async def create_messages_bulk(self, messages: Sequence[MessageCreate]) -> List[Message]:
+        if not messages:
+            return []
+
+        # Ids and timestamps are generated here so the COPY path gets them too
+        created_at = utc_now()
+        rows = [{"id": uuid7(), "created_at": created_at, **message.model_dump()} for message in messages]
+
+        if len(rows) >= COPY_THRESHOLD and self.db.bind.dialect.driver == "asyncpg":
+            conn = await self.db.connection()
+            raw_conn = await conn.get_raw_connection()
+            columns = list(rows[0].keys())
+            await raw_conn.driver_connection.copy_records_to_table(
+                Message.__tablename__,
+                records=[tuple(row[column] for column in columns) for row in rows],
+                columns=columns,
+            )
+            await self.db.commit()
+            self._note_bulk_writes(messages)
+            return [Message(**row) for row in rows]
+
+        # Multi-row INSERT ... RETURNING, batched by SQLAlchemy's insertmanyvalues
+        result = await self.db.scalars(insert(Message).returning(Message), rows)
+        db_messages = list(result.all())
+        await self.db.commit()
+        self._note_bulk_writes(messages)
+        return db_messages
+
+    @staticmethod
+    def _note_bulk_writes(messages: Sequence[MessageCreate]) -> None:
+        for owner_id in {message.owner_id for message in messages}:
+            _note_write(owner_id)
 
-    def get_message(self, message_id: UUID) -> Message:
-        db_message = self.db_sync.query(Message).filter(Message.id == message_id).first()
+    async def get_messages(
+        self,
+        after: Optional[str] = None,
+        limit: int = 30,
+        owner_id: Optional[str] = None,
+        newest_first: bool = False,
+    ) -> List[Message]:
+        stmt = _page_stmt(decode_cursor(after) if after else None, limit, owner_id, newest_first)
+        # Listings may be served by a read replica unless this owner wrote recently
+        reader = replica_router.reader(owner_id or "")
+        if reader is None:
+            result = await self.db.scalars(stmt)
+            return list(result.all())
+        async with reader() as replica_db:
+            result = await replica_db.scalars(stmt)
+            return list(result.all())
+
+    async def get_message(self, message_id: UUID) -> Message:
+        db_message = await self.db.get(Message, message_id)
+        if db_message is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+        return db_message
+
+    async def update_message(self, message_id: UUID, message_data: MessageBase) -> Message:
+        db_message = await self.db.scalar(
+            update(Message)
+            .where(Message.id == message_id)
+            .values(**message_data.model_dump(exclude_unset=True))
+            .returning(Message)
+        )
         if db_message is None:
             raise HTTPException(status_code=404, detail="Message not found")
+        await self.db.commit()
+        _note_write(db_message.owner_id)
         return db_message
 
-    def update_message(self, message_id: UUID, message_data: MessageBase) -> Message:
-        db_message = self.db_sync.query(Message).filter(Message.id == message_id).first()
+    async def delete_message(self, message_id: UUID) -> Message:
+        db_message = await self.db.scalar(
+            delete(Message).where(Message.id == message_id).returning(Message)
+        )
         if db_message is None:
             raise HTTPException(status_code=404, detail="Message not found")
-        for key, value in message_data.model_dump(exclude_unset=True).items():
-            setattr(db_message, key, value)
-        self.db_sync.commit()
-        self.db_sync.refresh(db_message)
+        await self.db.commit()
+        _note_write(db_message.owner_id)
         return db_message
 
-    def delete_message(self, message_id: UUID) -> Message:
-        db_message = self.db_sync.query(Message).filter(Message.id == message_id).first()
+class ThreadedSyncMessageService:
+    """
+    Explicit adapter for callers that must go through the sync engine.
+
+    Every call runs on a worker thread so the blocking Session never touches the event loop.
+    """
+
+    def __init__(self, db: Session = Depends(get_sync_db)):
+        self.db = db
+
+    async def create_message(self, message_data: MessageCreate) -> Message:
+        return await run_in_threadpool(self._create_message, message_data)
+
+    async def get_messages(
+        self,
+        after: Optional[str] = None,
+        limit: int = 30,
+        owner_id: Optional[str] = None,
+        newest_first: bool = False,
+    ) -> List[Message]:
+        stmt = _page_stmt(decode_cursor(after) if after else None, limit, owner_id, newest_first)
+        return await run_in_threadpool(lambda: list(self.db.scalars(stmt).all()))
+
+    async def get_message(self, message_id: UUID) -> Message:
+        db_message = await run_in_threadpool(self.db.get, Message, message_id)
         if db_message is None:
             raise HTTPException(status_code=404, detail="Message not found")
-        self.db_sync.delete(db_message)
-        self.db_sync.commit()
+        return db_message
+
+    def _create_message(self, message_data: MessageCreate) -> Message:
+        db_message = self.db.scalar(
+            insert(Message).values(**message_data.model_dump()).returning(Message)
+        )
+        self.db.commit()
         return db_message
 
 async def create_message_dict_async(db: AsyncSession, data: dict):
-    # If not, insert the new model asynchronously
-    db_data = Message(**data)
-    db.add(db_data)
-    await db.commit()  
-    await db.refresh(db_data)  
-    return db_data
\ No newline at end of file
+    db_data = await db.scalar(insert(Message).values(**data).returning(Message))
+    await db.commit()
+    return db_data
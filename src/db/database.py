@@ -1,24 +1,112 @@
+import asyncio
+from typing import Any, Dict, Optional
+from sqlalchemy import text
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from src.app.core.init_settings import global_settings as settings
+from src.db.pool import engine_options, instrument_engine, pool_stats, resolve_pool_profile
+from src.db.routing import replica_router
+from src.db.schema import ensure_schema_revision
+from src.db.sqlite import SQLiteProfile, WriterRoutingSession, apply_sqlite_profile, create_writer_engine, is_sqlite
 
 # Base class for the database models
 Base = declarative_base()
 
-# Synchronous engine and session
-sync_engine = create_engine(settings.DB_URL)
-SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+pool_profile = resolve_pool_profile(settings)
 
 # Asynchronous engine and session
-async_engine = create_async_engine(settings.ASYNC_DB_URL, echo=False, future=True)
-AsyncSessionLocal = sessionmaker(bind=async_engine, expire_on_commit=False, class_=AsyncSession)
+async_engine = create_async_engine(
+    settings.ASYNC_DB_URL, echo=False, future=True, **engine_options(settings.ASYNC_DB_URL, pool_profile, is_async=True)
+)
+instrument_engine(async_engine, "primary")
 
-def init_db():
-    Base.metadata.create_all(bind=sync_engine)
+# SQLite: tuned PRAGMAs on connect and a single-connection writer engine that queues writes
+sqlite_profile = SQLiteProfile.from_settings(settings) if settings.SQLITE_TUNING else None
+writer_engine = None
+if sqlite_profile is not None and is_sqlite(async_engine):
+    apply_sqlite_profile(async_engine, sqlite_profile)
+    if settings.SQLITE_SINGLE_WRITER:
+        writer_engine = create_writer_engine(settings.ASYNC_DB_URL, sqlite_profile)
+        instrument_engine(writer_engine, "writer")
+
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    sync_session_class=WriterRoutingSession,
+    info={"writer": writer_engine.sync_engine if writer_engine is not None else None},
+)
+# Sessions that mostly write (agent memory updates) run entirely on the writer,
+# so read-then-write sequences happen inside the write queue
+WriterSessionLocal = sessionmaker(bind=writer_engine or async_engine, expire_on_commit=False, class_=AsyncSession)
+
+# Synchronous engine and session, created on first use so processes that only
+# use the async engine don't hold a second pool against the same database
+_sync_engine: Optional[Engine] = None
+_sync_session_factory: Optional[sessionmaker] = None
+
+def get_sync_engine() -> Engine:
+    global _sync_engine
+    if _sync_engine is None:
+        _sync_engine = create_engine(settings.DB_URL, **engine_options(settings.DB_URL, pool_profile, is_async=False))
+        instrument_engine(_sync_engine, "sync")
+        if sqlite_profile is not None and is_sqlite(_sync_engine):
+            apply_sqlite_profile(_sync_engine, sqlite_profile)
+    return _sync_engine
+
+def get_sync_session_factory() -> sessionmaker:
+    global _sync_session_factory
+    if _sync_session_factory is None:
+        _sync_session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_sync_engine())
+    return _sync_session_factory
+
+def __getattr__(name: str):
+    # Keep `from src.db.database import sync_engine, SyncSessionLocal` working without eager creation
+    if name == "sync_engine":
+        return get_sync_engine()
+    if name == "SyncSessionLocal":
+        return get_sync_session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Pool statistics for the async engine and, where they exist, the sync engine, SQLite writer and replicas."""
+    stats = {"profile": settings.DB_POOL_PROFILE, "async": pool_stats(async_engine)}
+    if _sync_engine is not None:
+        stats["sync"] = pool_stats(_sync_engine)
+    if writer_engine is not None:
+        stats["writer"] = pool_stats(writer_engine)
+    if replica_router.enabled:
+        stats["replicas"] = replica_router.stats()
+    return stats
+
+async def init_db():
+    # Compare the stored Alembic revision with the migration head instead of
+    # introspecting every table; dev databases are upgraded in place
+    await ensure_schema_revision(async_engine, auto_upgrade=settings.DB_AUTO_MIGRATE)
+
+async def connect_pools():
+    """Open a first connection on the async and writer engines and check the replicas, concurrently."""
+    async def connect(engine):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    engines = [async_engine] + ([writer_engine] if writer_engine is not None else [])
+    # Replicas are optional: a failing one is only marked unhealthy
+    await asyncio.gather(*(connect(engine) for engine in engines), replica_router.check_lag())
+
+async def dispose_engines():
+    """Close every pooled connection; used at shutdown."""
+    await replica_router.dispose()
+    if writer_engine is not None:
+        await writer_engine.dispose()
+    await async_engine.dispose()
+    if _sync_engine is not None:
+        await asyncio.to_thread(_sync_engine.dispose)
 
 def get_sync_db():
-    db = SyncSessionLocal()
+    db = get_sync_session_factory()()
     try:
         yield db
     finally:
@@ -0,0 +1,60 @@
+"""
+Time-Ordered Identifiers
+
+UUIDv7 generation (RFC 9562) for primary keys.
+
+A UUIDv7 starts with a 48-bit Unix timestamp in milliseconds, so new keys
+always land at the right edge of the primary key B-tree instead of being
+scattered across it like random uuid4 keys. Ids generated in the same
+process are strictly increasing: within one millisecond the 12-bit
+`rand_a` field is used as a counter.
+"""
+
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a monotonic UUIDv7.
+
+    Returns:
+        A version 7 UUID whose ordering matches generation order within this process
+    """
+    global _last_ms, _counter
+
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _counter = int.from_bytes(os.urandom(2)) & 0x7FF  # leave headroom for increments
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # Counter exhausted for this millisecond: borrow the next one
+                _last_ms += 1
+                _counter = 0
+        ms, counter = _last_ms, _counter
+
+    rand_b = int.from_bytes(os.urandom(8)) & 0x3FFFFFFFFFFFFFFF
+    value = (ms & 0xFFFFFFFFFFFF) << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | rand_b
+    return uuid.UUID(int=value)
+
+
+def uuid7_timestamp_ms(value: uuid.UUID) -> int:
+    """
+    Extract the Unix timestamp (in milliseconds) embedded in a UUIDv7.
+
+    Args:
+        value: A version 7 UUID
+
+    Returns:
+        Milliseconds since the Unix epoch
+    """
+    return value.int >> 80
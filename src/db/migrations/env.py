@@ -2,6 +2,82 @@
 Alembic Migration Environment
 
 Configuration for Alembic database migrations.
+
+Migrations run on the application's async engine. When the application
+upgrades the schema itself (see `src.db.schema`), it passes its own
+connection through `config.attributes["connection"]` and no new engine is
+created.
 """
 
-# TODO: Implement Alembic migration environment setup
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.app.core.config import get_settings
+from src.db.database import Base
+import src.db.models  # noqa: F401 - register every model on Base.metadata
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+# Select the settings profile with `alembic -x mode=prod ...` (defaults to dev)
+settings = get_settings(context.get_x_argument(as_dictionary=True).get("mode", "dev"))
+
+
+def run_migrations_offline() -> None:
+    """Emit the migration SQL to stdout without connecting to the database."""
+    context.configure(
+        url=settings.DB_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite cannot ALTER most constraints in place; batch mode recreates the table
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    """Run migrations on a dedicated async engine."""
+    connectable = create_async_engine(settings.ASYNC_DB_URL, poolclass=pool.NullPool)
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
+def run_migrations_online() -> None:
+    """Run migrations against a live database connection."""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+    else:
+        asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,64 @@
+"""
+Online Migration Operations
+
+Helpers for schema changes that must not block production traffic.
+
+On Postgres, indexes are built with `CREATE INDEX CONCURRENTLY`, which
+cannot run inside a transaction, so the operation is wrapped in Alembic's
+autocommit block. Other dialects (SQLite in dev) fall back to a plain
+`CREATE INDEX`. Both variants are idempotent so an interrupted concurrent
+build can simply be re-run.
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+
+def is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def create_index_online(index_name: str, table_name: str, columns: Sequence[str], **kw) -> None:
+    """
+    Create an index without locking writes on Postgres.
+
+    Args:
+        index_name: Name of the index
+        table_name: Table to index
+        columns: Indexed columns, in order
+        **kw: Extra arguments for `op.create_index` (e.g. `unique`, `postgresql_include`)
+    """
+    if is_postgres():
+        is_valid = op.get_bind().execute(
+            sa.text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name"
+            ),
+            {"name": index_name},
+        ).scalar()
+        if is_valid:
+            return
+        with op.get_context().autocommit_block():
+            if is_valid is not None:
+                # A failed concurrent build leaves an INVALID index behind; drop it before retrying
+                op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True)
+            op.create_index(index_name, table_name, columns, postgresql_concurrently=True, **kw)
+    else:
+        op.create_index(index_name, table_name, columns, if_not_exists=True, **kw)
+
+
+def drop_index_online(index_name: str, table_name: str) -> None:
+    """
+    Drop an index without locking writes on Postgres.
+
+    Args:
+        index_name: Name of the index
+        table_name: Table the index belongs to
+    """
+    if is_postgres():
+        with op.get_context().autocommit_block():
+            op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True, if_exists=True)
+    else:
+        op.drop_index(index_name, table_name=table_name, if_exists=True)
@@ -0,0 +1,44 @@
+"""Initial schema: messages and run_events
+
+Databases created earlier by `Base.metadata.create_all` may already have
+some of these tables, so each one is only created when missing.
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2026-10-19 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = '0001_initial'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('messages'):
+        op.create_table(
+            'messages',
+            sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+            sa.Column('content', sa.String(), nullable=True),
+        )
+    if not inspector.has_table('run_events'):
+        op.create_table(
+            'run_events',
+            sa.Column('run_id', sa.String(), primary_key=True),
+            sa.Column('seq', sa.Integer(), primary_key=True),
+            sa.Column('type', sa.String(), nullable=False),
+            sa.Column('data', sa.Text(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('run_events')
+    op.drop_table('messages')
@@ -0,0 +1,56 @@
+"""Add created_at and owner_id to messages with recent-first indexes
+
+New rows get time-ordered UUIDv7 ids from the application. Existing rows
+keep their random uuid4 ids and get created_at backfilled to the migration
+time; keyset pagination orders by (created_at, id), so they still page
+correctly, ahead of everything created afterwards.
+
+Revision ID: 0002_message_time_ordering
+Revises: 0001_initial
+Create Date: 2026-10-19 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from src.db.migrations.online import create_index_online, drop_index_online
+
+
+revision: str = '0002_message_time_ordering'
+down_revision: Union[str, Sequence[str], None] = '0001_initial'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _id_column() -> sa.Column:
+    return sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True)
+
+
+def upgrade() -> None:
+    # Dev databases created by `create_all` may already have the new columns
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('messages')}
+
+    if 'created_at' not in columns:
+        op.add_column('messages', sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+        op.execute(sa.text("UPDATE messages SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"))
+
+        # On SQLite the batch copy would otherwise reflect the UUID column as NUMERIC
+        with op.batch_alter_table('messages', reflect_args=[_id_column()]) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+    if 'owner_id' not in columns:
+        op.add_column('messages', sa.Column('owner_id', sa.String(), nullable=True))
+
+    # Built online: messages is the largest table, and a plain CREATE INDEX would block writes to it
+    create_index_online('ix_messages_created_at_id', 'messages', ['created_at', 'id'])
+    create_index_online('ix_messages_owner_created_at_id', 'messages', ['owner_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    drop_index_online('ix_messages_owner_created_at_id', 'messages')
+    drop_index_online('ix_messages_created_at_id', 'messages')
+    with op.batch_alter_table('messages', reflect_args=[_id_column()]) as batch_op:
+        batch_op.drop_column('owner_id')
+        batch_op.drop_column('created_at')
@@ -0,0 +1,53 @@
+"""Agent SDK memory tables: agent_sessions and agent_messages
+
+These tables used to be created at runtime by the Agent SDK
+(`create_tables=True`). Deployments that already have them are left
+untouched.
+
+Revision ID: 0003_agent_memory_tables
+Revises: 0002_message_time_ordering
+Create Date: 2026-10-19 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0003_agent_memory_tables'
+down_revision: Union[str, Sequence[str], None] = '0002_message_time_ordering'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('agent_sessions'):
+        op.create_table(
+            'agent_sessions',
+            sa.Column('session_id', sa.String(), primary_key=True),
+            sa.Column('created_at', sa.TIMESTAMP(timezone=False), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+            sa.Column('updated_at', sa.TIMESTAMP(timezone=False), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        )
+    if not inspector.has_table('agent_messages'):
+        op.create_table(
+            'agent_messages',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column(
+                'session_id',
+                sa.String(),
+                sa.ForeignKey('agent_sessions.session_id', ondelete='CASCADE'),
+                nullable=False,
+            ),
+            sa.Column('message_data', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.TIMESTAMP(timezone=False), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+            sqlite_autoincrement=True,
+        )
+        op.create_index('idx_agent_messages_session_time', 'agent_messages', ['session_id', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_agent_messages_session_time', table_name='agent_messages')
+    op.drop_table('agent_messages')
+    op.drop_table('agent_sessions')
@@ -0,0 +1,23 @@
+"""Index agent_sessions.updated_at for retention scans (built online)
+
+Revision ID: 0004_agent_sessions_updated_idx
+Revises: 0003_agent_memory_tables
+Create Date: 2026-10-19 00:00:00
+"""
+from typing import Sequence, Union
+
+from src.db.migrations.online import create_index_online, drop_index_online
+
+
+revision: str = '0004_agent_sessions_updated_idx'
+down_revision: Union[str, Sequence[str], None] = '0003_agent_memory_tables'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_index_online('ix_agent_sessions_updated_at', 'agent_sessions', ['updated_at'])
+
+
+def downgrade() -> None:
+    drop_index_online('ix_agent_sessions_updated_at', 'agent_sessions')
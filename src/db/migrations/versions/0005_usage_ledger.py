@@ -0,0 +1,53 @@
+"""Usage ledger: usage_records and per-minute usage_minutes rollups
+
+Revision ID: 0005_usage_ledger
+Revises: 0004_agent_sessions_updated_idx
+Create Date: 2026-10-19 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0005_usage_ledger'
+down_revision: Union[str, Sequence[str], None] = '0004_agent_sessions_updated_idx'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'usage_records',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), primary_key=True, autoincrement=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('agent_key', sa.String(), nullable=False),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('session_id', sa.String(), nullable=True),
+        sa.Column('run_id', sa.String(), nullable=True),
+        sa.Column('input_tokens', sa.Integer(), nullable=False),
+        sa.Column('cached_tokens', sa.Integer(), nullable=False),
+        sa.Column('output_tokens', sa.Integer(), nullable=False),
+        sa.Column('cost_usd', sa.Float(), nullable=True),
+    )
+    op.create_index('ix_usage_records_created_at', 'usage_records', ['created_at'])
+    op.create_index('ix_usage_records_session_created_at', 'usage_records', ['session_id', 'created_at'])
+    op.create_table(
+        'usage_minutes',
+        sa.Column('minute', sa.DateTime(timezone=True), primary_key=True),
+        sa.Column('agent_key', sa.String(), primary_key=True),
+        sa.Column('model', sa.String(), primary_key=True),
+        sa.Column('calls', sa.Integer(), nullable=False),
+        sa.Column('input_tokens', sa.BigInteger(), nullable=False),
+        sa.Column('cached_tokens', sa.BigInteger(), nullable=False),
+        sa.Column('output_tokens', sa.BigInteger(), nullable=False),
+        sa.Column('cost_usd', sa.Float(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('usage_minutes')
+    op.drop_index('ix_usage_records_session_created_at', table_name='usage_records')
+    op.drop_index('ix_usage_records_created_at', table_name='usage_records')
+    op.drop_table('usage_records')
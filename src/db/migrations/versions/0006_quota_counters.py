@@ -0,0 +1,30 @@
+"""Run quotas: quota_counters shared by every worker
+
+Revision ID: 0006_quota_counters
+Revises: 0005_usage_ledger
+Create Date: 2026-10-19 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0006_quota_counters'
+down_revision: Union[str, Sequence[str], None] = '0005_usage_ledger'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'quota_counters',
+        sa.Column('key', sa.String(), primary_key=True),
+        sa.Column('window_index', sa.BigInteger(), primary_key=True),
+        sa.Column('requests', sa.Integer(), nullable=False),
+        sa.Column('tokens', sa.BigInteger(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('quota_counters')
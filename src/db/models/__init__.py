@@ -1,3 +1,7 @@
+from .agent_memory import AgentMessage as AgentMessage, AgentSession as AgentSession
 from .message import Message as Message
+from .quota import QuotaCounter as QuotaCounter
+from .run_event import RunEvent as RunEvent
+from .usage import UsageMinute as UsageMinute, UsageRecord as UsageRecord
 
-__all__ = ["Message"]
\ No newline at end of file
+__all__ = ["AgentMessage", "AgentSession", "Message", "QuotaCounter", "RunEvent", "UsageMinute", "UsageRecord"]
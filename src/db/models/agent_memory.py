@@ -0,0 +1,42 @@
+from sqlalchemy import TIMESTAMP, Column, ForeignKey, Index, Integer, String, Text, text
+from src.db.database import Base
+
+# Schema of the Agent SDK's SQLAlchemySession tables. Declared here so migrations
+# manage them alongside the application tables; CustomMemorySession queries these
+# Table objects directly.
+
+class AgentSession(Base):
+    __tablename__ = "agent_sessions"
+
+    session_id = Column(String, primary_key=True)
+    created_at = Column(TIMESTAMP(timezone=False), server_default=text("CURRENT_TIMESTAMP"), nullable=False)
+    updated_at = Column(
+        TIMESTAMP(timezone=False),
+        server_default=text("CURRENT_TIMESTAMP"),
+        onupdate=text("CURRENT_TIMESTAMP"),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        # Finds idle sessions for retention jobs without scanning the table
+        Index("ix_agent_sessions_updated_at", "updated_at"),
+    )
+
+    def __repr__(self):
+        return f"<AgentSession(session_id={self.session_id})>"
+
+class AgentMessage(Base):
+    __tablename__ = "agent_messages"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, ForeignKey("agent_sessions.session_id", ondelete="CASCADE"), nullable=False)
+    message_data = Column(Text, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=False), server_default=text("CURRENT_TIMESTAMP"), nullable=False)
+
+    __table_args__ = (
+        Index("idx_agent_messages_session_time", "session_id", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+    def __repr__(self):
+        return f"<AgentMessage(id={self.id}, session_id={self.session_id})>"
\ No newline at end of file
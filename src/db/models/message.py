@@ -1,13 +1,27 @@
-import uuid
-from sqlalchemy import Column, String
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Index, String
 from sqlalchemy.dialects.postgresql import UUID
 from src.db.database import Base
+from src.db.ids import uuid7
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
 
 class Message(Base):
     __tablename__ = "messages"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Time-ordered ids keep inserts at the right edge of the primary key index
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     content = Column(String)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
+    owner_id = Column(String, nullable=True)
+
+    __table_args__ = (
+        # Global recent-first reads and time range scans
+        Index("ix_messages_created_at_id", "created_at", "id"),
+        # Per-owner recent-first reads; covers keyset pagination without touching the heap
+        Index("ix_messages_owner_created_at_id", "owner_id", "created_at", "id"),
+    )
 
     def __repr__(self):
         return f"<Message(id={self.id}, content={self.content})>"
\ No newline at end of file
@@ -0,0 +1,17 @@
+from sqlalchemy import BigInteger, Column, Integer, String
+from src.db.database import Base
+
+class QuotaCounter(Base):
+    """Requests and tokens of one quota key in one fixed window (see src/agent/quotas.py)."""
+
+    __tablename__ = "quota_counters"
+
+    # "client:<identity>" or "session:<session id>"
+    key = Column(String, primary_key=True)
+    # Window index: epoch seconds // QUOTA_WINDOW_SECONDS
+    window_index = Column(BigInteger, primary_key=True)
+    requests = Column(Integer, nullable=False)
+    tokens = Column(BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<QuotaCounter(key={self.key}, window_index={self.window_index}, requests={self.requests})>"
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, Text
+from src.db.database import Base
+
+class RunEvent(Base):
+    """
+    An agent run event evicted from its in-memory ring buffer (see src/agent/runs.py).
+
+    Retention: rows live as long as their run is kept for reconnects. They are
+    deleted by run id (the primary key's prefix, so no extra index is needed)
+    once the run expires after RUN_STREAM_TTL_SECONDS, or when the server
+    process that ran it shuts down.
+    """
+
+    __tablename__ = "run_events"
+
+    run_id = Column(String, primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    type = Column(String, nullable=False)
+    data = Column(Text, nullable=False)
+
+    def __repr__(self):
+        return f"<RunEvent(run_id={self.run_id}, seq={self.seq}, type={self.type})>"
@@ -0,0 +1,47 @@
+from sqlalchemy import BigInteger, Column, DateTime, Float, Index, Integer, String
+from src.db.database import Base
+
+class UsageRecord(Base):
+    """Token usage and cost of one model call (see src/app/core/usage.py)."""
+
+    __tablename__ = "usage_records"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    # "agent" or "chain"
+    source = Column(String, nullable=False)
+    agent_key = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    session_id = Column(String, nullable=True)
+    run_id = Column(String, nullable=True)
+    input_tokens = Column(Integer, nullable=False)
+    cached_tokens = Column(Integer, nullable=False)
+    output_tokens = Column(Integer, nullable=False)
+    # NULL when the model has no configured price
+    cost_usd = Column(Float, nullable=True)
+
+    __table_args__ = (
+        # Time range scans and per-session top consumers
+        Index("ix_usage_records_created_at", "created_at"),
+        Index("ix_usage_records_session_created_at", "session_id", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<UsageRecord(id={self.id}, model={self.model}, agent_key={self.agent_key})>"
+
+class UsageMinute(Base):
+    """Usage summed per minute, agent key and model; updated with every ledger flush."""
+
+    __tablename__ = "usage_minutes"
+
+    minute = Column(DateTime(timezone=True), primary_key=True)
+    agent_key = Column(String, primary_key=True)
+    model = Column(String, primary_key=True)
+    calls = Column(Integer, nullable=False)
+    input_tokens = Column(BigInteger, nullable=False)
+    cached_tokens = Column(BigInteger, nullable=False)
+    output_tokens = Column(BigInteger, nullable=False)
+    cost_usd = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return f"<UsageMinute(minute={self.minute}, agent_key={self.agent_key}, model={self.model})>"
@@ -0,0 +1,355 @@
+"""
+Agent Memory Partitioning
+
+Monthly range partitioning of the `agent_messages` table on PostgreSQL.
+
+Partitioning is a separate step from the schema migrations, so it can be
+turned on (or off) at any time without touching later revisions:
+`python -m src.db.partitions enable` turns `agent_messages` into a table
+partitioned by `created_at`, and the rows that already exist become the
+`agent_messages_legacy` partition. With `AGENT_MEMORY_PARTITIONING` enabled,
+the app then keeps monthly partitions created ahead of time, and removes
+expired months by detaching and dropping whole partitions instead of
+deleting rows.
+
+There is no DEFAULT partition: with one, Postgres refuses to detach
+partitions concurrently, and a month's rows landing in it would block
+creating that month's partition. Partitions are created
+AGENT_MEMORY_PARTITIONS_AHEAD months ahead instead, so inserts only fail if
+maintenance has not run for that long.
+
+A primary key on a partitioned table must include the partition key, which
+would mean rebuilding the existing table's key on `id` when it is attached.
+The parent therefore has no primary key; every partition has its own on
+`id` (ids come from one shared sequence).
+
+On any other dialect (SQLite in dev and tests) every function is a no-op
+and the table stays a single plain table.
+
+Usage:
+    python -m src.db.partitions status
+    python -m src.db.partitions maintain
+    python -m src.db.partitions enable
+    python -m src.db.partitions disable
+"""
+
+import argparse
+import asyncio
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.app.core.logging import logger
+
+PARENT_TABLE = "agent_messages"
+LEGACY_PARTITION = f"{PARENT_TABLE}_legacy"
+
+_BOUND_RE = re.compile(r"FROM \((?P<lower>[^)]*)\) TO \((?P<upper>[^)]*)\)")
+
+
+@dataclass
+class Partition:
+    name: str
+    # None for MINVALUE (the legacy partition)
+    lower: Optional[datetime]
+    upper: datetime
+
+
+def partition_name(month_start: datetime) -> str:
+    return f"{PARENT_TABLE}_p{month_start:%Y%m}"
+
+
+def add_months(month_start: datetime, months: int) -> datetime:
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return month_start.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def _parse_bound(value: str) -> Optional[datetime]:
+    value = value.strip().strip("'")
+    if value.upper() in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value)
+
+
+# ---------------------------------------------------------------------------
+# Sync operations (used from migrations and via run_sync)
+# ---------------------------------------------------------------------------
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"),
+        {"table": PARENT_TABLE},
+    ).scalar())
+
+
+def list_partitions(conn: Connection) -> List[Partition]:
+    """List the partitions of `agent_messages` ordered by lower bound."""
+    if not is_partitioned(conn):
+        return []
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {"table": PARENT_TABLE}).all()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound)
+        partitions.append(Partition(name, _parse_bound(match["lower"]), _parse_bound(match["upper"])))
+    return sorted(partitions, key=lambda p: p.lower or datetime.min)
+
+
+def current_month_start(conn: Connection) -> datetime:
+    # created_at defaults to the server's CURRENT_TIMESTAMP, so month boundaries use server time
+    return conn.execute(text("SELECT date_trunc('month', LOCALTIMESTAMP)")).scalar()
+
+
+def ensure_partitions(conn: Connection, months_ahead: int) -> List[str]:
+    """
+    Create monthly partitions up to `months_ahead` months ahead of the current one.
+
+    Months already covered by an existing partition (e.g. the legacy one) are
+    skipped, and months between the last covered one and the current month
+    are filled in.
+
+    Returns:
+        Names of the partitions that were created
+    """
+    partitions = list_partitions(conn)
+    if not partitions and not is_partitioned(conn):
+        return []
+
+    covered_until = max((p.upper for p in partitions), default=None)
+    month = covered_until or current_month_start(conn)
+
+    created = []
+    last = add_months(current_month_start(conn), months_ahead)
+    while month <= last:
+        name = partition_name(month)
+        conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+        ))
+        # Empty, so the key is built instantly
+        conn.execute(text(f"ALTER TABLE {name} ADD PRIMARY KEY (id)"))
+        created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def expired_partitions(conn: Connection, retention_months: int) -> List[Partition]:
+    """Partitions whose whole range is older than the retention window."""
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(current_month_start(conn), -retention_months)
+    return [p for p in list_partitions(conn) if p.upper <= cutoff]
+
+
+def drop_partition(conn: Connection, partition: Partition, detach_only: bool = False) -> None:
+    """
+    Remove a partition from `agent_messages`.
+
+    Must run on an AUTOCOMMIT connection: DETACH ... CONCURRENTLY cannot run
+    inside a transaction block, and avoids blocking inserts into the parent.
+
+    Args:
+        conn: AUTOCOMMIT connection
+        partition: Partition to remove
+        detach_only: Keep the detached table (e.g. for archiving) instead of dropping it
+    """
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {partition.name} CONCURRENTLY"))
+    if not detach_only:
+        conn.execute(text(f"DROP TABLE {partition.name}"))
+
+
+def convert_to_partitioned(conn: Connection, months_ahead: int) -> None:
+    """
+    Convert a plain `agent_messages` table into a monthly range-partitioned one.
+
+    Existing rows are not copied: the old table, with its primary key and
+    indexes, is attached as the partition for everything before next month.
+    A NOT VALID check constraint is validated first, so the attach itself
+    does not have to scan the table.
+    """
+    boundary = add_months(current_month_start(conn), 1)
+    bound = f"{boundary:%Y-%m-%d}"
+
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {LEGACY_PARTITION}"))
+    conn.execute(text(f"ALTER INDEX idx_{PARENT_TABLE}_session_time RENAME TO idx_{LEGACY_PARTITION}_session_time"))
+    conn.execute(text(f"ALTER TABLE {LEGACY_PARTITION} RENAME CONSTRAINT {PARENT_TABLE}_pkey TO {LEGACY_PARTITION}_pkey"))
+
+    conn.execute(text(f"""
+        CREATE TABLE {PARENT_TABLE} (
+            id INTEGER NOT NULL DEFAULT nextval('{PARENT_TABLE}_id_seq'),
+            session_id VARCHAR NOT NULL REFERENCES agent_sessions (session_id) ON DELETE CASCADE,
+            message_data TEXT NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) PARTITION BY RANGE (created_at)
+    """))
+    conn.execute(text(f"CREATE INDEX idx_{PARENT_TABLE}_session_time ON {PARENT_TABLE} (session_id, created_at)"))
+    # Keep the id sequence alive when the legacy partition is eventually dropped
+    conn.execute(text(f"ALTER SEQUENCE {PARENT_TABLE}_id_seq OWNED BY {PARENT_TABLE}.id"))
+
+    conn.execute(text(
+        f"ALTER TABLE {LEGACY_PARTITION} ADD CONSTRAINT {LEGACY_PARTITION}_bound "
+        f"CHECK (created_at < '{bound}') NOT VALID"
+    ))
+    conn.execute(text(f"ALTER TABLE {LEGACY_PARTITION} VALIDATE CONSTRAINT {LEGACY_PARTITION}_bound"))
+    conn.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {LEGACY_PARTITION} "
+        f"FOR VALUES FROM (MINVALUE) TO ('{bound}')"
+    ))
+
+    ensure_partitions(conn, months_ahead)
+
+
+def convert_to_plain(conn: Connection) -> None:
+    """Undo `convert_to_partitioned` by copying every partition back into a plain table."""
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {PARENT_TABLE}_partitioned"))
+    conn.execute(text(f"ALTER INDEX idx_{PARENT_TABLE}_session_time RENAME TO idx_{PARENT_TABLE}_partitioned_session_time"))
+    conn.execute(text(f"""
+        CREATE TABLE {PARENT_TABLE} (
+            id INTEGER NOT NULL DEFAULT nextval('{PARENT_TABLE}_id_seq') PRIMARY KEY,
+            session_id VARCHAR NOT NULL REFERENCES agent_sessions (session_id) ON DELETE CASCADE,
+            message_data TEXT NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    conn.execute(text(
+        f"INSERT INTO {PARENT_TABLE} (id, session_id, message_data, created_at) "
+        f"SELECT id, session_id, message_data, created_at FROM {PARENT_TABLE}_partitioned"
+    ))
+    conn.execute(text(f"ALTER SEQUENCE {PARENT_TABLE}_id_seq OWNED BY {PARENT_TABLE}.id"))
+    conn.execute(text(f"DROP TABLE {PARENT_TABLE}_partitioned"))
+    conn.execute(text(f"CREATE INDEX idx_{PARENT_TABLE}_session_time ON {PARENT_TABLE} (session_id, created_at)"))
+
+
+# ---------------------------------------------------------------------------
+# Async maintenance
+# ---------------------------------------------------------------------------
+
+async def maintain_partitions(
+    engine: AsyncEngine,
+    months_ahead: int,
+    retention_months: int = 0,
+    detach_only: bool = False,
+) -> None:
+    """
+    Create upcoming monthly partitions and remove expired ones.
+
+    Args:
+        engine: Engine of the database holding `agent_messages`
+        months_ahead: How many months of partitions to keep ready beyond the current one
+        retention_months: Drop partitions entirely older than this many months (0 keeps everything)
+        detach_only: Detach expired partitions but keep their tables
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    async with engine.connect() as conn:
+        if not await conn.run_sync(is_partitioned):
+            logger.warning(
+                "AGENT_MEMORY_PARTITIONING is enabled but agent_messages is not partitioned; "
+                "run `python -m src.db.partitions enable` to partition it"
+            )
+            return
+
+        created = await conn.run_sync(ensure_partitions, months_ahead)
+        await conn.commit()
+        expired = await conn.run_sync(expired_partitions, retention_months)
+
+    if created:
+        logger.info(f"Ensured agent_messages partitions: {', '.join(created)}")
+
+    if not expired:
+        return
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for partition in expired:
+            await conn.run_sync(drop_partition, partition, detach_only)
+            logger.info(f"{'Detached' if detach_only else 'Dropped'} expired partition {partition.name}")
+
+
+class PartitionMaintainer:
+    """Runs `maintain_partitions` at startup and then periodically in the background."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        months_ahead: int,
+        retention_months: int = 0,
+        detach_only: bool = False,
+        interval_seconds: float = 6 * 3600,
+    ):
+        self.engine = engine
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.detach_only = detach_only
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await maintain_partitions(self.engine, self.months_ahead, self.retention_months, self.detach_only)
+            except Exception as e:
+                logger.error(f"Partition maintenance failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+def main() -> None:
+    from src.app.core.init_settings import global_settings as settings
+    from src.db.database import async_engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["status", "maintain", "enable", "disable"])
+    args, _ = parser.parse_known_args()
+    if args.command in ("enable", "disable") and async_engine.dialect.name != "postgresql":
+        parser.exit(1, "Partitioning is only supported on PostgreSQL\n")
+
+    async def run() -> None:
+        if args.command == "enable":
+            async with async_engine.begin() as conn:
+                if not await conn.run_sync(is_partitioned):
+                    await conn.run_sync(convert_to_partitioned, settings.AGENT_MEMORY_PARTITIONS_AHEAD)
+        elif args.command == "disable":
+            async with async_engine.begin() as conn:
+                if await conn.run_sync(is_partitioned):
+                    await conn.run_sync(convert_to_plain)
+        elif args.command == "maintain":
+            await maintain_partitions(
+                async_engine,
+                settings.AGENT_MEMORY_PARTITIONS_AHEAD,
+                settings.AGENT_MEMORY_RETENTION_MONTHS,
+                settings.AGENT_MEMORY_DETACH_ONLY,
+            )
+        async with async_engine.connect() as conn:
+            for partition in await conn.run_sync(list_partitions):
+                print(f"{partition.name:<32} {partition.lower or 'MINVALUE'!s:<20} {partition.upper or '-'!s}")
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
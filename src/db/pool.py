@@ -0,0 +1,241 @@
+"""
+Connection Pool Profiles
+
+Settings-driven pool configuration and pool telemetry for the database engines.
+
+A profile bundles pool size, overflow, checkout timeout, recycle age,
+pre-ping and the asyncpg prepared statement cache size. `DB_POOL_PROFILE`
+selects a named profile, and any `DB_POOL_*` / `DB_STATEMENT_CACHE_SIZE`
+setting overrides a single field of it. `DB_MAX_CONNECTIONS` caps the
+connections of the whole instance; each worker process gets its share.
+
+Engines are created with instrumented queue pools that record how many
+callers are waiting for a connection and how long acquiring one takes
+(also exported as Prometheus metrics, see `instrument_engine`);
+`pool_stats()` returns these numbers together with the pool's own
+checked-out / overflow counters.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from src.app.core.metrics import DB_POOL_CHECKED_OUT, DB_POOL_CHECKOUT_SECONDS, DB_POOL_WAITING
+from src.app.core.tracing import trace_engine
+from src.app.core.workers import per_worker
+
+
+@dataclass(frozen=True)
+class PoolProfile:
+    pool_size: int
+    max_overflow: int
+    pool_timeout: float
+    pool_recycle: int
+    pool_pre_ping: bool
+    # asyncpg prepared statement cache; 0 is required behind pgbouncer in transaction mode
+    statement_cache_size: int = 100
+
+
+POOL_PROFILES: Dict[str, PoolProfile] = {
+    # Local development and tests: a couple of connections, fail fast
+    "small": PoolProfile(pool_size=2, max_overflow=3, pool_timeout=10, pool_recycle=-1, pool_pre_ping=False),
+    # API workers serving concurrent requests
+    "web": PoolProfile(pool_size=10, max_overflow=10, pool_timeout=10, pool_recycle=1800, pool_pre_ping=True),
+    # Background / batch processes with few, long-lived queries
+    "worker": PoolProfile(pool_size=4, max_overflow=2, pool_timeout=30, pool_recycle=1800, pool_pre_ping=True),
+    # Behind pgbouncer in transaction mode: small pools, no server-side prepared statements
+    "pgbouncer": PoolProfile(
+        pool_size=5, max_overflow=5, pool_timeout=10, pool_recycle=600, pool_pre_ping=True, statement_cache_size=0
+    ),
+}
+
+
+def resolve_pool_profile(settings) -> PoolProfile:
+    """
+    Build the pool profile for the given settings.
+
+    Args:
+        settings: Application settings
+
+    Returns:
+        The named profile with any explicit overrides applied, capped to this
+        worker's share of DB_MAX_CONNECTIONS
+
+    Raises:
+        ValueError: If DB_POOL_PROFILE is not a known profile
+    """
+    try:
+        profile = POOL_PROFILES[settings.DB_POOL_PROFILE]
+    except KeyError:
+        raise ValueError(
+            f"Unknown DB_POOL_PROFILE '{settings.DB_POOL_PROFILE}', expected one of {sorted(POOL_PROFILES)}"
+        ) from None
+
+    overrides = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+    profile = replace(profile, **{key: value for key, value in overrides.items() if value is not None})
+
+    if settings.DB_MAX_CONNECTIONS:
+        # Instance-wide connection budget, split across the server's worker processes
+        budget = per_worker(settings.DB_MAX_CONNECTIONS)
+        pool_size = min(profile.pool_size, budget)
+        profile = replace(profile, pool_size=pool_size, max_overflow=min(profile.max_overflow, budget - pool_size))
+    return profile
+
+
+@dataclass
+class PoolStats:
+    waiting: int = 0
+    acquired: int = 0
+    timeouts: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, seconds: float, timed_out: bool) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.acquired += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+class _InstrumentedPoolMixin:
+    """
+    Times every checkout, including the wait for a free connection and the
+    pre-ping, and counts the callers blocked waiting for a connection.
+    """
+
+    # Label of the pool's metrics; set by `instrument_engine`
+    metrics_name = "default"
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        stats = self.stats
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.record(elapsed, timed_out)
+            DB_POOL_CHECKOUT_SECONDS.labels(self.metrics_name).observe(elapsed)
+
+    def _do_get(self):
+        # QueuePool only blocks when no connection is idle and no overflow connection may be opened
+        if self.checkedin() > 0 or self._max_overflow < 0 or self._overflow < self._max_overflow:
+            return super()._do_get()
+        stats = self.stats
+        with stats._lock:
+            stats.waiting += 1
+        waiting = DB_POOL_WAITING.labels(self.metrics_name)
+        waiting.inc()
+        try:
+            return super()._do_get()
+        finally:
+            with stats._lock:
+                stats.waiting -= 1
+            waiting.dec()
+
+
+# SQLAlchemy names pool loggers after the pool class' module; keep these at
+# SQLAlchemy's default WARN level like the stock pools under "sqlalchemy.pool"
+logging.getLogger(__name__).setLevel(logging.WARNING)
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine: Engine | AsyncEngine, name: str) -> None:
+    """
+    Label an engine's pool metrics, track its checked-out connections and trace its statements.
+
+    Args:
+        engine: Engine whose pool to instrument
+        name: Value of the `pool` metric label, e.g. "primary" or "writer"
+    """
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    if isinstance(sync_engine.pool, _InstrumentedPoolMixin):
+        sync_engine.pool.metrics_name = name
+    checked_out = DB_POOL_CHECKED_OUT.labels(name)
+    event.listen(sync_engine, "checkout", lambda *_: checked_out.inc())
+    event.listen(sync_engine, "checkin", lambda *_: checked_out.dec())
+    trace_engine(sync_engine)
+
+
+def engine_options(url: str, profile: PoolProfile, is_async: bool) -> Dict[str, Any]:
+    """
+    Keyword arguments for `create_engine` / `create_async_engine` under a profile.
+
+    Args:
+        url: Database URL the engine connects to
+        profile: Pool profile to apply
+        is_async: Whether the options are for the async engine
+    """
+    options: Dict[str, Any] = {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": profile.pool_size,
+        "max_overflow": profile.max_overflow,
+        "pool_timeout": profile.pool_timeout,
+        "pool_recycle": profile.pool_recycle,
+        "pool_pre_ping": profile.pool_pre_ping,
+    }
+    if make_url(url).get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": profile.statement_cache_size}
+    return options
+
+
+def pool_stats(engine: Engine | AsyncEngine) -> Dict[str, Any]:
+    """
+    Snapshot of an engine's pool.
+
+    Returns:
+        Pool size and counters; waiter and wait-time fields are only present
+        for instrumented pools
+    """
+    pool = engine.pool
+    result: Dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        result.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    stats: Optional[PoolStats] = getattr(pool, "stats", None)
+    if stats is not None:
+        acquisitions = stats.acquired + stats.timeouts
+        result.update(
+            waiting=stats.waiting,
+            acquired=stats.acquired,
+            timeouts=stats.timeouts,
+            wait_ms_avg=stats.wait_seconds_total / acquisitions * 1000 if acquisitions else 0.0,
+            wait_ms_max=stats.wait_seconds_max * 1000,
+        )
+    return result
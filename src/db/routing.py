@@ -0,0 +1,283 @@
+"""
+Read Replica Routing
+
+Sends read-only history and listing queries to read replicas.
+
+Replicas are configured with `DB_REPLICA_URLS` (production only). A read
+is routed to a replica unless:
+- the key it reads (an agent session id or a message owner) was written by
+  this process within `DB_READ_YOUR_WRITES_SECONDS`, so the caller sees its
+  own writes, or
+- every replica lags the primary by more than `DB_REPLICA_MAX_LAG_SECONDS`
+  or failed its last health check.
+
+In those cases `reader()` returns None and the caller uses the primary.
+Replicas are picked round-robin or by fewest checked-out connections
+(`DB_REPLICA_STRATEGY`).
+
+Recent writes are remembered per process, which is not enough with several
+server workers: the client's next request may land on a worker that never
+saw its write. `ReadYourWritesMiddleware` therefore hands every client that
+wrote the time of its write, as the `db_last_write` cookie and the
+`X-DB-Last-Write` response header; requests sending either one back are read
+from the primary for DB_READ_YOUR_WRITES_SECONDS after it, whichever worker
+serves them (API clients send the header, browsers the cookie). Only writes
+made before the response starts can be handed over this way: the memory
+writes of an agent run streamed on the same request are remembered by the
+worker that ran it only, so a follow-up turn within that window that lands
+on another worker can read the session from a replica that has not caught up
+yet (at most DB_REPLICA_MAX_LAG_SECONDS behind).
+"""
+
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from http.cookies import CookieError, SimpleCookie
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from src.app.core.init_settings import global_settings as settings
+from src.app.core.logging import logger
+from src.db.pool import engine_options, instrument_engine, pool_stats, resolve_pool_profile
+
+# Seconds of replay lag on a Postgres standby; 0 when it has replayed everything it received
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# Wall-clock time of a client's last write, carried between its requests
+LAST_WRITE_COOKIE = "db_last_write"
+LAST_WRITE_HEADER = "x-db-last-write"
+
+# Per request under ReadYourWritesMiddleware: {"last_write": wall-clock time or None, "wrote": bool}
+_request_writes: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_writes", default=None)
+
+
+@dataclass
+class Replica:
+    url: str
+    engine: AsyncEngine
+    session_factory: async_sessionmaker
+    lag_seconds: float = 0.0
+    healthy: bool = True
+
+    @property
+    def checked_out(self) -> int:
+        return self.engine.pool.checkedout()
+
+
+class ReplicaRouter:
+    """Chooses between the primary and read replicas for read-only queries."""
+
+    def __init__(
+        self,
+        replica_urls: List[str],
+        strategy: str = "round_robin",
+        read_your_writes_seconds: float = 5.0,
+        max_lag_seconds: float = 5.0,
+        lag_check_interval: float = 5.0,
+        engine_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica strategy '{strategy}'")
+
+        self.strategy = strategy
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_check_interval = lag_check_interval
+
+        self.replicas: List[Replica] = []
+        for index, url in enumerate(replica_urls):
+            engine = create_async_engine(url, **(engine_kwargs or {}))
+            instrument_engine(engine, f"replica{index}")
+            self.replicas.append(
+                Replica(url, engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+            )
+
+        self._round_robin = itertools.count()
+        # key -> monotonic time of its last write, oldest first
+        self._recent_writes: "OrderedDict[str, float]" = OrderedDict()
+        self._last_lag_check = 0.0
+        self._lag_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls, settings) -> "ReplicaRouter":
+        urls = settings.ASYNC_REPLICA_URLS
+        kwargs = engine_options(urls[0], resolve_pool_profile(settings), is_async=True) if urls else None
+        return cls(
+            urls,
+            strategy=settings.DB_REPLICA_STRATEGY,
+            read_your_writes_seconds=settings.DB_READ_YOUR_WRITES_SECONDS,
+            max_lag_seconds=settings.DB_REPLICA_MAX_LAG_SECONDS,
+            lag_check_interval=settings.DB_REPLICA_LAG_CHECK_INTERVAL,
+            engine_kwargs=kwargs,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def note_write(self, key: str) -> None:
+        """Record a write to `key` so reads of it (and the writing client's reads) stay on the primary for a while."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        self._recent_writes[key] = now
+        self._recent_writes.move_to_end(key)
+        # Oldest first, so expired entries are swept from the front as they expire
+        cutoff = now - self.read_your_writes_seconds
+        while self._recent_writes:
+            oldest_key, written_at = next(iter(self._recent_writes.items()))
+            if written_at >= cutoff:
+                break
+            del self._recent_writes[oldest_key]
+
+        request = _request_writes.get()
+        if request is not None:
+            request["last_write"] = time.time()
+            request["wrote"] = True
+
+    def _wrote_recently(self, key: Optional[str]) -> bool:
+        request = _request_writes.get()
+        if request is not None and request["last_write"] is not None:
+            if time.time() - request["last_write"] < self.read_your_writes_seconds:
+                return True
+        if key is None:
+            return False
+        written_at = self._recent_writes.get(key)
+        return written_at is not None and time.monotonic() - written_at < self.read_your_writes_seconds
+
+    def _choose(self) -> Optional[Replica]:
+        candidates = [r for r in self.replicas if r.healthy and r.lag_seconds <= self.max_lag_seconds]
+        if not candidates:
+            return None
+        if self.strategy == "least_connections":
+            return min(candidates, key=lambda r: r.checked_out)
+        return candidates[next(self._round_robin) % len(candidates)]
+
+    def reader(self, key: Optional[str] = None) -> Optional[async_sessionmaker]:
+        """
+        Session factory for a read-only query.
+
+        Args:
+            key: What the query reads (session id, owner id); used for read-your-writes
+
+        Returns:
+            A replica's session factory, or None to read from the primary
+        """
+        if not self.enabled or self._wrote_recently(key):
+            return None
+        self._schedule_lag_check()
+        replica = self._choose()
+        return replica.session_factory if replica is not None else None
+
+    def _schedule_lag_check(self) -> None:
+        now = time.monotonic()
+        if now - self._last_lag_check < self.lag_check_interval:
+            return
+        if self._lag_task is not None and not self._lag_task.done():
+            return
+        self._last_lag_check = now
+        self._lag_task = asyncio.create_task(self.check_lag())
+
+    async def check_lag(self) -> None:
+        """Refresh replication lag and health of every replica."""
+        async def check(replica: Replica) -> None:
+            try:
+                async with replica.engine.connect() as conn:
+                    replica.lag_seconds = float(await conn.scalar(REPLICA_LAG_SQL))
+                if not replica.healthy:
+                    logger.info(f"Replica {replica.engine.url.host} is healthy again")
+                replica.healthy = True
+            except Exception as e:
+                if replica.healthy:
+                    logger.warning(f"Replica {replica.engine.url.host} failed its health check: {e}")
+                replica.healthy = False
+
+        await asyncio.gather(*(check(replica) for replica in self.replicas))
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "host": replica.engine.url.host,
+                "healthy": replica.healthy,
+                "lag_seconds": replica.lag_seconds,
+                **pool_stats(replica.engine),
+            }
+            for replica in self.replicas
+        ]
+
+    async def dispose(self) -> None:
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+def _client_last_write(headers: List[Any]) -> Optional[float]:
+    """Time of the client's last write from its `X-DB-Last-Write` header or cookie, if any."""
+    value = None
+    for name, raw in headers:
+        if name == LAST_WRITE_HEADER.encode():
+            value = raw.decode("latin-1")
+        elif name == b"cookie" and value is None:
+            try:
+                morsel = SimpleCookie(raw.decode("latin-1")).get(LAST_WRITE_COOKIE)
+            except CookieError:
+                continue
+            if morsel is not None:
+                value = morsel.value
+    try:
+        # A time in the future would pin the client to the primary indefinitely
+        return min(float(value), time.time()) if value is not None else None
+    except ValueError:
+        return None
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware carrying each client's last write time across workers (see the module docstring).
+
+    Reads its `db_last_write` cookie or `X-DB-Last-Write` header into the
+    request's context, and sends both back when the request wrote.
+    """
+
+    def __init__(self, app, router: ReplicaRouter):
+        self.app = app
+        self.max_age = max(1, int(router.read_your_writes_seconds))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = {"last_write": _client_last_write(scope["headers"]), "wrote": False}
+        token = _request_writes.set(state)
+
+        async def send_with_last_write(message):
+            if message["type"] == "http.response.start" and state["wrote"]:
+                value = f"{state['last_write']:.3f}"
+                cookie = f"{LAST_WRITE_COOKIE}={value}; Max-Age={self.max_age}; Path=/; HttpOnly; SameSite=Lax"
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (LAST_WRITE_HEADER.encode(), value.encode()),
+                        (b"set-cookie", cookie.encode()),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_last_write)
+        finally:
+            _request_writes.reset(token)
+
+
+replica_router = ReplicaRouter.from_settings(settings)
@@ -0,0 +1,96 @@
+"""
+Schema Revision Management
+
+Startup checks for the Alembic-managed schema.
+
+Instead of introspecting every table with `create_all` on each boot, the
+application compares the single row in `alembic_version` with the head
+revision of the migration scripts. Development databases can be upgraded
+in place; production expects migrations to run as a deploy step and
+refuses to start on a stale schema.
+"""
+
+import asyncio
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.app.core.logging import logger
+
+if TYPE_CHECKING:
+    from alembic.config import Config
+
+# Alembic is imported inside the functions below: it is only needed once, at startup
+
+ALEMBIC_INI = Path(__file__).parent / "migrations" / "alembic.ini"
+
+
+def get_alembic_config() -> "Config":
+    from alembic.config import Config
+
+    config = Config(str(ALEMBIC_INI))
+    # Keep the application's logging configuration when migrating from inside the app
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def get_head_revision() -> Optional[str]:
+    """Latest revision defined by the migration scripts."""
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(get_alembic_config()).get_current_head()
+
+
+def _current_revision(connection: Connection) -> Optional[str]:
+    from alembic.runtime.migration import MigrationContext
+
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+def _upgrade_to_head(connection: Connection) -> None:
+    from alembic import command
+
+    config = get_alembic_config()
+    # env.py migrates on this connection instead of opening its own engine
+    config.attributes["connection"] = connection
+    command.upgrade(config, "head")
+
+
+async def ensure_schema_revision(engine: AsyncEngine, auto_upgrade: bool) -> str:
+    """
+    Make sure the database schema is at the head revision.
+
+    Args:
+        engine: Engine of the database to check
+        auto_upgrade: Upgrade a stale schema in place instead of failing
+
+    Returns:
+        The schema revision the database is at
+
+    Raises:
+        RuntimeError: If the schema is stale and auto_upgrade is disabled
+    """
+    # Loading the migration scripts reads files from disk; keep it off the event loop
+    head = await asyncio.to_thread(get_head_revision)
+
+    async with engine.connect() as conn:
+        current = await conn.run_sync(_current_revision)
+
+    if current == head:
+        logger.info(f"Database schema at revision {current}")
+        return current
+
+    if not auto_upgrade:
+        raise RuntimeError(
+            f"Database schema is at revision {current}, expected {head}. "
+            "Run `alembic -c src/db/migrations/alembic.ini upgrade head` before starting the app."
+        )
+
+    logger.info(f"Upgrading database schema from {current} to {head}")
+    # Let the migration context manage transactions itself (online index builds need autocommit)
+    async with engine.connect() as conn:
+        await conn.run_sync(_upgrade_to_head)
+        await conn.commit()
+    return head
@@ -1,7 +1,8 @@
 from src.db.schemas.message import (
     MessageBase as MessageBase,
     MessageCreate as MessageCreate,
+    MessagePage as MessagePage,
     MessageSchema as MessageSchema,
 )
 
-__all__ = ["MessageBase", "MessageCreate", "MessageSchema"]
\ No newline at end of file
+__all__ = ["MessageBase", "MessageCreate", "MessagePage", "MessageSchema"]
\ No newline at end of file
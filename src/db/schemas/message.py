@@ -1,3 +1,5 @@
+from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel, ConfigDict
 from uuid import UUID
 
@@ -5,9 +7,16 @@ class MessageBase(BaseModel):
     content: str
 
 class MessageCreate(MessageBase):
-    pass
+    owner_id: Optional[str] = None
 
 class MessageSchema(MessageBase):
     id: UUID
+    created_at: datetime
+    owner_id: Optional[str] = None
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class MessagePage(BaseModel):
+    items: List[MessageSchema]
+    # Pass as `after` to fetch the next page; None when this is the last page
+    next_cursor: Optional[str] = None
\ No newline at end of file
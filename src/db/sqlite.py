@@ -0,0 +1,115 @@
+"""
+SQLite Tuning Profile
+
+Connection settings and write routing for SQLite (dev and single-node deployments).
+
+Every new connection gets the tuning profile:
+- `journal_mode=WAL` so readers don't block the writer and vice versa
+- `synchronous=NORMAL`, which is durable under WAL except on power loss
+- a memory-mapped I/O window and a larger page cache
+- a busy timeout, so lock contention waits instead of failing with "database is locked"
+
+SQLite allows a single writer at a time. Instead of letting concurrent
+sessions race for the write lock, writes go through a dedicated writer
+engine with exactly one connection; its pool queue is the write queue.
+Reads keep using the regular pool and run concurrently. `WriterRoutingSession`
+sends flushes and INSERT/UPDATE/DELETE statements to the writer and
+everything else to the session's normal bind.
+"""
+
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import Delete, Insert, Update, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session
+
+from src.db.pool import InstrumentedAsyncQueuePool
+
+
+@dataclass(frozen=True)
+class SQLiteProfile:
+    synchronous: str = "NORMAL"
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size_kb: int = 64 * 1024
+    busy_timeout_ms: int = 5000
+
+    @classmethod
+    def from_settings(cls, settings) -> "SQLiteProfile":
+        return cls(
+            synchronous=settings.SQLITE_SYNCHRONOUS,
+            mmap_size=settings.SQLITE_MMAP_SIZE,
+            cache_size_kb=settings.SQLITE_CACHE_SIZE_KB,
+            busy_timeout_ms=settings.SQLITE_BUSY_TIMEOUT_MS,
+        )
+
+    def pragmas(self) -> list[str]:
+        return [
+            "PRAGMA journal_mode=WAL",
+            f"PRAGMA synchronous={self.synchronous}",
+            f"PRAGMA mmap_size={int(self.mmap_size)}",
+            # Negative cache_size is in KiB rather than pages
+            f"PRAGMA cache_size=-{int(self.cache_size_kb)}",
+            f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}",
+        ]
+
+
+def is_sqlite(engine: Engine | AsyncEngine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def apply_sqlite_profile(engine: Engine | AsyncEngine, profile: SQLiteProfile) -> None:
+    """
+    Run the profile's PRAGMAs on every new connection of `engine`.
+
+    Args:
+        engine: Sync or async SQLite engine
+        profile: Tuning profile to apply
+    """
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in profile.pragmas():
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def create_writer_engine(url: str, profile: SQLiteProfile, timeout: float = 30.0) -> AsyncEngine:
+    """
+    Async engine with a single connection that serializes all writes.
+
+    Args:
+        url: SQLite URL shared with the read engine
+        profile: Tuning profile to apply
+        timeout: Seconds a write may wait in the queue before failing
+    """
+    engine = create_async_engine(
+        url,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=timeout,
+    )
+    apply_sqlite_profile(engine, profile)
+    return engine
+
+
+class WriterRoutingSession(Session):
+    """
+    Session that routes writes to `info["writer"]`.
+
+    Flushes and INSERT/UPDATE/DELETE statements use the writer bind, and all
+    other statements use the session's own bind. Without a writer this
+    behaves like a plain Session.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        writer = self.info.get("writer")
+        if writer is not None and (self._flushing or isinstance(clause, (Insert, Update, Delete))):
+            return writer
+        return super().get_bind(mapper, clause=clause, **kw)
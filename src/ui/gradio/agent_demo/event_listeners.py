@@ -1,11 +1,13 @@
 from typing import List
 import json
-from agents import Runner
+import gradio as gr
 from gradio import ChatMessage
-from openai.types.responses import ResponseTextDeltaEvent
-from src.agent import current_agent
-from src.agent.memory import get_or_create_memory_session
+from src.agent.admission import AdmissionRejected
+from src.agent.quotas import QuotaExceeded
+from src.agent.runs import run_manager
+from src.app.core.identity import client_identity
 from src.app.core.logging import logger
+from src.ui.gradio.chat_history import ChatHistoryManager
 
         
 def clear_chat(session_id: str):
@@ -30,13 +32,14 @@ def handle_user_message(user_message: str, history: List[ChatMessage], session_i
     updated_history = history + [ChatMessage(role="user", content=user_message)]
     return "", updated_history
 
-async def handle_agent_message(history: List[ChatMessage], session_id: str):
+async def handle_agent_message(history: List[ChatMessage], session_id: str, request: gr.Request = None):
     """
     Handle agent message with real AI streaming using ChatMessage format and memory session.
     
     Args:
         history: Current chat history from Gradio UI
         session_id: Unique session identifier for memory persistence
+        request: Incoming request, injected by Gradio; identifies the client for quotas
     """
     # Get the latest user message from history
     if history:
@@ -50,21 +53,15 @@ async def handle_agent_message(history: List[ChatMessage], session_id: str):
         user_input = ""
     
     try:
-        # Get or create memory session for this user session
-        memory_session = await get_or_create_memory_session(session_id)
-        
-        # Run agent with memory session for persistent conversation history
-        result = Runner.run_streamed(
-            current_agent,
-            input=user_input,
-            session=memory_session
-        )
+        # Start the run in the background so it survives a dropped connection;
+        # the UI is just one subscriber of the run's event stream
+        run = await run_manager.start(session_id, user_input, client_id=client_identity(request))
         
         # Flag to track if we've added the initial message
         message_started = False
 
-        async for event in result.stream_events():
-            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+        async for event in run.subscribe():
+            if event.type == "text_delta":
                 # Add empty assistant message only when we start getting content
                 if not message_started:
                     history.append(ChatMessage(role="assistant", content=""))
@@ -73,45 +70,72 @@ async def handle_agent_message(history: List[ChatMessage], session_id: str):
                 # Update the content of the current message
                 history[-1] = ChatMessage(
                     role="assistant", 
-                    content=history[-1].content + event.data.delta
+                    content=history[-1].content + event.data["delta"]
                 )
                 yield history
                 
-            elif event.type == "run_item_stream_event":
-                if getattr(event, "name", None) == "tool_called" and getattr(event.item, "type", "") == "tool_call_item":
-                    raw_item = getattr(event.item, "raw_item", None)
-                    tool_name = (
-                        getattr(raw_item, "name", None)
-                        or getattr(raw_item, "tool_name", None)
-                        or "tool"
+            elif event.type == "tool_called":
+                tool_name = event.data.get("name", "tool")
+                tool_args = event.data.get("arguments")
+                
+                # Format tool arguments concisely
+                if tool_args:
+                    try:
+                        # Parse and format JSON
+                        args_data = json.loads(tool_args) if isinstance(tool_args, str) else tool_args
+                        tool_content = f"```json\n{json.dumps(args_data, indent=2)}\n```"
+                    except (json.JSONDecodeError, TypeError, AttributeError):
+                        tool_content = f"```\n{str(tool_args)}\n```"
+                else:
+                    tool_content = "No arguments"
+                
+                history.append(
+                    ChatMessage(
+                        role="assistant",
+                        content=tool_content,
+                        metadata={"title": f"🛠️ Using tool '{tool_name}'"}
                     )
-                    tool_args = getattr(raw_item, "arguments", None)
-                    
-                    # Format tool arguments concisely
-                    if tool_args:
-                        try:
-                            # Parse and format JSON
-                            args_data = json.loads(tool_args) if isinstance(tool_args, str) else tool_args
-                            tool_content = f"```json\n{json.dumps(args_data, indent=2)}\n```"
-                        except (json.JSONDecodeError, TypeError, AttributeError):
-                            tool_content = f"```\n{str(tool_args)}\n```"
-                    else:
-                        tool_content = "No arguments"
-                    
-                    history.append(
-                        ChatMessage(
-                            role="assistant",
-                            content=tool_content,
-                            metadata={"title": f"🛠️ Using tool '{tool_name}'"}
-                        )
+                )
+                yield history
+                
+                # Reset flag so next response content gets a new message
+                message_started = False
+
+            elif event.type == "completed":
+                # Keep the turn's stream timing with the final response message
+                if message_started and event.data.get("timing"):
+                    history[-1] = ChatMessage(
+                        role="assistant",
+                        content=history[-1].content,
+                        metadata=ChatHistoryManager.timing_metadata(event.data["timing"])
                     )
                     yield history
-                    
-                    # Reset flag so next response content gets a new message
-                    message_started = False
-            else:
-                pass
+
+            elif event.type == "error":
+                raise RuntimeError(event.data.get("message", "Agent run failed"))
                 
+    except QuotaExceeded as e:
+        logger.warning(f"Agent run over quota: {e}")
+        history.append(
+            ChatMessage(
+                role="assistant",
+                content=f"You've reached your usage limit. Please try again in {e.retry_after} seconds.",
+                metadata={"title": "🚦 Limit reached"}
+            )
+        )
+        yield history
+
+    except AdmissionRejected as e:
+        logger.warning(f"Agent run shed by admission control: {e}")
+        history.append(
+            ChatMessage(
+                role="assistant",
+                content=f"The assistant is busy right now. Please try again in {e.retry_after} seconds.",
+                metadata={"title": "⏳ Busy"}
+            )
+        )
+        yield history
+
     except Exception as e:
         logger.error(f"Error in agent response: {e}")
         history[-1] = ChatMessage(
@@ -1,8 +1,11 @@
+from contextlib import aclosing
+
 import gradio as gr
 from gradio import ChatMessage
 from src.ui.gradio.chat_history import ChatHistoryManager
 from src.chain.runtime import call_llm_api
-from src.app.core.logging import logger
+from src.app.core.metrics import StreamTimer
+from src.app.core.logging import hot_logger, logger
 
 
 def handle_user_message(user_message: str, history):
@@ -20,42 +23,57 @@ async def handle_demo_response(history):
     # Include all previous messages into llm api call
     messages = ChatHistoryManager.gradio_to_openai_messages(history)
     
+    # What this user saw; the upstream call records the model metrics (it may be shared)
+    timer = StreamTimer("", "chain", record=False)
     try:
         response = await call_llm_api(messages)
         
         # Flag to track if we've added the initial message
         message_started = False
 
-        async for chunk in response:
-            choices = getattr(chunk, "choices", [])
-            if choices and (delta := getattr(choices[0], "delta", None)):
-                if content := getattr(delta, "content", None):
-                    if not message_started:
-                        history.append(ChatMessage(role="assistant", content=""))
-                        message_started = True
+        # Closed as soon as this client goes away, so a shared single-flight call is released
+        # right then instead of whenever the generator is garbage collected
+        async with aclosing(response) as stream:
+            async for chunk in stream:
+                choices = getattr(chunk, "choices", [])
+                if choices and (delta := getattr(choices[0], "delta", None)):
+                    if content := getattr(delta, "content", None):
+                        timer.token()
+                        if not message_started:
+                            history.append(ChatMessage(role="assistant", content=""))
+                            message_started = True
                     
-                    # Update the content of the current message
-                    history[-1] = ChatMessage(
-                        role="assistant", 
-                        content=history[-1].content + content
-                    )
-                    yield history
+                        # Update the content of the current message
+                        history[-1] = ChatMessage(
+                            role="assistant", 
+                            content=history[-1].content + content
+                        )
+                        yield history
                 
-                elif tool_calls := getattr(delta, "tool_calls", None):
-                    if not message_started:
-                        history.append(ChatMessage(role="assistant", content=""))
-                        message_started = True
+                    elif tool_calls := getattr(delta, "tool_calls", None):
+                        if not message_started:
+                            history.append(ChatMessage(role="assistant", content=""))
+                            message_started = True
                     
-                    # Handle tool calls - for now, append as text content
-                    tools_text = f"\n[Tool calls: {str(tool_calls)}]"
-                    history[-1] = ChatMessage(
-                        role="assistant", 
-                        content=history[-1].content + tools_text
-                    )
-                    yield history
-
-                else:
-                    pass
+                        # Handle tool calls - for now, append as text content
+                        tools_text = f"\n[Tool calls: {str(tool_calls)}]"
+                        history[-1] = ChatMessage(
+                            role="assistant", 
+                            content=history[-1].content + tools_text
+                        )
+                        yield history
+
+                    else:
+                        pass
+
+        timer.finish()
+        if message_started:
+            history[-1] = ChatMessage(
+                role="assistant",
+                content=history[-1].content,
+                metadata=ChatHistoryManager.timing_metadata(timer.summary())
+            )
+            yield history
             
     except Exception as e:
         logger.error(f"Error in agent response: {e}")
@@ -76,15 +94,15 @@ def demo_auto_save_conversation(conversation_id, messages, saved_conversations):
     Auto-save conversation after each message exchange.
     Fixed version for the demo.
     """
-    logger.debug(f"Auto-save called with {len(messages)} messages")
+    logger.debug("Auto-save called with %d messages", len(messages))
     
     # Only auto-save if we have at least one complete exchange (user + assistant)
     if len(messages) >= 2:
-        logger.info("Auto-saving conversation...")
+        logger.debug("Auto-saving conversation...")
         new_id, updated_conversations = ChatHistoryManager.save_conversation(
             conversation_id, messages, saved_conversations
         )
-        logger.info(f"Saved as conversation {new_id}, total conversations: {len(updated_conversations)}")
+        hot_logger.info("Saved as conversation %s, total conversations: %d", new_id, len(updated_conversations))
         return new_id, updated_conversations
     
     logger.debug("Not enough messages to auto-save")
@@ -96,10 +114,10 @@ def demo_update_conversation_list(saved_conversations):
     Update the conversation list for display.
     Fixed version for the demo.
     """
-    logger.debug(f"Updating conversation list with {len(saved_conversations)} conversations")
+    logger.debug("Updating conversation list with %d conversations", len(saved_conversations))
     
     conversation_samples = ChatHistoryManager.get_conversation_list(saved_conversations)
-    logger.debug(f"Generated {len(conversation_samples)} conversation samples")
+    logger.debug("Generated %d conversation samples", len(conversation_samples))
     
     return gr.Dataset(samples=conversation_samples)
 
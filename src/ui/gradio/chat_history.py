@@ -75,6 +75,25 @@ class ChatHistoryManager:
                 })
         return messages
     
+    @staticmethod
+    def timing_metadata(timing: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Message metadata for a response's stream timing (see StreamTimer.summary).
+
+        Without a "title" the Chatbot renders the message normally, so the timing
+        is only kept with the message and its saved conversation.
+        """
+        parts = []
+        if timing.get("ttft_ms") is not None:
+            parts.append(f"TTFT {timing['ttft_ms']:.0f} ms")
+        parts.append(f"{timing.get('tokens', 0)} tokens")
+        if timing.get("tokens_per_second") is not None:
+            parts.append(f"{timing['tokens_per_second']:.1f} tok/s")
+        parts.append(f"max gap {timing.get('max_inter_token_ms', 0):.0f} ms")
+        if timing.get("stalls"):
+            parts.append(f"{timing['stalls']} stalls")
+        return {"log": " · ".join(parts), "duration": round(timing.get("duration_ms", 0) / 1000, 2)}
+
     @staticmethod
     def generate_conversation_title(messages: List[ChatMessage], max_length: int = 40) -> str:
         """
@@ -0,0 +1,33 @@
+"""
+Shared Test Fixtures
+
+`mock_provider` serves the OpenAI-compatible mock provider
+(`src.bench.mock_provider`) on a free local port, so tests and performance
+tests never reach a real model API. The server runs for the whole test
+session; every test gets it reset to the default configuration with an
+empty script.
+"""
+
+import pytest
+
+from src.bench.mock_provider import MockProviderServer
+
+
+@pytest.fixture(scope="session")
+def mock_provider_server():
+    with MockProviderServer() as server:
+        yield server
+
+
+@pytest.fixture
+def mock_provider(mock_provider_server):
+    """
+    The running mock provider server, reset for this test.
+
+    Point clients at `mock_provider.base_url`; configure replies through
+    `mock_provider.provider` (`config`, `enqueue`, `responder`) and inspect
+    the request bodies it received in `mock_provider.provider.requests`.
+    """
+    mock_provider_server.provider.reset()
+    yield mock_provider_server
+    mock_provider_server.provider.reset()
@@ -0,0 +1,140 @@
+"""
+Admission Control Tests
+
+Run permits (`src.agent.admission.AdmissionController`): runs beyond the
+in-flight limit wait in a bounded queue, are rejected once the queue is full
+or their wait passes the queue timeout, and the permit of a run started by
+the `RunManager` comes back however the run ends.
+"""
+
+import asyncio
+
+import pytest
+
+from src.agent.admission import AdmissionController, AdmissionRejected
+from src.agent.quotas import MemoryQuotaStore, QuotaLimits, QuotaManager
+from src.agent.runs import RunManager
+
+
+def no_quotas() -> QuotaManager:
+    return QuotaManager(MemoryQuotaStore(), 60, QuotaLimits(), QuotaLimits(), soft_ratio=0.8)
+
+
+def test_queues_up_to_the_limit_then_rejects():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=2, max_queue=2, queue_timeout=5)
+        await admission.acquire("openai")
+        await admission.acquire("openai")
+        waiters = [asyncio.create_task(admission.acquire("openai")) for _ in range(2)]
+        await asyncio.sleep(0)
+        queued = admission.queue_depth
+
+        # Queue full: rejected right away
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("openai")
+
+        # Each release admits the oldest waiter
+        admission.release("openai", run_seconds=2.0)
+        await asyncio.sleep(0.01)
+        first_admitted = [waiter.done() for waiter in waiters]
+        admission.release("openai", run_seconds=2.0)
+        await asyncio.gather(*waiters)
+        return admission, queued, rejected.value, first_admitted
+
+    admission, queued, rejected, first_admitted = asyncio.run(scenario())
+    assert queued == 2
+    assert rejected.retry_after >= 1
+    assert first_admitted == [True, False]
+    assert admission.in_flight == 2 and admission.queue_depth == 0
+    assert admission.admitted == 4 and admission.rejected == 1
+
+
+def test_per_agent_limit_does_not_block_other_agents():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=4, max_queue=4, queue_timeout=0.05, key_limits={"openai": 1})
+        await admission.acquire("openai")
+        await admission.acquire("fireworks")
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire("openai")
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.stats()["in_flight_by_agent"] == {"openai": 1, "fireworks": 1}
+
+
+def test_rejected_when_the_queue_deadline_passes():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=0.05)
+        await admission.acquire("openai")
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("openai")
+        return admission, loop.time() - start, rejected.value
+
+    admission, waited, rejected = asyncio.run(scenario())
+    assert waited >= 0.05
+    assert "0.05s" in str(rejected)
+    # The timed-out waiter left the queue and holds no permit
+    assert admission.queue_depth == 0 and admission.in_flight == 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=5)
+        await admission.acquire("openai")
+        waiter = asyncio.create_task(admission.acquire("openai"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        admission.release("openai")
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.queue_depth == 0 and admission.in_flight == 0
+
+
+@pytest.mark.parametrize("outcome", ["completed", "failed", "cancelled"])
+def test_run_manager_releases_the_permit_when_the_run_ends(outcome, monkeypatch):
+    async def drive(self, run, agent, user_input, agent_key, client_id):
+        await asyncio.sleep(0.01)
+        if outcome == "failed":
+            raise RuntimeError("model unavailable")
+        if outcome == "cancelled":
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(RunManager, "_drive", drive)
+
+    async def scenario():
+        admission = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=1)
+        manager = RunManager(buffer_size=16, ttl_seconds=60, admission=admission, quotas=no_quotas())
+        run = await manager.start("session", "hi", agent=object(), agent_key="openai")
+        held = admission.in_flight
+        await asyncio.gather(run.task, return_exceptions=True)
+        await asyncio.sleep(0)
+        return admission, held
+
+    admission, held = asyncio.run(scenario())
+    assert held == 1
+    assert admission.in_flight == 0
+    assert admission.stats()["avg_run_seconds"] > 0
+
+
+def test_run_manager_releases_the_permit_when_start_is_interrupted():
+    class InterruptedQuotas:
+        async def check(self, client_id, session_id):
+            return False
+
+        async def charge(self, client_id, session_id, requests=0, tokens=0):
+            raise asyncio.CancelledError
+
+    async def scenario():
+        admission = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=1)
+        manager = RunManager(buffer_size=16, ttl_seconds=60, admission=admission, quotas=InterruptedQuotas())
+        with pytest.raises(asyncio.CancelledError):
+            await manager.start("session", "hi", agent=object(), agent_key="openai")
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.in_flight == 0
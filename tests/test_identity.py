@@ -0,0 +1,93 @@
+"""
+Client Identity Tests
+
+Who a request counts as for quotas (`src.app.core.identity`): only API keys
+listed in QUOTA_API_KEYS identify a client, and the IP address comes from
+the connection unless trusted proxies are configured, so headers a client
+sets itself cannot move it to another quota.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from starlette.datastructures import Headers
+
+from src.app.core import identity
+from src.app.core.identity import client_identity, get_client_ip
+
+PEER = "192.0.2.10"
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    """Sets the identity settings for the test (defaults: no keys, no trusted proxies)."""
+
+    def apply(api_keys: str = "", proxy_hops: int = 0, trust_cf: bool = False) -> None:
+        settings = SimpleNamespace(
+            QUOTA_API_KEYS=api_keys, TRUSTED_PROXY_HOPS=proxy_hops, TRUST_CF_CONNECTING_IP=trust_cf
+        )
+        monkeypatch.setattr(identity, "get_global_settings", lambda: settings)
+        identity.known_key_hashes.cache_clear()
+
+    yield apply
+    identity.known_key_hashes.cache_clear()
+
+
+def request(**headers: str):
+    return SimpleNamespace(
+        headers=Headers({name.replace("_", "-"): value for name, value in headers.items()}),
+        client=SimpleNamespace(host=PEER),
+    )
+
+
+def test_forwarded_headers_are_ignored_without_trusted_proxies(configure):
+    configure()
+    spoofed = request(x_forwarded_for="203.0.113.7", cf_connecting_ip="203.0.113.8")
+    assert get_client_ip(spoofed) == PEER
+    assert client_identity(spoofed) == f"ip:{PEER}"
+
+
+@pytest.mark.parametrize(
+    ("proxy_hops", "forwarded_for", "expected"),
+    [
+        # The proxy appended the address it got the request from; the rest was sent by the client
+        (1, "203.0.113.7", "203.0.113.7"),
+        (1, "198.51.100.66, 203.0.113.7", "203.0.113.7"),
+        # Two proxies: the outer one's entry is second from the right
+        (2, "198.51.100.66, 203.0.113.7, 10.0.0.2", "203.0.113.7"),
+        # Fewer entries than hops: the left-most is all there is
+        (2, "203.0.113.7", "203.0.113.7"),
+    ],
+)
+def test_client_ip_is_taken_from_the_trusted_hop(configure, proxy_hops, forwarded_for, expected):
+    configure(proxy_hops=proxy_hops)
+    assert get_client_ip(request(x_forwarded_for=forwarded_for)) == expected
+
+
+def test_client_ip_without_forwarded_header_is_the_peer(configure):
+    configure(proxy_hops=1)
+    assert get_client_ip(request()) == PEER
+
+
+def test_cf_connecting_ip_only_when_trusted(configure):
+    configure(proxy_hops=1, trust_cf=True)
+    assert get_client_ip(request(cf_connecting_ip="203.0.113.8", x_forwarded_for="10.0.0.2")) == "203.0.113.8"
+    configure(proxy_hops=1)
+    assert get_client_ip(request(cf_connecting_ip="203.0.113.8", x_forwarded_for="10.0.0.2")) == "10.0.0.2"
+
+
+def test_only_known_api_keys_identify_a_client(configure):
+    configure(api_keys="sk-team-a, sk-team-b")
+    known = client_identity(request(x_api_key="sk-team-b"))
+    assert known.startswith("key:")
+    # Stored as a hash prefix, never the key itself
+    assert "sk-team-b" not in known
+    assert client_identity(request(x_api_key="sk-team-b")) == known
+    assert client_identity(request(x_api_key="sk-team-a")) != known
+    # A made-up key does not escape the caller's IP quota
+    assert client_identity(request(x_api_key="sk-random-1")) == f"ip:{PEER}"
+
+
+def test_no_request_has_no_identity(configure):
+    configure()
+    assert client_identity(None) is None
@@ -0,0 +1,94 @@
+"""
+Import Time Tests
+
+Budget for the cold import of the API-only application, and settings still
+read from `.env` now that it is loaded lazily.
+
+Runs `python -X importtime` in a fresh interpreter, builds `src.app.main:app`
+with both Gradio UIs disabled, and reports the heaviest imports. Set
+IMPORT_TIME_BUDGET_MS to tighten or relax the budget on slower machines.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "2000"))
+
+# Heavy dependencies an API-only worker must not import at startup
+LAZY_MODULES = ["gradio", "agents", "openai", "alembic", "uvicorn"]
+
+PROBE = (
+    "import json, sys\n"
+    "import src.app.main as main\n"
+    "main.app\n"
+    f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))\n"
+)
+
+
+def parse_importtime(stderr: str) -> Tuple[float, List[Tuple[float, str]]]:
+    """
+    Parse `-X importtime` output.
+
+    Returns:
+        Total cumulative milliseconds of top-level imports, and (ms, module)
+        pairs for the imports one level below them, sorted heaviest first
+    """
+    total_ms = 0.0
+    children: List[Tuple[float, str]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Nesting is shown by indentation: one space for top-level imports, two more per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        ms = int(cumulative) / 1000
+        if depth == 0:
+            total_ms += ms
+        elif depth == 1:
+            children.append((ms, name.strip()))
+    return total_ms, sorted(children, reverse=True)
+
+
+def test_api_only_import_budget():
+    env = {
+        **os.environ,
+        "MOUNT_AGENT_UI": "false",
+        "MOUNT_CHAT_UI": "false",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total_ms, ranked = parse_importtime(result.stderr)
+    report = "\n".join(f"{ms:9.1f} ms  {name}" for ms, name in ranked[:15])
+    print(f"\nImport time of src.app.main (API only): {total_ms:.0f} ms\n{report}")
+
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    assert loaded == [], f"API-only startup imported heavy modules: {loaded}"
+    assert total_ms <= BUDGET_MS, f"Import took {total_ms:.0f} ms (budget {BUDGET_MS:.0f} ms)\n{report}"
+
+
+def test_agent_type_from_dotenv(tmp_path):
+    # `.env` is only loaded when first needed, which must still be before AGENT_TYPE is read
+    (tmp_path / ".env").write_text("AGENT_TYPE=fireworks\n")
+    env = {key: value for key, value in os.environ.items() if key != "AGENT_TYPE"}
+    result = subprocess.run(
+        [sys.executable, "-c", "from src.agent.registry import current_agent_key; print(current_agent_key())"],
+        cwd=tmp_path,
+        env={**env, "PYTHONPATH": str(ROOT), "PYTHONDONTWRITEBYTECODE": "1"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip().splitlines()[-1] == "fireworks"
@@ -0,0 +1,59 @@
+"""
+Event Loop Blocking Tests
+
+Handlers that run on the event loop must not hold it.
+
+`assert_loop_not_blocked` (see `src.app.core.profiling`) watches the loop
+from a background thread and fails with the stack of the blocking code.
+Set LOOP_BLOCK_BUDGET_MS to relax the budget on slower machines.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.app.core.profiling import assert_loop_not_blocked
+
+BUDGET_MS = float(os.getenv("LOOP_BLOCK_BUDGET_MS", "50"))
+
+
+def test_detects_blocking_call():
+    async def handler():
+        await asyncio.sleep(0.01)
+        time.sleep(0.2)
+
+    async def check():
+        with assert_loop_not_blocked(BUDGET_MS):
+            await handler()
+
+    with pytest.raises(AssertionError, match="handler"):
+        asyncio.run(check())
+
+
+def test_awaiting_does_not_count_as_blocking():
+    async def check():
+        with assert_loop_not_blocked(BUDGET_MS):
+            await asyncio.sleep(0.2)
+
+    asyncio.run(check())
+
+
+def test_conversation_list_does_not_block():
+    # Sorting and timestamp parsing of the chat sidebar, at a realistic history size
+    from src.ui.gradio.chat_history import ChatHistoryManager
+
+    start = datetime(2026, 1, 1)
+    conversations = [
+        {"title": f"Conversation {i}", "timestamp": (start + timedelta(minutes=i)).isoformat(), "message_count": i % 40}
+        for i in range(500)
+    ]
+
+    async def check():
+        with assert_loop_not_blocked(BUDGET_MS):
+            ChatHistoryManager.get_conversation_list(conversations)
+            await asyncio.sleep(0.01)
+
+    asyncio.run(check())
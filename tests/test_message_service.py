@@ -0,0 +1,134 @@
+"""
+Message Service Tests
+
+Keyset pagination of messages (`src.db.crud.message`): page cursors carry
+the (created_at, id) key, so paging through messages that share a
+`created_at` (as every message of one bulk insert does) visits each exactly
+once in either direction, also when the cursor's message was deleted, and a
+malformed cursor is answered with 400. The sync adapter pages the same way.
+
+Every test works on its own SQLite database in a temporary directory; the
+COPY path of bulk inserts needs asyncpg and is not covered here.
+"""
+
+import asyncio
+import base64
+from typing import List
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.db.crud import MessageService, ThreadedSyncMessageService
+from src.db.crud.message import decode_cursor, encode_cursor
+from src.db.database import Base
+from src.db.schemas import MessageCreate
+
+
+async def paginate(service, limit: int, **filters) -> List[List[str]]:
+    """Contents of every page, following the cursors like an API client."""
+    pages, after = [], None
+    while True:
+        items = await service.get_messages(after=after, limit=limit, **filters)
+        if items:
+            pages.append([item.content for item in items])
+        if len(items) < limit:
+            return pages
+        after = encode_cursor(items[-1])
+
+
+def with_service(tmp_path, scenario):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'messages.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                return await scenario(MessageService(session))
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_pages_through_messages_sharing_created_at(tmp_path):
+    async def scenario(service):
+        created = await service.create_messages_bulk(
+            [MessageCreate(content=f"m{i}", owner_id="a" if i % 2 else "b") for i in range(7)]
+        )
+        forward = await paginate(service, limit=3)
+        backward = await paginate(service, limit=3, newest_first=True)
+        owned = await paginate(service, limit=2, owner_id="a")
+        return created, forward, backward, owned
+
+    created, forward, backward, owned = with_service(tmp_path, scenario)
+    # One bulk insert: one timestamp, so only the id orders these messages
+    assert len({message.created_at for message in created}) == 1
+    assert forward == [["m0", "m1", "m2"], ["m3", "m4", "m5"], ["m6"]]
+    assert backward == [["m6", "m5", "m4"], ["m3", "m2", "m1"], ["m0"]]
+    assert owned == [["m1", "m3"], ["m5"]]
+
+
+def test_cursor_survives_deleting_its_message(tmp_path):
+    async def scenario(service):
+        await service.create_messages_bulk([MessageCreate(content=f"m{i}") for i in range(5)])
+        first = await service.get_messages(limit=2)
+        cursor = encode_cursor(first[-1])
+        await service.delete_message(first[-1].id)
+        return [item.content for item in await service.get_messages(after=cursor, limit=10)]
+
+    assert with_service(tmp_path, scenario) == ["m2", "m3", "m4"]
+
+
+def test_cursor_round_trip(tmp_path):
+    async def scenario(service):
+        return await service.create_message(MessageCreate(content="hello"))
+
+    message = with_service(tmp_path, scenario)
+    cursor = encode_cursor(message)
+    # URL-safe and unpadded: usable as a query parameter as is
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+    assert decode_cursor(cursor) == (message.created_at, message.id)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        base64.urlsafe_b64encode(b"2026-10-19T12:00:00").decode(),
+        base64.urlsafe_b64encode(b"yesterday|0190a8c4-0000-7000-8000-000000000000").decode(),
+        base64.urlsafe_b64encode(b"2026-10-19T12:00:00|42").decode(),
+        base64.urlsafe_b64encode(b"a|b|c").decode(),
+        base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    ],
+)
+def test_malformed_cursor_is_rejected(tmp_path, cursor):
+    async def scenario(service):
+        with pytest.raises(HTTPException) as rejected:
+            await service.get_messages(after=cursor)
+        return rejected.value
+
+    assert with_service(tmp_path, scenario).status_code == 400
+
+
+def test_threaded_sync_service_pages_the_same_way(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'messages.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, class_=Session, expire_on_commit=False)
+
+    async def scenario():
+        with factory() as session:
+            service = ThreadedSyncMessageService(session)
+            created = [await service.create_message(MessageCreate(content=f"m{i}")) for i in range(5)]
+            fetched = await service.get_message(created[0].id)
+            return fetched, await paginate(service, limit=2), await paginate(service, limit=2, newest_first=True)
+
+    try:
+        fetched, forward, backward = asyncio.run(scenario())
+    finally:
+        engine.dispose()
+    assert fetched.content == "m0"
+    assert forward == [["m0", "m1"], ["m2", "m3"], ["m4"]]
+    assert backward == [["m4", "m3"], ["m2", "m1"], ["m0"]]
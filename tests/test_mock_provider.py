@@ -0,0 +1,93 @@
+"""
+Mock Provider Tests
+
+The mock provider (`src.bench.mock_provider`) behaves like the real API for
+the OpenAI client and the Agents SDK: streaming with usage, tool calls,
+pacing, and injected failures.
+"""
+
+import asyncio
+import time
+
+import pytest
+from openai import AsyncOpenAI, RateLimitError
+
+from src.bench.mock_provider import MockConfig, MockResponse, MockToolCall
+
+
+def client_for(mock_provider, max_retries: int = 0) -> AsyncOpenAI:
+    return AsyncOpenAI(base_url=mock_provider.base_url, api_key="sk-test", max_retries=max_retries)
+
+
+def test_stream_is_paced_and_reports_usage(mock_provider):
+    mock_provider.provider.reset(MockConfig(ttft_ms=100, tokens=10, tokens_per_second=100))
+
+    async def stream():
+        client = client_for(mock_provider)
+        start = time.perf_counter()
+        first_token = None
+        text, usage = "", None
+        response = await client.chat.completions.create(
+            model="gpt-4.1-mini", messages=[{"role": "user", "content": "hi"}],
+            stream=True, stream_options={"include_usage": True},
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                first_token = first_token or time.perf_counter() - start
+                text += chunk.choices[0].delta.content
+            usage = chunk.usage or usage
+        await client.close()
+        return first_token, time.perf_counter() - start, text, usage
+
+    first_token, duration, text, usage = asyncio.run(stream())
+    assert text == " ".join(f"tok{i}" for i in range(10))
+    assert usage.completion_tokens == 10
+    assert first_token >= 0.09
+    # Ten tokens at 100 tokens/s after the first token delay
+    assert duration >= 0.19
+
+
+def test_injected_rate_limit(mock_provider):
+    mock_provider.provider.reset(MockConfig(rate_limit_rate=1.0, retry_after=3))
+
+    async def call():
+        client = client_for(mock_provider)
+        try:
+            await client.chat.completions.create(model="gpt-4.1-mini", messages=[{"role": "user", "content": "hi"}])
+        finally:
+            await client.close()
+
+    with pytest.raises(RateLimitError) as error:
+        asyncio.run(call())
+    assert error.value.response.headers["retry-after"] == "3"
+    assert mock_provider.provider.counts["status_429"] == 1
+
+
+def test_agent_turn_with_scripted_tool_call(mock_provider):
+    from agents import Agent, OpenAIChatCompletionsModel, Runner, set_tracing_disabled
+    from src.agent.tools.example import fetch_weather
+
+    set_tracing_disabled(True)
+    mock_provider.provider.enqueue(
+        MockResponse(tool_calls=[MockToolCall("fetch_weather", '{"location": "Paris"}')]),
+        MockResponse(content="Sunny in Paris."),
+    )
+
+    async def turn():
+        client = client_for(mock_provider)
+        model = OpenAIChatCompletionsModel(model="gpt-4.1-mini", openai_client=client)
+        agent = Agent(name="Test", instructions="Be brief.", model=model, tools=[fetch_weather])
+        result = Runner.run_streamed(agent, input="Weather in Paris?")
+        async for _ in result.stream_events():
+            pass
+        await client.close()
+        return result.final_output
+
+    assert asyncio.run(turn()) == "Sunny in Paris."
+    requests = mock_provider.provider.requests
+    assert len(requests) == 2
+    # The second model call carries the tool's result
+    assert requests[1]["messages"][-1] == {
+        "role": "tool", "tool_call_id": requests[1]["messages"][-2]["tool_calls"][0]["id"],
+        "content": "The weather in Paris is sunny",
+    }
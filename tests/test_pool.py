@@ -0,0 +1,48 @@
+"""
+Connection Pool Telemetry Tests
+
+Waiter accounting of the instrumented pools (`src.db.pool`): a checkout
+counts as waiting only while it is blocked on a full pool, not when a
+connection is idle or an overflow connection can be opened.
+"""
+
+import asyncio
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.db.pool import InstrumentedAsyncQueuePool, pool_stats
+
+
+def test_only_blocked_checkouts_count_as_waiting(tmp_path):
+    async def scenario():
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+            poolclass=InstrumentedAsyncQueuePool, pool_size=1, max_overflow=1, pool_timeout=5,
+        )
+        seen = {}
+        # Waiters while each checkout is being handed its connection, i.e. after any wait is over
+        during_checkout = []
+        event.listen(engine.sync_engine, "checkout", lambda *_: during_checkout.append(engine.pool.stats.waiting))
+        first = await engine.connect()
+        # The overflow connection is opened without waiting
+        second = await engine.connect()
+        seen["served"] = pool_stats(engine)["waiting"]
+
+        # Pool and overflow are in use: the next checkout blocks until one comes back
+        third = asyncio.create_task(engine.connect().start())
+        await asyncio.sleep(0.05)
+        seen["blocked"] = pool_stats(engine)["waiting"]
+        await first.close()
+        await (await third).close()
+        seen["released"] = pool_stats(engine)["waiting"]
+
+        await second.close()
+        stats = pool_stats(engine)
+        await engine.dispose()
+        return seen, during_checkout, stats
+
+    seen, during_checkout, stats = asyncio.run(scenario())
+    assert seen == {"served": 0, "blocked": 1, "released": 0}
+    assert during_checkout == [0, 0, 0]
+    assert stats["acquired"] == 3 and stats["timeouts"] == 0
@@ -0,0 +1,186 @@
+"""
+Run Quota Tests
+
+Sliding-window quotas of agent runs (`src.agent.quotas.QuotaManager`), with
+counters in memory and in the database: runs past the soft limit are
+degraded, runs at the hard limit are rejected with a Retry-After hint, and
+the previous window's count fades out as the window slides. Over a quota,
+the run API answers 429.
+
+Time is a fake clock; windows are 100 seconds long and start at t=1000.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.agent import quotas
+from src.agent.admission import AdmissionController
+from src.agent.quotas import DatabaseQuotaStore, MemoryQuotaStore, QuotaExceeded, QuotaLimits, QuotaManager
+from src.agent.runs import RunManager
+from src.app.api.v1.endpoints import run as run_endpoint
+from src.db.database import Base
+
+WINDOW = 100
+START = 1000.0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Current time of the quota manager, in epoch seconds; assign `clock.now` to move it."""
+    fake = SimpleNamespace(now=START)
+    monkeypatch.setattr(quotas, "time", SimpleNamespace(time=lambda: fake.now))
+    return fake
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Points the database quota store at a fresh SQLite database; returns a coroutine that creates its tables."""
+
+    async def create():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'quotas.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+        monkeypatch.setattr(quotas, "AsyncSessionLocal", factory)
+        monkeypatch.setattr(quotas, "WriterSessionLocal", factory)
+        return engine
+
+    return create
+
+
+def manager(store=None, client: QuotaLimits = QuotaLimits(requests=4), session: QuotaLimits = QuotaLimits()):
+    return QuotaManager(store or MemoryQuotaStore(), WINDOW, client, session, soft_ratio=0.5)
+
+
+async def outcome(quota: QuotaManager, client_id: str = "ip:203.0.113.7", session_id: str = "session"):
+    """"ok", "degraded" or the Retry-After of the rejection."""
+    try:
+        return "degraded" if await quota.check(client_id, session_id) else "ok"
+    except QuotaExceeded as e:
+        return e.retry_after
+
+
+def _with_agent(start):
+    # The endpoint starts runs with the current agent; any object does for the patched `_drive`
+    async def start_with_agent(self, *args, **kwargs):
+        return await start(self, *args, agent=object(), agent_key="openai", **kwargs)
+
+    return start_with_agent
+
+
+@pytest.mark.parametrize("backend", ["memory", "database"])
+def test_soft_then_hard_limit_then_window_rollover(backend, clock, database):
+    async def scenario():
+        engine = await database() if backend == "database" else None
+        quota = manager(DatabaseQuotaStore() if engine is not None else MemoryQuotaStore())
+        seen = []
+        # Four requests at the start of the window: 2 of 4 is the soft limit
+        for _ in range(4):
+            seen.append(await outcome(quota))
+            await quota.charge("ip:203.0.113.7", "session", requests=1)
+        # At the limit for the rest of the window
+        seen.append(await outcome(quota))
+
+        # Next window: the previous count still weighs fully at its start, then fades out
+        clock.now = START + WINDOW
+        seen.append(await outcome(quota))
+        clock.now = START + WINDOW + 1
+        seen.append(await outcome(quota))
+        clock.now = START + WINDOW + 51
+        seen.append(await outcome(quota))
+        # Two windows later nothing is left
+        clock.now = START + 2 * WINDOW
+        seen.append(await outcome(quota))
+        if engine is not None:
+            await engine.dispose()
+        return quota, seen
+
+    quota, seen = asyncio.run(scenario())
+    assert seen == ["ok", "ok", "degraded", "degraded", 100, 1, "degraded", "ok", "ok"]
+    assert quota.degraded == 3 and quota.rejected == 2
+
+
+def test_retry_after_is_when_the_window_has_slid_far_enough(clock):
+    async def scenario():
+        quota = manager()
+        clock.now = START + 50
+        for _ in range(4):
+            await quota.charge("ip:203.0.113.7", "session", requests=1)
+        retry_after = await outcome(quota)
+        # Right at the hinted time the count is back at the limit; just after, below it
+        clock.now += retry_after
+        at_hint = await outcome(quota)
+        clock.now += 1
+        after_hint = await outcome(quota)
+        return retry_after, at_hint, after_hint
+
+    retry_after, at_hint, after_hint = asyncio.run(scenario())
+    # Half of this window is left, and the next window starts with the full count
+    assert retry_after == 50
+    assert at_hint == 1
+    assert after_hint == "degraded"
+
+
+def test_token_quota_and_separate_scopes(clock):
+    async def scenario():
+        quota = manager(client=QuotaLimits(), session=QuotaLimits(tokens=1000))
+        await quota.charge("ip:203.0.113.7", "busy", tokens=600)
+        degraded = await outcome(quota, session_id="busy")
+        await quota.charge("ip:203.0.113.7", "busy", tokens=400)
+        rejected = await outcome(quota, session_id="busy")
+        # Another session of the same client is not affected
+        other = await outcome(quota, session_id="other")
+        return degraded, rejected, other
+
+    degraded, rejected, other = asyncio.run(scenario())
+    assert degraded == "degraded"
+    assert rejected == WINDOW
+    assert other == "ok"
+
+
+def test_failing_backend_lets_runs_through(clock):
+    class Unavailable:
+        name = "broken"
+
+        async def usage(self, keys, window):
+            raise ConnectionError("database unavailable")
+
+        async def add(self, keys, window, requests, tokens):
+            raise ConnectionError("database unavailable")
+
+    async def scenario():
+        quota = manager(Unavailable())
+        await quota.charge("ip:203.0.113.7", "session", requests=1)
+        return await outcome(quota)
+
+    assert asyncio.run(scenario()) == "ok"
+
+
+def test_run_api_answers_429_with_retry_after(clock, monkeypatch):
+    async def drive(self, run, agent, user_input, agent_key, client_id):
+        await run.append("completed")
+
+    monkeypatch.setattr(RunManager, "_drive", drive)
+    quota = manager(client=QuotaLimits(requests=1))
+    runs = RunManager(
+        buffer_size=16, ttl_seconds=60,
+        admission=AdmissionController(max_in_flight=4, max_queue=0, queue_timeout=1), quotas=quota,
+    )
+    monkeypatch.setattr(run_endpoint, "run_manager", runs)
+    monkeypatch.setattr(RunManager, "start", _with_agent(RunManager.start))
+    app = FastAPI()
+    app.include_router(run_endpoint.router, prefix="/runs")
+    client = TestClient(app)
+
+    first = client.post("/runs", json={"session_id": "session", "input": "hi"})
+    second = client.post("/runs", json={"session_id": "session", "input": "hi"})
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert second.headers["Retry-After"] == str(WINDOW)
+    assert "Client quota exceeded" in second.json()["detail"]
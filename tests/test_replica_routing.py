@@ -0,0 +1,77 @@
+"""
+Replica Routing Tests
+
+Read-your-writes of the replica router (`src.db.routing`): recent writes are
+forgotten once they expire, and a client that wrote is kept on the primary
+by any worker through the `db_last_write` cookie or `X-DB-Last-Write` header.
+
+Each router is a separate "worker" with its own memory of recent writes; the
+replica engine is never connected to.
+"""
+
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.db.routing import LAST_WRITE_COOKIE, ReadYourWritesMiddleware, ReplicaRouter
+
+
+def worker(read_your_writes_seconds: float = 5.0):
+    router = ReplicaRouter(["sqlite+aiosqlite:///:memory:"], read_your_writes_seconds=read_your_writes_seconds)
+    # No lag checks against the fake replica
+    router.lag_check_interval = float("inf")
+    router._last_lag_check = time.monotonic()
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware, router=router)
+
+    @app.post("/write/{key}")
+    async def write(key: str):
+        router.note_write(key)
+        return {}
+
+    @app.get("/read/{key}")
+    async def read(key: str):
+        return {"primary": router.reader(key) is None}
+
+    return router, app
+
+
+def test_expired_writes_are_swept_on_every_write():
+    router, _ = worker(read_your_writes_seconds=0.05)
+    router.note_write("a")
+    router.note_write("b")
+    time.sleep(0.06)
+    router.note_write("c")
+    assert list(router._recent_writes) == ["c"]
+    # Rewriting a key moves it to the back
+    router.note_write("a")
+    assert list(router._recent_writes) == ["c", "a"]
+
+
+def test_writing_client_stays_on_primary_on_another_worker():
+    _, first_app = worker()
+    _, second_app = worker()
+    first, second = TestClient(first_app), TestClient(second_app)
+
+    response = first.post("/write/owner-1")
+    assert LAST_WRITE_COOKIE in response.cookies
+    last_write = response.headers["x-db-last-write"]
+
+    # Same worker: remembered in process
+    assert TestClient(first_app).get("/read/owner-1").json() == {"primary": True}
+    # Another worker knows nothing of the write, except through the client's cookie or header
+    assert second.get("/read/owner-1").json() == {"primary": False}
+    assert TestClient(second_app).get("/read/anything", headers={"X-DB-Last-Write": last_write}).json() == {"primary": True}
+    second.cookies.set(LAST_WRITE_COOKIE, response.cookies[LAST_WRITE_COOKIE])
+    assert second.get("/read/owner-1").json() == {"primary": True}
+
+
+def test_stale_or_invalid_tokens_do_not_pin_the_client():
+    _, app = worker(read_your_writes_seconds=5.0)
+    client = TestClient(app)
+    stale = f"{time.time() - 60:.3f}"
+    assert client.get("/read/k", headers={"X-DB-Last-Write": stale}).json() == {"primary": False}
+    assert client.get("/read/k", headers={"X-DB-Last-Write": "soon"}).json() == {"primary": False}
+    # Reads alone never hand out a token
+    assert "x-db-last-write" not in client.get("/read/k").headers
@@ -0,0 +1,192 @@
+"""
+Run Stream Tests
+
+Replay, eviction and fan-out of agent run streams (`src.agent.runs.RunStream`):
+reconnects get exactly the events they missed, from the ring buffer or the
+spill, and events that are lost are reported with a `gap` event instead of
+being skipped. Spilled events are deleted with their run.
+"""
+
+import asyncio
+import time
+from typing import Dict, List
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.agent import runs
+from src.agent.admission import AdmissionController
+from src.agent.quotas import MemoryQuotaStore, QuotaLimits, QuotaManager
+from src.agent.runs import RunEventSpill, RunManager, RunStream, RunStreamEvent
+from src.db.database import Base
+from src.db.models import RunEvent
+
+
+class MemorySpill:
+    """Spill keeping events in a dict; `failures` makes that many writes fail first."""
+
+    def __init__(self, failures: int = 0):
+        self.events: Dict[int, RunStreamEvent] = {}
+        self.failures = failures
+
+    async def write(self, run_id: str, events: List[RunStreamEvent]) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        self.events.update((event.id, event) for event in events)
+
+    async def read(self, run_id: str, after_id: int, before_id: int) -> List[RunStreamEvent]:
+        return [event for seq, event in sorted(self.events.items()) if after_id < seq < before_id]
+
+
+async def produce(run: RunStream, count: int, finish: bool = True) -> None:
+    for i in range(count):
+        await run.append("text_delta", {"delta": f"t{i}"})
+    if finish:
+        await run.append("completed")
+
+
+async def collect(run: RunStream, last_event_id: int = 0) -> List[RunStreamEvent]:
+    return [event async for event in run.subscribe(last_event_id)]
+
+
+def test_reconnect_replays_from_buffer():
+    async def scenario():
+        run = RunStream("run", "session", buffer_size=16)
+        await produce(run, 5)
+        return await collect(run, last_event_id=3)
+
+    events = asyncio.run(scenario())
+    assert [event.id for event in events] == [4, 5, 6]
+    assert events[-1].type == "completed"
+
+
+def test_evicted_events_without_spill_are_reported_as_gap():
+    async def scenario():
+        run = RunStream("run", "session", buffer_size=4)
+        await produce(run, 10)
+        return await collect(run, last_event_id=2)
+
+    events = asyncio.run(scenario())
+    # Events 3..7 were evicted and cannot be replayed
+    assert events[0].type == "gap"
+    assert events[0].id == 7
+    assert events[0].data == {"first_id": 3, "last_id": 7}
+    assert [event.id for event in events[1:]] == [8, 9, 10, 11]
+
+
+def test_evicted_events_replayed_from_spill():
+    async def scenario():
+        spill = MemorySpill()
+        run = RunStream("run", "session", buffer_size=4, spill=spill)
+        await produce(run, 10)
+        await run.flush()
+        return await collect(run, last_event_id=0)
+
+    events = asyncio.run(scenario())
+    assert [event.id for event in events] == list(range(1, 12))
+    assert all(event.type != "gap" for event in events)
+
+
+def test_failed_spill_write_is_kept_and_retried():
+    async def scenario():
+        spill = MemorySpill(failures=1)
+        run = RunStream("run", "session", buffer_size=4, spill=spill)
+        await produce(run, 1, finish=False)
+        for _ in range(4):
+            await run.append("text_delta", {"delta": "x"})
+        await run.append("completed")
+        # Event 1 was evicted and its write failed; it is still held for a retry
+        await run.flush()
+        events = await collect(run, last_event_id=0)
+        return spill, events
+
+    spill, events = asyncio.run(scenario())
+    assert 1 in spill.events
+    assert [event.id for event in events[:2]] == [1, 2]
+    assert all(event.type != "gap" for event in events)
+
+
+def test_fan_out_to_several_subscribers():
+    async def scenario():
+        run = RunStream("run", "session", buffer_size=4)
+        subscribers = [asyncio.create_task(collect(run)) for _ in range(3)]
+        await asyncio.sleep(0)
+        for i in range(20):
+            await run.append("text_delta", {"delta": f"t{i}"})
+            await asyncio.sleep(0)
+        await run.append("completed")
+        return await asyncio.gather(*subscribers)
+
+    results = asyncio.run(scenario())
+    for events in results:
+        # Subscribers that keep up get every event, in order, from the small buffer
+        assert [event.id for event in events] == list(range(1, 22))
+        assert "".join(event.data.get("delta", "") for event in events) == "".join(f"t{i}" for i in range(20))
+
+
+def test_slow_subscriber_overtaken_by_eviction_gets_gap():
+    async def scenario():
+        run = RunStream("run", "session", buffer_size=4)
+        await produce(run, 2, finish=False)
+        stream = run.subscribe()
+        first = await stream.__anext__()
+        # The buffer moves on past what the subscriber has read so far
+        await produce(run, 8)
+        return [first] + [event async for event in stream]
+
+    events = asyncio.run(scenario())
+    # Event 2 was already in the subscriber's view of the buffer; 3..7 were evicted before it got there
+    assert [event.id for event in events] == [1, 2, 7, 8, 9, 10, 11]
+    assert events[2].type == "gap"
+    assert events[2].data == {"first_id": 3, "last_id": 7}
+
+
+def test_spilled_events_are_deleted_with_their_run(tmp_path, monkeypatch):
+    async def drive(self, run, agent, user_input, agent_key, client_id):
+        await produce(run, 10)
+        await run.flush()
+
+    monkeypatch.setattr(RunManager, "_drive", drive)
+
+    async def spilled_rows(factory) -> Dict[str, int]:
+        async with factory() as session:
+            rows = await session.execute(select(RunEvent.run_id, func.count()).group_by(RunEvent.run_id))
+            return dict(rows.all())
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'runs.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+        monkeypatch.setattr(runs, "AsyncSessionLocal", factory)
+
+        manager = RunManager(
+            buffer_size=4, ttl_seconds=60, spill=RunEventSpill(),
+            admission=AdmissionController(max_in_flight=4, max_queue=0, queue_timeout=1),
+            quotas=QuotaManager(MemoryQuotaStore(), 60, QuotaLimits(), QuotaLimits(), soft_ratio=0.8),
+        )
+        expiring = await manager.start("session", "hi", agent=object(), agent_key="openai")
+        kept = await manager.start("session", "hi", agent=object(), agent_key="openai")
+        await asyncio.gather(expiring.task, kept.task)
+        before = await spilled_rows(factory)
+
+        # Past its TTL: the next start evicts the run and deletes its rows
+        expiring.finished_at = time.monotonic() - 61
+        later = await manager.start("session", "hi", agent=object(), agent_key="openai")
+        await later.task
+        await asyncio.gather(*manager._cleanup_tasks)
+        after_eviction = await spilled_rows(factory)
+
+        # On shutdown, the rows of every remaining run go too
+        await manager.discard_spilled()
+        after_shutdown = await spilled_rows(factory)
+        await engine.dispose()
+        return expiring.run_id, kept.run_id, later.run_id, before, after_eviction, after_shutdown
+
+    expiring, kept, later, before, after_eviction, after_shutdown = asyncio.run(scenario())
+    # 11 events through a 4-event buffer: 7 were spilled per run
+    assert before == {expiring: 7, kept: 7}
+    assert after_eviction == {kept: 7, later: 7}
+    assert after_shutdown == {}
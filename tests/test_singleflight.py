@@ -0,0 +1,98 @@
+"""
+Single-Flight Tests
+
+Identical chain calls share one upstream stream (`src.chain.singleflight`):
+a follower going away leaves the shared call running for the others, and the
+upstream call is cancelled and closed once the last follower is gone.
+"""
+
+import asyncio
+from contextlib import aclosing
+from typing import List
+
+from src.chain.singleflight import SingleFlight
+
+
+class Upstream:
+    """Upstream stream that produces a chunk whenever `step` is released, and records how it ended."""
+
+    def __init__(self):
+        self.step = asyncio.Event()
+        self.sent = 0
+        self.cancelled = False
+        self.closed = False
+
+    async def open(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        try:
+            while True:
+                await self.step.wait()
+                self.step.clear()
+                self.sent += 1
+                yield self.sent
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        finally:
+            self.closed = True
+
+
+async def follow(flight: SingleFlight, key: str, upstream: Upstream, received: List[int]) -> None:
+    async with aclosing(flight.stream(key, upstream.open)) as stream:
+        async for chunk in stream:
+            received.append(chunk)
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_cancelling_one_follower_keeps_the_shared_call():
+    async def scenario():
+        flight, upstream = SingleFlight(), Upstream()
+        first, second = [], []
+        tasks = [asyncio.create_task(follow(flight, "key", upstream, received)) for received in (first, second)]
+        await settle()
+        upstream.step.set()
+        await settle()
+
+        tasks[0].cancel()
+        await settle()
+        stats_after_one = flight.stats()
+        upstream.step.set()
+        await settle()
+        upstream_running = not upstream.cancelled
+
+        tasks[1].cancel()
+        await settle()
+        return flight, upstream, first, second, stats_after_one, upstream_running
+
+    flight, upstream, first, second, stats_after_one, upstream_running = asyncio.run(scenario())
+    assert flight.started == 1 and flight.coalesced == 1
+    # The remaining follower kept receiving from the same upstream call
+    assert upstream_running
+    assert stats_after_one == {"in_flight": 1, "subscribers": 1, "started": 1, "coalesced": 1}
+    assert first == [1]
+    assert second == [1, 2]
+    # The last follower leaving cancels the upstream call and closes its stream
+    assert upstream.cancelled and upstream.closed
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_closing_the_last_follower_releases_the_call_immediately():
+    async def scenario():
+        flight, upstream = SingleFlight(), Upstream()
+        stream = flight.stream("key", upstream.open)
+        upstream.step.set()
+        # Closed explicitly, without waiting for garbage collection of the generator
+        async with aclosing(stream):
+            await stream.__anext__()
+        await settle()
+        return flight, upstream
+
+    flight, upstream = asyncio.run(scenario())
+    assert upstream.cancelled and upstream.closed
+    assert flight.stats()["subscribers"] == 0
@@ -0,0 +1,226 @@
+"""
+Usage Ledger Tests
+
+Token usage and cost records (`src.app.core.usage`): entries are written in
+batches of USAGE_BATCH_SIZE, whatever is buffered is written on shutdown,
+entries survive a failed write, and the per-minute rollups add up across
+batches. Chain calls against the mock provider land in the ledger with the
+provider's reported usage.
+
+Every test writes to its own SQLite database in a temporary directory.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.app.core import usage
+from src.app.core.usage import UsageEntry, UsageLedger, price, top_consumers, usage_per_minute
+from src.db.database import Base
+from src.db.models import UsageMinute, UsageRecord
+
+MINUTE = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Points the ledger at a fresh SQLite database; returns a coroutine that creates its tables."""
+    state = {}
+
+    async def create():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'usage.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+        monkeypatch.setattr(usage, "AsyncSessionLocal", factory)
+        monkeypatch.setattr(usage, "WriterSessionLocal", factory)
+        state["engine"], state["factory"] = engine, factory
+        return state
+
+    return create
+
+
+async def count(factory, model) -> int:
+    async with factory() as session:
+        return await session.scalar(select(func.count()).select_from(model))
+
+
+def entry(model: str = "gpt-4.1-mini", minute: int = 0, **fields) -> UsageEntry:
+    values = {"input_tokens": 100, "output_tokens": 20, **fields}
+    return UsageEntry(
+        source="agent", agent_key="openai", model=model, created_at=MINUTE + timedelta(minutes=minute, seconds=5),
+        **values,
+    )
+
+
+def test_entries_are_written_in_batches(database, monkeypatch):
+    async def scenario():
+        db = await database()
+        ledger = UsageLedger(batch_size=3, flush_interval=60, max_buffer=100)
+        batches = []
+        write = ledger._write
+
+        async def recording_write(batch):
+            batches.append(len(batch))
+            await write(batch)
+
+        monkeypatch.setattr(ledger, "_write", recording_write)
+        for _ in range(7):
+            ledger.record(entry())
+        await ledger.flush()
+        rows = await count(db["factory"], UsageRecord)
+        await db["engine"].dispose()
+        return ledger, batches, rows
+
+    ledger, batches, rows = asyncio.run(scenario())
+    assert batches == [3, 3, 1]
+    assert rows == 7
+    assert ledger.stats() == {"buffered": 0, "dropped": 0}
+
+
+def test_full_batch_wakes_the_writer(database):
+    async def scenario():
+        db = await database()
+        ledger = UsageLedger(batch_size=2, flush_interval=60, max_buffer=100)
+        ledger.start()
+        ledger.record(entry())
+        ledger.record(entry())
+        # Written long before the flush interval
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if await count(db["factory"], UsageRecord) == 2:
+                break
+        rows = await count(db["factory"], UsageRecord)
+        await ledger.stop()
+        await db["engine"].dispose()
+        return rows
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_buffered_entries_are_flushed_on_shutdown(database):
+    async def scenario():
+        db = await database()
+        ledger = UsageLedger(batch_size=100, flush_interval=60, max_buffer=100)
+        ledger.start()
+        ledger.record(entry())
+        ledger.record(entry(model="gpt-4.1-nano"))
+        await asyncio.sleep(0.01)
+        before = await count(db["factory"], UsageRecord)
+        await ledger.stop()
+        after = await count(db["factory"], UsageRecord)
+        await db["engine"].dispose()
+        return before, after
+
+    assert asyncio.run(scenario()) == (0, 2)
+
+
+def test_failed_write_keeps_entries(database, monkeypatch):
+    async def scenario():
+        db = await database()
+        ledger = UsageLedger(batch_size=10, flush_interval=60, max_buffer=100)
+        write = ledger._write
+
+        async def unavailable(batch):
+            raise ConnectionError("database unavailable")
+
+        monkeypatch.setattr(ledger, "_write", unavailable)
+        ledger.record(entry())
+        await ledger.flush()
+        buffered = ledger.stats()["buffered"]
+        monkeypatch.setattr(ledger, "_write", write)
+        await ledger.flush()
+        rows = await count(db["factory"], UsageRecord)
+        await db["engine"].dispose()
+        return buffered, rows
+
+    assert asyncio.run(scenario()) == (1, 1)
+
+
+def test_buffer_filled_during_a_failed_write_drops_the_oldest(database, monkeypatch):
+    async def scenario():
+        await database()
+        ledger = UsageLedger(batch_size=3, flush_interval=60, max_buffer=4)
+
+        async def unavailable(batch):
+            # Entries keep arriving while the write is in flight
+            for i in range(3):
+                ledger.record(entry(session_id=f"new{i}"))
+            raise ConnectionError("database unavailable")
+
+        monkeypatch.setattr(ledger, "_write", unavailable)
+        for i in range(3):
+            ledger.record(entry(session_id=f"old{i}"))
+        await ledger.flush()
+        return ledger
+
+    ledger = asyncio.run(scenario())
+    # 3 entries in the failed batch plus 3 new ones in a buffer of 4: the two oldest go
+    assert [buffered.session_id for buffered in ledger._buffer] == ["old2", "new0", "new1", "new2"]
+    assert ledger.stats() == {"buffered": 4, "dropped": 2}
+
+
+def test_rollups_add_up_across_batches(database):
+    async def scenario():
+        db = await database()
+        ledger = UsageLedger(batch_size=2, flush_interval=60, max_buffer=100)
+        ledger.record(entry(session_id="a"))
+        ledger.record(entry(session_id="a", cached_tokens=40))
+        ledger.record(entry(session_id="b"))
+        ledger.record(entry(model="gpt-4.1-nano", minute=1, session_id="b"))
+        await ledger.flush()
+        rollups = await count(db["factory"], UsageMinute)
+        minutes = await usage_per_minute(MINUTE - timedelta(minutes=5))
+        by_model = await top_consumers("model", MINUTE - timedelta(minutes=5), limit=10)
+        by_session = await top_consumers("session", MINUTE - timedelta(minutes=5), limit=10)
+        await db["engine"].dispose()
+        return rollups, minutes, by_model, by_session
+
+    rollups, minutes, by_model, by_session = asyncio.run(scenario())
+    # Three mini calls in minute 0 (split over two batches) share one rollup row
+    assert rollups == 2
+    assert [(row["calls"], row["input_tokens"], row["cached_tokens"]) for row in minutes] == [(3, 300, 40), (1, 100, 0)]
+    assert [row["key"] for row in by_model] == ["gpt-4.1-mini", "gpt-4.1-nano"]
+    mini = by_model[0]
+    expected = 2 * price("gpt-4.1-mini", 100, 0, 20) + price("gpt-4.1-mini", 100, 40, 20)
+    assert mini["calls"] == 3 and mini["cost_usd"] == pytest.approx(expected)
+    assert {row["key"]: row["calls"] for row in by_session} == {"a": 2, "b": 2}
+
+
+def test_chain_call_usage_is_recorded(database, mock_provider, monkeypatch):
+    from src.bench.mock_provider import MockConfig
+    from src.chain import runtime
+
+    mock_provider.provider.reset(MockConfig(ttft_ms=0, tokens=12, tokens_per_second=0))
+    monkeypatch.setenv("OPENAI_BASE_URL", mock_provider.base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    ledger = UsageLedger(batch_size=100, flush_interval=60, max_buffer=100)
+    monkeypatch.setattr(runtime, "usage_ledger", ledger)
+    runtime.get_client.cache_clear()
+
+    async def scenario():
+        db = await database()
+        try:
+            response = await runtime.call_llm_api([{"role": "user", "content": "hi"}])
+            text = "".join([
+                chunk.choices[0].delta.content async for chunk in response
+                if chunk.choices and chunk.choices[0].delta.content
+            ])
+            await ledger.flush()
+            async with db["factory"]() as session:
+                record = (await session.scalars(select(UsageRecord))).one()
+        finally:
+            await runtime.get_client().close()
+            runtime.get_client.cache_clear()
+            await db["engine"].dispose()
+        return text, record
+
+    text, record = asyncio.run(scenario())
+    assert text.split() == [f"tok{i}" for i in range(12)]
+    assert (record.source, record.agent_key, record.model) == ("chain", "chain", "gpt-4.1-mini")
+    assert record.output_tokens == 12 and record.input_tokens > 0
+    assert record.cost_usd == pytest.approx(price("gpt-4.1-mini", record.input_tokens, 0, 12))